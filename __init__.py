@@ -1,7 +1,7 @@
 from pypd_config        import Config
-from pypd_tree          import Tree
+from pypd_tree          import Tree, FlatTree
 from pypd_objectname    import ObjectName
 from pypd_exceptions    import PyPdException, InvalidPatch, InvalidLine
-#from pypd_patchfiles    import PatchFiles
-#from pypd_patch         import Patch
-#from pypd_object        import Object
+from pypd_patchfiles    import PatchFiles
+from pypd_patch         import Patch
+from pypd_object        import Object
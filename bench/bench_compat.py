@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+"""Time classifying every patch in a library for vanilla compatibility.
+
+A library of num_patches generated patches is written to a temporary
+directory. Each patch uses a few vanilla and extended objects and a few
+shared abstractions, which use further abstractions in turn. Every patch
+is classified once with the results for shared abstractions kept, and
+once with them forgotten before each patch, as if each patch was checked
+on its own.
+
+Run with pypd on the Python path:
+
+    python bench/bench_compat.py [num_patches]"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from pypd import PatchFiles, pypd_compat
+
+
+NUM_ABSTRACTIONS = 100
+OBJECTS = ['osc~', 'dac~', 'f', 't b b', 'comment', 'mtof_tuning']
+
+
+def write_patch(path, names):
+    with open(path, 'w') as f:
+        f.write('#N canvas 0 0 450 300 10;\n')
+        f.writelines(['#X obj 10 10 %s;\n' % name for name in names])
+
+
+def main(argv):
+    num_patches = len(argv) > 1 and int(argv[1]) or 2000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        extended = os.path.join(tmpdir, 'extended.txt')
+        with open(extended, 'w') as f:
+            f.write('[objects]\ncomment\nmtof_tuning\n')
+
+        root = os.path.join(tmpdir, 'lib')
+        os.makedirs(os.path.join(root, 'abs'))
+        for i in xrange(NUM_ABSTRACTIONS):
+            # Each abstraction uses some of the ones after it
+            uses = ['abs%d' % random.randrange(i + 1, NUM_ABSTRACTIONS) \
+                    for _ in xrange(i < NUM_ABSTRACTIONS - 1 and 3 or 0)]
+            write_patch(os.path.join(root, 'abs', 'abs%d.pd' % i),
+                        uses + random.sample(OBJECTS, 3) * 5)
+        patches = []
+        for i in xrange(num_patches):
+            path = os.path.join(root, 'patch%d.pd' % i)
+            write_patch(path, ['abs%d' % random.randrange(NUM_ABSTRACTIONS) \
+                               for _ in xrange(3)] + OBJECTS * 5)
+            patches.append(path)
+
+        files = PatchFiles([root])
+        classifier = pypd_compat.Classifier([extended], files.resolve)
+        start = time.time()
+        for path in patches:
+            classifier.classify_file(path)
+        memo_time = time.time() - start
+
+        start = time.time()
+        for path in patches:
+            classifier.clear()
+            classifier.classify_file(path)
+        clear_time = time.time() - start
+
+        print '%d patches, %d shared abstractions' % (num_patches,
+                                                      NUM_ABSTRACTIONS)
+        print 'memoised        %8.3f s' % memo_time
+        print 'not memoised    %8.3f s' % clear_time
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
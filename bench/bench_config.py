@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""Time multi-valued key operations on large Config files.
+
+A config file is created with num_keys single keys plus a number of
+multi-valued keys. Reading a multi-valued key, appending values one at a
+time and deleting a multi-valued key are timed with the indexed Config and
+with a prefix scan of every key, which is how Config used to find the
+values of a multi-valued key.
+
+Run with pypd on the Python path:
+
+    python bench/bench_config.py [num_keys]"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import pypd
+
+
+NUM_LISTS = 100
+LIST_LEN = 20
+NUM_APPENDS = 1000
+
+
+def scan_get(cfg, key):
+    """Find the values for key as Config used to, scanning every key."""
+    return [cfg._items[k] for k in cfg._items.keys() \
+            if k.startswith('%s_' % key)]
+
+
+def scan_append(cfg, key, value):
+    """Append a value as Config used to, counting keys by prefix scan."""
+    n = sum([k.startswith('%s_' % key) for k in cfg._items.keys()]) + 1
+    cfg._items['%s_%d' % (key, n)] = value
+
+
+def scan_delete(cfg, key):
+    """Delete a key's values as Config used to, scanning every key."""
+    for k in cfg._items.keys():
+        if k.startswith('%s_' % key):
+            del cfg._items[k]
+
+
+def make_config(path, num_keys):
+    cfg = pypd.Config(path, flush=False)
+    for i in xrange(num_keys):
+        cfg['key%d' % i] = 'value%d' % i
+    for i in xrange(NUM_LISTS):
+        cfg['list%d' % i] = ['item%d' % j for j in xrange(LIST_LEN)]
+    cfg.write()
+
+
+def timeit(fn, *args):
+    start = time.time()
+    fn(*args)
+    return time.time() - start
+
+
+def run(path, num_keys):
+    results = []
+
+    cfg = pypd.Config(path, flush=False)
+    results.append(('get', timeit(lambda: [cfg['list%d' % i] \
+                                           for i in xrange(NUM_LISTS)]),
+                    timeit(lambda: [scan_get(cfg, 'list%d' % i) \
+                                    for i in xrange(NUM_LISTS)])))
+
+    cfg = pypd.Config(path, flush=False)
+    indexed = timeit(lambda: [cfg.__setitem__('appended', ['v%d' % i]) \
+                              for i in xrange(NUM_APPENDS)])
+    cfg = pypd.Config(path, flush=False)
+    scanned = timeit(lambda: [scan_append(cfg, 'appended', 'v%d' % i) \
+                              for i in xrange(NUM_APPENDS)])
+    results.append(('append', indexed, scanned))
+
+    cfg = pypd.Config(path, flush=False)
+    indexed = timeit(lambda: [cfg.delete('list%d' % i) \
+                              for i in xrange(NUM_LISTS)])
+    cfg = pypd.Config(path, flush=False)
+    scanned = timeit(lambda: [scan_delete(cfg, 'list%d' % i) \
+                              for i in xrange(NUM_LISTS)])
+    results.append(('delete', indexed, scanned))
+    return results
+
+
+def main(argv):
+    num_keys = len(argv) > 1 and int(argv[1]) or 10000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'bench.cfg')
+        make_config(path, num_keys)
+        print '%d keys, %d lists of %d values, %d appends' % \
+              (num_keys, NUM_LISTS, LIST_LEN, NUM_APPENDS)
+        print '%-10s %12s %12s' % ('', 'indexed', 'prefix scan')
+        for name, indexed, scanned in run(path, num_keys):
+            print '%-10s %12.4f %12.4f' % (name, indexed, scanned)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
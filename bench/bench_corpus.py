@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""Time random access to patches in a corpus file.
+
+A corpus of num_patches generated patches of patch_size objects each is
+written to a temporary directory. The time to open the corpus and the mean
+time to load a randomly chosen patch's Tree are compared with parsing the
+patch file.
+
+Run with pypd on the Python path:
+
+    python bench/bench_corpus.py [num_patches] [patch_size]"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from pypd import pypd_corpus, pypd_patch
+from bench_treefile import make_patch
+
+
+NUM_LOADS = 1000
+
+
+def main(argv):
+    num_patches = len(argv) > 1 and int(argv[1]) or 5000
+    patch_size = len(argv) > 2 and int(argv[2]) or 200
+    tmpdir = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i in xrange(num_patches):
+            path = os.path.join(tmpdir, 'patch%d.pd' % i)
+            with open(path, 'w') as f:
+                f.writelines(make_patch(patch_size + i % 50))
+            paths.append(path)
+
+        corpus_path = os.path.join(tmpdir, 'bench.corpus')
+        start = time.time()
+        pypd_corpus.build(corpus_path, paths)
+        build_time = time.time() - start
+
+        start = time.time()
+        corpus = pypd_corpus.Corpus(corpus_path)
+        open_time = time.time() - start
+
+        sample = [random.choice(paths) for _ in xrange(NUM_LOADS)]
+        start = time.time()
+        for path in sample:
+            corpus.tree(path)
+        load_time = (time.time() - start) / NUM_LOADS
+
+        start = time.time()
+        for path in sample:
+            pypd_patch.Patch(path)
+        parse_time = (time.time() - start) / NUM_LOADS
+        corpus.close()
+
+        print '%d patches of about %d objects, corpus %d bytes' % \
+              (num_patches, patch_size, os.path.getsize(corpus_path))
+        print 'build           %10.3f s' % build_time
+        print 'open            %10.3f ms' % (open_time * 1000)
+        print 'load one patch  %10.3f ms' % (load_time * 1000)
+        print 'parse one patch %10.3f ms' % (parse_time * 1000)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""Compare connection queries with a Graph and by rescanning the canvas.
+
+A patch of num_objects objects in a chain, each also connected to a few
+random later objects, is parsed. The fan in and fan out of every object
+is then found by scanning the canvas's children for each connection, as
+a lint pass would without a Graph, and with a Graph built from the
+canvas. The Graph time includes building it.
+
+Run with pypd on the Python path:
+
+    python bench/bench_graph.py [num_objects]"""
+
+import sys
+import time
+import random
+from pypd.pypd_patch import parse
+from pypd.pypd_graph import Graph, BOX_ELEMENTS
+
+
+def make_patch(num_objects):
+    lines = ['#N canvas 0 0 450 300 10;\n']
+    lines.extend(['#X obj 10 %d f;\n' % i for i in xrange(num_objects)])
+    for i in xrange(num_objects - 1):
+        lines.append('#X connect %d 0 %d 0;\n' % (i, i + 1))
+        lines.append('#X connect %d 0 %d 1;\n' % \
+                     (i, random.randrange(i + 1, num_objects)))
+    return lines
+
+
+def rescan(canvas):
+    """Return the fan out and fan in of each object node, finding the
+    objects of each connection by scanning the canvas."""
+    fan_out, fan_in = {}, {}
+    for conn in canvas[:]:
+        if conn.value.element != 'connect':
+            continue
+        src, _, dest, _ = map(int, conn.value.params)
+        index = 0
+        for child in canvas[:]:
+            if child.value.element not in BOX_ELEMENTS:
+                continue
+            if index == src:
+                fan_out[child] = fan_out.get(child, 0) + 1
+            if index == dest:
+                fan_in[child] = fan_in.get(child, 0) + 1
+            index += 1
+    return fan_out, fan_in
+
+
+def with_graph(canvas):
+    graph = Graph.from_canvas(canvas)
+    return [(graph.fan_out(i), graph.fan_in(i)) for i in xrange(len(graph))]
+
+
+def main(argv):
+    num_objects = len(argv) > 1 and int(argv[1]) or 1000
+    tree = parse(make_patch(num_objects))
+
+    print '%d objects, %d connections' % (num_objects, 2 * (num_objects - 1))
+    for name, fn in (('rescan', rescan), ('graph', with_graph)):
+        start = time.time()
+        fn(tree)
+        print '%-10s %10.4f s' % (name, time.time() - start)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""Compare the memory used by the dict based and compact Object types.
+
+DictObject below is the representation Object used to have: every named
+attribute, arg1 ... argn, ordered_attrs and num_ordered_attrs were stored
+in each instance's __dict__. The current Object stores its params once in
+a tuple and shares its attribute names with other Objects of the same
+type.
+
+Run with pypd on the Python path:
+
+    python bench/bench_object_memory.py [num_objects]"""
+
+import sys
+import gc
+import time
+from itertools import izip_longest
+import pypd
+from pypd import pypd_class_attrs
+from pypd.pypd_class_attrs import Layout
+
+
+LINES = [('#X', 'obj', ['30', '27', 'osc~', '440']),
+         ('#X', 'obj', ['30', '60', 'dac~']),
+         ('#X', 'msg', ['10', '10', 'set', '1', '2', '3']),
+         ('#X', 'connect', ['0', '0', '1', '0']),
+         ('#X', 'floatatom', ['10', '80', '5', '0', '0', '0', '-', '-', '-']),
+         ('#X', 'obj', ['10', '120', 'hsl', '128', '15', '0', '127', '0',
+                        '0', 'empty', 'empty', 'empty', '-2', '-8', '0',
+                        '10', '-262144', '-1', '-1', '0', '1'])]
+
+
+class DictObject(object):
+
+    """The previous Object representation, one __dict__ per instance."""
+
+    @staticmethod
+    def factory(line_num, chunk, element, params):
+        # The attribute names used to be built as a new list each time
+        attrs = list(pypd_class_attrs.get(element, params))
+        kv = dict(izip_longest(attrs, params))
+        if None in kv:
+            del kv[None]
+        kv.update([('arg%d' % (n + 1), value) \
+                   for n, value in enumerate(params)])
+        kv.update(line_num=line_num, chunk=chunk, element=element,
+                  ordered_attrs=attrs, num_ordered_attrs=len(attrs))
+        return DictObject(kv)
+
+    def __init__(self, kv):
+        self.__dict__.update(kv.items())
+
+
+def sizeof_dict_object(obj):
+    """Bytes used by the instance, its __dict__ and attribute list."""
+    return sys.getsizeof(obj) + sys.getsizeof(obj.__dict__) + \
+           sys.getsizeof(obj.ordered_attrs)
+
+
+def sizeof_object(obj):
+    """Bytes used by the instance and its params tuple."""
+    return sys.getsizeof(obj) + sys.getsizeof(obj.params)
+
+
+def sizeof_layouts():
+    """Bytes used by all the shared layouts, counted once."""
+    return sum([sys.getsizeof(layout.attrs) + sys.getsizeof(layout.index) \
+                for layout in Layout._layouts.values()])
+
+
+def measure(cls, sizeof, num):
+    # Each object needs its own params list, as it would when parsing
+    gc.collect()
+    start = time.time()
+    objs = [cls.factory(n, chunk, element, list(params)) \
+            for n, (chunk, element, params) in \
+            ((n, LINES[n % len(LINES)]) for n in xrange(num))]
+    elapsed = time.time() - start
+    return sum([sizeof(obj) for obj in objs]), elapsed
+
+
+def main(argv):
+    num = len(argv) > 1 and int(argv[1]) or 100000
+
+    dict_bytes, dict_secs = measure(DictObject, sizeof_dict_object, num)
+    obj_bytes, obj_secs = measure(pypd.Object, sizeof_object, num)
+    obj_bytes += sizeof_layouts()
+
+    print '%-12s %12s %10s %10s' % ('', 'bytes', 'bytes/obj', 'secs')
+    for name, nbytes, secs in [('dict', dict_bytes, dict_secs),
+                               ('compact', obj_bytes, obj_secs)]:
+        print '%-12s %12d %10.1f %10.3f' % (name, nbytes,
+                                            float(nbytes) / num, secs)
+    print 'compact uses %.1f%% of the memory of dict' % \
+          (100.0 * obj_bytes / dict_bytes)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Compare re-parsing an edited patch in full and incrementally.
+
+A patch with num_subpatches subpatches of subpatch_size objects each is
+parsed, then edited in one of three ways: one object changed in a
+subpatch, one object inserted into a subpatch (moving every later line)
+and nothing changed. Each edit is parsed in full with parse() and
+incrementally with reparse(). The best of several runs is shown.
+
+Run with pypd on the Python path:
+
+    python bench/bench_reparse.py [num_subpatches] [subpatch_size]"""
+
+import sys
+import time
+from pypd.pypd_patch import parse, reparse
+
+
+def make_patch(num_subpatches, subpatch_size):
+    lines = ['#N canvas 0 0 450 300 10;\n']
+    for i in xrange(num_subpatches):
+        lines.append('#N canvas 0 0 450 300 sub%d 0;\n' % i)
+        lines.extend(['#X obj 10 %d osc~ %d;\n' % (j, j) \
+                      for j in xrange(subpatch_size - 2)])
+        lines.append('#X connect 0 0 1 0;\n')
+        lines.append('#X restore 10 %d pd sub%d;\n' % (i, i))
+    lines.extend(['#X connect %d 0 %d 0;\n' % (i, i + 1) \
+                  for i in xrange(num_subpatches - 1)])
+    return lines
+
+
+REPEAT = 5
+
+
+def timeit(fn, *args):
+    """Return the best of REPEAT runs."""
+    times = []
+    for _ in xrange(REPEAT):
+        start = time.time()
+        fn(*args)
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main(argv):
+    num_subpatches = len(argv) > 1 and int(argv[1]) or 200
+    subpatch_size = len(argv) > 2 and int(argv[2]) or 100
+    lines = make_patch(num_subpatches, subpatch_size)
+    middle = len(lines) / 2
+    while not lines[middle].startswith('#X obj'):
+        middle += 1
+
+    changed = list(lines)
+    changed[middle] = changed[middle].replace('osc~', 'phasor~')
+    inserted = lines[:middle] + ['#X obj 1 1 f;\n'] + lines[middle:]
+
+    print '%d subpatches of %d objects' % (num_subpatches, subpatch_size)
+    print '%-10s %10s %10s' % ('', 'parse', 'reparse')
+    for name, new_lines in (('changed', changed), ('inserted', inserted),
+                            ('unchanged', lines)):
+        # The old tree isn't usable after reparse(), use a new one each time
+        trees = [parse(lines) for _ in xrange(REPEAT)]
+        print '%-10s %10.3f %10.3f' % (name, timeit(parse, new_lines),
+                                       timeit(lambda: reparse(trees.pop(),
+                                                              new_lines)))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
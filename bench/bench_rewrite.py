@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""Time renaming an object across a library of patch files.
+
+num_patches generated patches, each using the renamed object a few times,
+are written to a temporary directory. The object is renamed by parsing
+each patch into a Tree, replacing the Objects and writing the patch out,
+then by Rewriter in one process and in a worker process per CPU. The
+files are written back to their original text between runs.
+
+Run with pypd on the Python path:
+
+    python bench/bench_rewrite.py [num_patches]"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from pypd import Patch, Object
+from pypd.pypd_rewrite import Rewriter, RenameObjects
+
+
+OBJECTS = ['osc~ 440', 'f', 't b b', 'cyclone/speedlim 100', 'metro 10',
+           'pack f f', 'dac~']
+
+
+def make_patch(size):
+    lines = ['#N canvas 0 0 450 300 10;\n']
+    lines.extend(['#X obj 10 %d %s;\n' % (i, OBJECTS[i % len(OBJECTS)]) \
+                  for i in xrange(size)])
+    lines.extend(['#X connect %d 0 %d 0;\n' % (i, i + 1) \
+                  for i in xrange(size - 1)])
+    return ''.join(lines)
+
+
+def write_files(paths, text):
+    for path in paths:
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def rename_with_trees(paths):
+    for path in paths:
+        patch = Patch(path)
+        for node, _ in patch.tree:
+            obj = node.value
+            if obj.element == 'obj' and obj.name == 'cyclone/speedlim':
+                params = list(obj.params)
+                params[2] = 'speedlimit'
+                node.value = Object.factory(obj.line_num, obj.chunk,
+                                            obj.element, params)
+        with open(path, 'w') as f:
+            f.write(str(patch))
+
+
+def main(argv):
+    num_patches = len(argv) > 1 and int(argv[1]) or 2000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        text = make_patch(200)
+        paths = [os.path.join(tmpdir, 'p%d.pd' % i) \
+                 for i in xrange(num_patches)]
+        rewriter = Rewriter([RenameObjects({'cyclone/speedlim':
+                                            'speedlimit'})])
+
+        print '%d patches of 200 objects' % num_patches
+        for name, fn in (('trees', rename_with_trees),
+                         ('rewriter', lambda paths: \
+                                      rewriter.rewrite_files(paths, 1)),
+                         ('parallel', rewriter.rewrite_files)):
+            write_files(paths, text)
+            start = time.time()
+            fn(paths)
+            print '%-10s %8.3f s' % (name, time.time() - start)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
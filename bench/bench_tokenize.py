@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""Compare the tokenizers on small, huge and escape heavy patches.
+
+Three synthetic corpora are generated:
+
+    small       num_small patches of 20 objects each
+    huge        one patch of huge_size objects
+    escapes     num_small patches of 20 messages and comments, every line
+                with escaped ";", "," and "$" characters and some messages
+                wrapped across lines
+
+Each corpus is tokenized with the fast and careful tokenizers and with the
+single regular expression tokenizer they replaced. The best of several
+runs is shown.
+
+Run with pypd on the Python path:
+
+    python bench/bench_tokenize.py [num_small] [huge_size]"""
+
+import re
+import sys
+import time
+from pypd.pypd_tokenize import xtokens, xtokens_careful
+
+
+REPEAT = 5
+
+_token_re = re.compile(r'(?:\\.|[^\s;\\])+|;|\\')
+
+
+def xtokens_regex(lines):
+    """The tokenizer used before pypd_tokenize."""
+    tokens, start_num = [], 0
+    for line_num, line in enumerate(lines, 1):
+        for token in _token_re.findall(line):
+            if token == ';':
+                yield start_num, tokens
+                tokens = []
+            else:
+                if not tokens:
+                    start_num = line_num
+                tokens.append(token)
+
+
+def make_patch(size, escapes=False):
+    lines = ['#N canvas 0 0 450 300 10;\n']
+    for i in xrange(size):
+        if escapes:
+            lines.append('#X msg 10 %d \; pd dsp 1 \\, \\$1 %d;\n' % (i, i))
+            lines.append('#X text 10 %d a comment\\, with \\$2\n' % i)
+            lines.append('wrapped \; over lines;\n')
+        else:
+            lines.append('#X obj 10 %d osc~ %d;\n' % (i, i))
+    lines.extend(['#X connect %d 0 %d 0;\n' % (i, i + 1) \
+                  for i in xrange(size - 1)])
+    return lines
+
+
+def timeit(tokenize, corpus):
+    times = []
+    for _ in xrange(REPEAT):
+        start = time.time()
+        for lines in corpus:
+            for _ in tokenize(lines):
+                pass
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main(argv):
+    num_small = len(argv) > 1 and int(argv[1]) or 2000
+    huge_size = len(argv) > 2 and int(argv[2]) or 50000
+    corpora = (('small', [make_patch(20)] * num_small),
+               ('huge', [make_patch(huge_size)]),
+               ('escapes', [make_patch(20, True)] * num_small))
+    tokenizers = (('regex', xtokens_regex), ('fast', xtokens),
+                  ('careful', xtokens_careful))
+
+    print '%-10s %8s' % ('', 'lines') + \
+          ''.join(['%10s' % name for name, _ in tokenizers])
+    for name, corpus in corpora:
+        print '%-10s %8d' % (name, sum(map(len, corpus))) + \
+              ''.join(['%10.3f' % timeit(tokenize, corpus) \
+                       for _, tokenize in tokenizers])
+
+
+if __name__ == '__main__':
+    main(sys.argv)
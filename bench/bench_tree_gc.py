@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+"""Measure garbage collection and peak memory when loading many trees.
+
+A synthetic forest of patch-like trees (canvases with objects and nested
+subpatches attached with addBranch) is built and dropped repeatedly. This
+is done once with Tree, whose parent links are weak references, and once
+with StrongTree, which has ordinary parent links as Tree used to have.
+
+For each kind of tree the following are reported:
+
+    secs        time to build and drop the forests with GC enabled
+    cyclic      objects that could only be freed by the cyclic garbage
+                collector (with GC disabled, gc.collect() after each forest)
+    peak_kb     peak RSS of a process that builds the forests with GC
+                disabled
+
+Each measurement runs in a separate process so that peak RSS isn't shared.
+Run with pypd on the Python path:
+
+    python bench/bench_tree_gc.py [num_forests] [trees_per_forest]"""
+
+import sys
+import gc
+import time
+import resource
+import multiprocessing
+from pypd import Tree
+
+
+class StrongTree(Tree):
+
+    """A Tree with ordinary (strong) parent links."""
+
+    # Shadows the Tree.parent property so parent is a plain attribute
+    parent = None
+
+
+def make_patch_tree(cls, num_objects=20, num_subpatches=3, depth=3):
+    """Return a tree shaped like a patch with nested subpatches."""
+    root = cls(('canvas', depth))
+    for i in xrange(num_objects):
+        root.add(('obj', i))
+    if depth:
+        for i in xrange(num_subpatches):
+            root.addBranch(make_patch_tree(cls, num_objects, num_subpatches,
+                                           depth - 1))
+    root.add(('restore', depth))
+    return root
+
+
+def _run(cls, num_forests, num_trees, collect, queue):
+    if not collect:
+        gc.disable()
+    cyclic = 0
+    start = time.time()
+    for _ in xrange(num_forests):
+        forest = [make_patch_tree(cls) for _ in xrange(num_trees)]
+        del forest
+        if not collect:
+            cyclic += gc.collect()
+    elapsed = time.time() - start
+    queue.put((elapsed, cyclic))
+
+
+def measure(cls, num_forests, num_trees, collect):
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_run, args=(cls, num_forests,
+                                                      num_trees, collect,
+                                                      queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def _run_peak(cls, num_forests, num_trees, queue):
+    # Build the forests with GC disabled, anything in a cycle is never freed
+    gc.disable()
+    for _ in xrange(num_forests):
+        forest = [make_patch_tree(cls) for _ in xrange(num_trees)]
+        del forest
+    queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def measure_peak(cls, num_forests, num_trees):
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_run_peak,
+                                   args=(cls, num_forests, num_trees, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main(argv):
+    num_forests = len(argv) > 1 and int(argv[1]) or 20
+    num_trees = len(argv) > 2 and int(argv[2]) or 20
+
+    print '%-12s %8s %10s %10s' % ('', 'secs', 'cyclic', 'peak_kb')
+    for cls in [Tree, StrongTree]:
+        secs, _ = measure(cls, num_forests, num_trees, True)
+        _, cyclic = measure(cls, num_forests, num_trees, False)
+        peak = measure_peak(cls, num_forests, num_trees)
+        print '%-12s %8.3f %10d %10d' % (cls.__name__, secs, cyclic, peak)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
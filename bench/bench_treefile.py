@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""Compare loading a saved Tree with parsing the patch text.
+
+A patch of num_objects objects in nested subpatches is generated. The time
+to parse its text is compared with the time to load it with pypd_treefile
+and to unpickle a FlatTree of the same Objects (Tree itself can't be
+pickled, its parent links are weakrefs). The size of each is also shown.
+
+Run with pypd on the Python path:
+
+    python bench/bench_treefile.py [num_objects]"""
+
+import sys
+import time
+import cPickle
+from pypd import pypd_patch, pypd_treefile
+
+
+LINES = ['#X obj 30 27 osc~ 440',
+         '#X obj 30 60 dac~',
+         '#X msg 10 10 set 1 2 3',
+         '#X floatatom 10 80 5 0 0 0 - - -',
+         '#X obj 10 120 hsl 128 15 0 127 0 0 empty empty empty -2 -8 0 10 '
+         '-262144 -1 -1 0 1',
+         '#X connect 0 0 1 0']
+
+
+def make_patch(num_objects):
+    """Return the lines of a patch with subpatches nested up to 3 deep."""
+    lines, depth = ['#N canvas 0 0 450 300 10;\n'], 0
+    for i in xrange(num_objects):
+        if i % 100 == 99 and depth < 3:
+            lines.append('#N canvas 0 0 450 300 sub%d 0;\n' % i)
+            depth += 1
+        elif i % 100 == 50 and depth:
+            lines.append('#X restore 10 10 pd sub;\n')
+            depth -= 1
+        else:
+            lines.append('%s;\n' % LINES[i % len(LINES)])
+    lines.extend(['#X restore 10 10 pd sub;\n'] * depth)
+    return lines
+
+
+def timeit(fn, *args):
+    start = time.time()
+    result = fn(*args)
+    return time.time() - start, result
+
+
+def main(argv):
+    num_objects = len(argv) > 1 and int(argv[1]) or 100000
+    lines = make_patch(num_objects)
+    text = ''.join(lines)
+
+    parse_time, tree = timeit(pypd_patch.parse, lines)
+    dump_time, data = timeit(pypd_treefile.dumps, tree)
+    load_time, _ = timeit(pypd_treefile.loads, data)
+    pickled = cPickle.dumps(tree.flatten(), cPickle.HIGHEST_PROTOCOL)
+    unpickle_time, _ = timeit(cPickle.loads, pickled)
+
+    print '%d objects' % len(lines)
+    print '%-16s %10s %12s' % ('', 'seconds', 'bytes')
+    print '%-16s %10.3f %12d' % ('parse text', parse_time, len(text))
+    print '%-16s %10.3f %12d' % ('treefile load', load_time, len(data))
+    print '%-16s %10.3f %12s' % ('treefile dump', dump_time, '')
+    print '%-16s %10.3f %12d' % ('unpickle flat', unpickle_time,
+                                 len(pickled))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
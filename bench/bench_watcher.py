@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""Compare asking a WatchDaemon with scanning the patch files each time.
+
+A library of num_patches generated patches, each using a few of the
+others as abstractions, is written to a temporary directory. The time to
+find the patches using one patch with a full PatchFiles scan is compared
+with a "dependents" query to a WatchDaemon over its socket, and with the
+time for the daemon to see and apply a change to one file.
+
+Run with pypd on the Python path:
+
+    python bench/bench_watcher.py [num_patches]"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from pypd import PatchFiles, pypd_watcher
+
+
+NUM_QUERIES = 100
+
+
+def write_patch(path, uses):
+    with open(path, 'w') as f:
+        f.write('#N canvas 0 0 450 300 10;\n')
+        for name in uses:
+            f.write('#X obj 10 10 %s;\n' % name)
+        f.write('#X obj 10 10 osc~ 440;\n#X connect 0 0 1 0;\n')
+
+
+def main(argv):
+    num_patches = len(argv) > 1 and int(argv[1]) or 2000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        root = os.path.join(tmpdir, 'lib')
+        paths = []
+        for i in xrange(num_patches):
+            subdir = os.path.join(root, 'dir%d' % (i % 20))
+            if not os.path.isdir(subdir):
+                os.makedirs(subdir)
+            path = os.path.join(subdir, 'abs%d.pd' % i)
+            write_patch(path, ['abs%d' % random.randrange(num_patches) \
+                               for _ in xrange(3)])
+            paths.append(path)
+
+        start = time.time()
+        PatchFiles([root]).dependents(paths[0])
+        scan_time = time.time() - start
+
+        start = time.time()
+        daemon = pypd_watcher.WatchDaemon([root],
+                                          os.path.join(tmpdir, 'sock'))
+        daemon.start()
+        startup_time = time.time() - start
+        try:
+            start = time.time()
+            for _ in xrange(NUM_QUERIES):
+                pypd_watcher.query(daemon.socket_path, 'dependents',
+                                   path=random.choice(paths))
+            query_time = (time.time() - start) / NUM_QUERIES
+
+            updates = daemon.updates
+            start = time.time()
+            write_patch(paths[1], ['abs0'])
+            while daemon.updates == updates:
+                time.sleep(0.001)
+            update_time = time.time() - start
+        finally:
+            daemon.stop()
+
+        print '%d patches, %s watcher' % (num_patches, daemon.watcher.name)
+        print 'full scan       %10.1f ms' % (scan_time * 1000)
+        print 'daemon startup  %10.1f ms' % (startup_time * 1000)
+        print 'daemon query    %10.1f ms' % (query_time * 1000)
+        print 'change applied  %10.1f ms' % (update_time * 1000)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""Generate a synthetic library of patch files for benchmarks.
+
+The library is made of abstractions and of patches that use them, spread
+over a tree of directories. The same parameters and seed always give the
+same files, so timings taken on different versions of pypd are of the
+same work. The parameters are:
+
+    patches         the number of patches
+    abstractions    the number of abstractions, which use each other as
+                    well as being used by the patches
+    objects         the number of objects on each canvas
+    depth           the number of directory levels the files are put in
+    nesting         the depth of subpatches in each patch, each canvas
+                    but the deepest has one subpatch
+    fan_out         the number of abstractions used on each canvas
+    dupes           the number of abstractions with a second file of
+                    the same name, so that their names resolve to two
+                    files
+    seed            the random seed
+
+Run with pypd on the Python path to write a library to a directory:
+
+    python bench/make_corpus.py dir [name=value ...]"""
+
+import os
+import sys
+import random
+
+
+DEFAULTS = dict(patches=200, abstractions=50, objects=20, depth=3,
+                nesting=2, fan_out=3, dupes=5, seed=0)
+
+OBJECTS = ['osc~ 440', 'phasor~ 1', '*~ 0.5', 'dac~', 'f', '+ 1',
+           't b b', 'pack f f', 'metro 100', 'route 1 2 3', 's bus',
+           'r bus', 'mtof', 'line~', 'vline~', 'expr $f1*2']
+ATOMS = ['#X msg %d %d 1 2 3 \\; pd dsp 1',
+         '#X floatatom %d %d 5 0 0 0 - - -',
+         '#X text %d %d a comment \\, with an escape']
+DIRS = ['audio', 'control', 'util', 'gui', 'fx']
+EXT = '.pd'
+
+
+def _canvas_lines(rand, params, abs_names, level):
+    """Return the lines of the objects on one canvas and its subpatches,
+    and the number of objects on the canvas."""
+    lines, count = [], 0
+    for i in xrange(params['objects']):
+        y = 10 + 30 * i
+        if i % 7 == 6:
+            lines.append(rand.choice(ATOMS) % (10, y) + ';\n')
+        else:
+            lines.append('#X obj 10 %d %s;\n' % (y, rand.choice(OBJECTS)))
+        count += 1
+    for name in rand.sample(abs_names, min(params['fan_out'],
+                                           len(abs_names))):
+        lines.append('#X obj 200 %d %s;\n' % (10 + 30 * count, name))
+        count += 1
+    if level < params['nesting']:
+        lines.append('#N canvas 0 0 450 300 sub%d 0;\n' % level)
+        sub_lines, _ = _canvas_lines(rand, params, abs_names, level + 1)
+        lines.extend(sub_lines)
+        lines.append('#X restore 300 10 pd sub%d;\n' % level)
+        count += 1
+    # Chain the objects, as most patches connect most of their objects
+    lines.extend(['#X connect %d 0 %d 0;\n' % (i, i + 1) \
+                  for i in xrange(0, count - 1, 2)])
+    return lines, count
+
+
+def _patch_text(rand, params, abs_names):
+    lines = ['#N canvas 0 0 450 300 10;\n']
+    lines.extend(_canvas_lines(rand, params, abs_names, 0)[0])
+    return ''.join(lines)
+
+
+def _directory(rand, depth):
+    return os.path.join(*[rand.choice(DIRS) for _ in xrange(depth)] or [''])
+
+
+def make_corpus(root, **params):
+    """Write a library to the directory root with the given parameters,
+    see DEFAULTS for the default values.
+
+    Returns a dict with the sorted lists of the 'patches' and
+    'abstractions' paths written and the object 'names' the abstractions
+    are used by. root is created if it doesn't exist."""
+    for key in params:
+        if key not in DEFAULTS:
+            raise ValueError('Unknown corpus parameter %s' % key)
+    params = dict(DEFAULTS, **params)
+    rand = random.Random(params['seed'])
+
+    abs_paths, names = [], []
+    for i in xrange(params['abstractions']):
+        dirname = _directory(rand, params['depth'])
+        abs_paths.append(os.path.join(root, dirname, 'abs%d%s' % (i, EXT)))
+        # Some abstractions are used with their directory
+        if dirname and not i % 3:
+            names.append('%s/abs%d' % (os.path.basename(dirname), i))
+        else:
+            names.append('abs%d' % i)
+
+    files = []
+    for i, path in enumerate(abs_paths):
+        # An abstraction only uses those after it, so there are no cycles
+        files.append((path, _patch_text(rand, params, names[i + 1:])))
+    for path in rand.sample(abs_paths, min(params['dupes'],
+                                           len(abs_paths))):
+        files.append((os.path.join(root, 'dupes', os.path.basename(path)),
+                      _patch_text(rand, params, [])))
+    patch_paths = []
+    for i in xrange(params['patches']):
+        path = os.path.join(root, _directory(rand, params['depth']),
+                            'patch%d%s' % (i, EXT))
+        patch_paths.append(path)
+        files.append((path, _patch_text(rand, params, names)))
+
+    for path, text in files:
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(path, 'w') as f:
+            f.write(text)
+    return dict(patches=sorted(patch_paths),
+                abstractions=sorted([path for path, _ in \
+                                     files[:len(files) - len(patch_paths)]]),
+                names=names)
+
+
+def parse_params(args):
+    """Return a dict of the parameters given as name=value strings."""
+    params = {}
+    for arg in args:
+        name, sep, value = arg.partition('=')
+        if not sep:
+            raise ValueError('Expected name=value, not %s' % arg)
+        if name not in DEFAULTS:
+            raise ValueError('Unknown corpus parameter %s' % name)
+        params[name] = int(value)
+    return params
+
+
+def main(argv):
+    if len(argv) < 2:
+        print >> sys.stderr, 'usage: %s dir [name=value ...]' % argv[0]
+        return 2
+    try:
+        params = parse_params(argv[2:])
+    except ValueError, ex:
+        print >> sys.stderr, ex
+        return 2
+    info = make_corpus(argv[1], **params)
+    print '%d patches, %d abstractions' % (len(info['patches']),
+                                           len(info['abstractions']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+"""Run the benchmark suite on a synthetic library and record the results.
+
+A library is generated with make_corpus.py in a temporary directory and
+each of the benchmarks below is run several times. The best time of each
+is shown, and with --json the results are saved in a JSON file along with
+the corpus parameters, Python version and git revision, so that runs of
+different versions can be compared:
+
+    parse           parse every patch, read from memory
+    scan            xevents over every patch, without building Trees
+    traverse        iterate over every node of every Tree
+    select          select the object boxes of every Tree
+    flatten         flatten every Tree
+    equality        compare every Tree with a copy of it
+    find_files      PatchFiles scan of the library in one process
+    resolve         resolve every object name used by every patch
+    config          write a config file and read every key back
+    known_reader    parse vanilla.txt
+
+With --compare the best times are compared with those in an earlier JSON
+file. The exit status is 1 if any benchmark is slower than the earlier
+time by more than the threshold factor.
+
+Run with pypd on the Python path:
+
+    python bench/suite.py [options] [name=value ...]
+
+where the name=value arguments are corpus parameters, see
+make_corpus.py."""
+
+import os
+import sys
+import time
+import json
+import shutil
+import platform
+import tempfile
+import subprocess
+from optparse import OptionParser
+import pypd
+from pypd import pypd_patch, pypd_known_reader, pypd_class_attrs
+from make_corpus import make_corpus, parse_params, DEFAULTS
+
+
+FORMAT = 'pypd-bench-1'
+CONFIG_KEYS = 2000
+
+
+def _read_lines(paths):
+    lines = []
+    for path in paths:
+        with open(path) as f:
+            lines.append(f.readlines())
+    return lines
+
+
+class Context(object):
+
+    """The library and the data shared by the benchmarks."""
+
+    def __init__(self, root, info):
+        self.root = root
+        self.patches = info['patches']
+        self.all_paths = info['patches'] + info['abstractions']
+        self.lines = _read_lines(self.all_paths)
+        self.trees = [pypd_patch.parse(lines) for lines in self.lines]
+        self.copies = [pypd_patch.parse(lines) for lines in self.lines]
+        self.files = pypd.PatchFiles([root], processes=1)
+        self.config_path = os.path.join(root, 'bench.cfg')
+
+
+def bench_parse(ctx):
+    for lines in ctx.lines:
+        pypd_patch.parse(lines)
+
+
+def bench_scan(ctx):
+    for lines in ctx.lines:
+        for _ in pypd_patch.xevents(lines):
+            pass
+
+
+def bench_traverse(ctx):
+    for tree in ctx.trees:
+        for _ in tree:
+            pass
+
+
+def bench_select(ctx):
+    pred = lambda node, depth: node.value.element == 'obj'
+    for tree in ctx.trees:
+        for _ in tree.select(pred):
+            pass
+
+
+def bench_flatten(ctx):
+    for tree in ctx.trees:
+        tree.flatten()
+
+
+def bench_equality(ctx):
+    for tree, copy in zip(ctx.trees, ctx.copies):
+        if tree != copy:
+            raise AssertionError('Trees are not equal')
+
+
+def bench_find_files(ctx):
+    pypd.PatchFiles([ctx.root], processes=1)
+
+
+def bench_resolve(ctx):
+    for path in ctx.patches:
+        ctx.files.dependencies(path)
+
+
+def bench_config(ctx):
+    if os.path.exists(ctx.config_path):
+        os.unlink(ctx.config_path)
+    cfg = pypd.Config(ctx.config_path, flush=False)
+    for i in xrange(CONFIG_KEYS):
+        cfg['key%d' % i] = 'value%d' % i
+    cfg['list'] = ['item%d' % i for i in xrange(CONFIG_KEYS / 10)]
+    cfg.write()
+    cfg = pypd.Config(ctx.config_path, flush=False)
+    for i in xrange(CONFIG_KEYS):
+        cfg['key%d' % i]
+    cfg['list']
+
+
+def bench_known_reader(ctx):
+    with open(pypd_class_attrs.KNOWN_PATH) as f:
+        lines = f.readlines()
+    for _ in xrange(20):
+        pypd_known_reader._parse_known_lines(lines)
+
+
+BENCHMARKS = [('parse', bench_parse), ('scan', bench_scan),
+              ('traverse', bench_traverse), ('select', bench_select),
+              ('flatten', bench_flatten), ('equality', bench_equality),
+              ('find_files', bench_find_files), ('resolve', bench_resolve),
+              ('config', bench_config), ('known_reader', bench_known_reader)]
+
+
+def run(ctx, names, repeat):
+    """Return a dict of name -> {'best', 'mean', 'runs'} for each of the
+    named benchmarks."""
+    results = {}
+    for name, fn in BENCHMARKS:
+        if name not in names:
+            continue
+        runs = []
+        for _ in xrange(repeat):
+            start = time.time()
+            fn(ctx)
+            runs.append(time.time() - start)
+        results[name] = dict(best=min(runs), mean=sum(runs) / len(runs),
+                             runs=runs)
+    return results
+
+
+def revision():
+    """Return the git revision of the pypd source, or None."""
+    try:
+        proc = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                cwd=os.path.dirname(pypd.__file__),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    out, _ = proc.communicate()
+    return proc.returncode == 0 and out.strip() or None
+
+
+def compare(results, baseline, threshold):
+    """Print the ratio of each best time to the baseline's and return the
+    names of the benchmarks slower by more than threshold."""
+    slower = []
+    for name, _ in BENCHMARKS:
+        if name not in results or name not in baseline['results']:
+            continue
+        ratio = results[name]['best'] / baseline['results'][name]['best']
+        flag = ''
+        if ratio > threshold:
+            slower.append(name)
+            flag = ' slower'
+        print '%-14s %10.4f %10.4f %8.2f%s' % \
+              (name, baseline['results'][name]['best'],
+               results[name]['best'], ratio, flag)
+    return slower
+
+
+def main(argv):
+    parser = OptionParser(usage='%prog [options] [name=value ...]')
+    parser.add_option('-r', '--repeat', type='int', default=5,
+                      help='the number of runs of each benchmark')
+    parser.add_option('-b', '--bench', default=None,
+                      help='comma separated names of the benchmarks to run')
+    parser.add_option('-j', '--json', default=None,
+                      help='save the results to this file')
+    parser.add_option('-c', '--compare', default=None,
+                      help='compare the results with this saved file')
+    parser.add_option('-t', '--threshold', type='float', default=1.25,
+                      help='the slow down that counts as a regression')
+    options, args = parser.parse_args(argv[1:])
+    try:
+        params = dict(DEFAULTS, **parse_params(args))
+    except ValueError, ex:
+        parser.error(str(ex))
+    names = options.bench and options.bench.split(',') or \
+            [name for name, _ in BENCHMARKS]
+    unknown = set(names) - set([name for name, _ in BENCHMARKS])
+    if unknown:
+        parser.error('Unknown benchmark(s) %s' % ', '.join(sorted(unknown)))
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        ctx = Context(tmpdir, make_corpus(tmpdir, **params))
+        results = run(ctx, names, options.repeat)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    data = dict(format=FORMAT, time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                revision=revision(), python=platform.python_version(),
+                platform=platform.platform(), corpus=params,
+                repeat=options.repeat, results=results)
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('corpus') != params:
+            print 'warning: the corpus parameters are not the same'
+        print '%-14s %10s %10s %8s' % ('', 'baseline', 'best', 'ratio')
+        return compare(results, baseline, options.threshold) and 1 or 0
+
+    print '%-14s %10s %10s' % ('', 'best', 'mean')
+    for name, _ in BENCHMARKS:
+        if name in results:
+            print '%-14s %10.4f %10.4f' % (name, results[name]['best'],
+                                           results[name]['mean'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
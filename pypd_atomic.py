@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""Replace files atomically, so readers never see a partly written file.
+
+A file is written to a temporary file in the same directory, flushed to
+disk and renamed over the original. The new file keeps the permissions of
+the file it replaces, a new file gets the default permissions for the
+current umask rather than the owner only permissions of a temporary
+file."""
+
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+
+
+TMP_PREFIX = '.tmp'
+
+
+def default_mode():
+    """Return the permissions given to a new file by the current umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0666 & ~umask
+
+
+def file_mode(path):
+    """Return the permissions of the file path, or default_mode() if it
+    doesn't exist."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        return default_mode()
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """Yield a file open for writing that replaces path when the with block
+    completes (context manager). mode is the mode the file is opened with,
+    'w' or 'wb'.
+
+    If the block raises an exception path is left unchanged."""
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=TMP_PREFIX, dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, file_mode(path))
+        os.rename(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""A persistent on-disk cache of the results of parsing patch files.
+
+Each entry is stored in a separate file in the cache directory. The name of
+the file is derived from the path of the patch file and its contents are a
+marshalled tuple of the patch file's path, modification time, size,
+optional content hash and the parsed result. An entry is only used if the
+modification time and size of the patch file are unchanged, or if content
+hashing is enabled and the contents are unchanged.
+
+Entries are written with pypd_atomic.atomic_write, to a temporary file
+that is renamed into place, so several processes may safely share the
+same cache directory. When the total size of the entries exceeds the
+configured maximum the least recently used entries are removed."""
+
+import os
+import errno
+import marshal
+import hashlib
+from pypd_atomic import atomic_write
+
+
+# Config keys for the cache settings
+CACHE_DIR_KEY = 'cache_dir'
+CACHE_MAX_BYTES_KEY = 'cache_max_bytes'
+CACHE_HASH_KEY = 'cache_hash'
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+ENTRY_EXT = '.pdc'
+_MARSHAL_VERSION = 2
+
+
+def _digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class ParseCache(object):
+
+    """Cache the result of parsing each patch file on disk."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES,
+                 use_hash=False):
+        """Use the given cache directory, creating it if necessary.
+
+        If use_hash is true a hash of each patch file's contents is stored
+        so that entries are still used when only the modification time of
+        the file has changed, e.g. after a fresh checkout."""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.use_hash = use_hash
+        self.hits = self.misses = 0
+        try:
+            os.makedirs(directory)
+        except OSError, ex:
+            if ex.errno != errno.EEXIST:
+                raise
+
+        # An estimate of the bytes used by the cache. The cache directory is
+        # only rescanned when this exceeds max_bytes, other processes
+        # may be adding entries too.
+        self._bytes = self._entries_size()
+
+    @staticmethod
+    def from_config(config):
+        """Create a cache from the settings in a Config instance.
+
+        Returns None if no cache directory is configured."""
+        directory = config.get(CACHE_DIR_KEY)
+        if not directory:
+            return None
+        max_bytes = int(config.get(CACHE_MAX_BYTES_KEY) or DEFAULT_MAX_BYTES)
+        use_hash = (config.get(CACHE_HASH_KEY) or '').lower() in \
+                   ('1', 'yes', 'true', 'on')
+        return ParseCache(directory, max_bytes, use_hash)
+
+    @staticmethod
+    def key(path):
+        """Return the (mtime, size) of the given file."""
+        st = os.stat(path)
+        return st.st_mtime, st.st_size
+
+    def _entry_path(self, path):
+        name = hashlib.sha1(os.path.abspath(path)).hexdigest()
+        return os.path.join(self.directory, name + ENTRY_EXT)
+
+    def get(self, path, key=None):
+        """Return the cached result for the given file or None.
+
+        key should be the value returned by key() for the file. If not
+        given it's read from the file."""
+        if key is None:
+            key = self.key(path)
+        entry_path = self._entry_path(path)
+        try:
+            with open(entry_path, 'rb') as f:
+                epath, mtime, size, digest, result = marshal.load(f)
+        except (IOError, EOFError, ValueError, TypeError):
+            # Not cached or not a valid entry
+            self.misses += 1
+            return None
+
+        if epath != os.path.abspath(path) or size != key[1]:
+            self.misses += 1
+            return None
+
+        if mtime != key[0]:
+            try:
+                same = self.use_hash and digest and digest == _digest(path)
+            except IOError:
+                # The file has gone since key() was called
+                same = False
+            if not same:
+                self.misses += 1
+                return None
+            # Only the modification time has changed, update the entry so
+            # the file doesn't need to be hashed again.
+            self.put(path, result, key)
+        else:
+            # Mark the entry as recently used
+            try:
+                os.utime(entry_path, None)
+            except OSError:
+                pass
+        self.hits += 1
+        return result
+
+    def put(self, path, result, key):
+        """Store the result of parsing the given file.
+
+        key should be the value returned by key() before the file was
+        parsed. The result isn't stored if the file has changed or been
+        removed since. result must be made up of types supported by
+        marshal."""
+        try:
+            if self.key(path) != key:
+                return False
+            digest = self.use_hash and _digest(path) or None
+        except (IOError, OSError):
+            return False
+        data = marshal.dumps((os.path.abspath(path), key[0], key[1],
+                              digest, result), _MARSHAL_VERSION)
+
+        with atomic_write(self._entry_path(path), 'wb') as f:
+            f.write(data)
+
+        self._bytes += len(data)
+        if self._bytes > self.max_bytes:
+            self.evict()
+        return True
+
+    def _entries(self):
+        """Return a list of (atime, size, path) for each cache entry."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_EXT):
+                continue
+            entry_path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(entry_path)
+            except OSError:
+                # Removed by another process
+                continue
+            entries.append((max(st.st_atime, st.st_mtime), st.st_size,
+                            entry_path))
+        return entries
+
+    def _entries_size(self):
+        return sum([size for _, size, _ in self._entries()])
+
+    def evict(self):
+        """Remove the least recently used entries until within max_bytes.
+
+        The cache is reduced to 90% of max_bytes so that eviction isn't
+        needed again for a while."""
+        entries = self._entries()
+        total = sum([size for _, size, _ in entries])
+        target = self.max_bytes * 9 / 10
+        entries.sort()
+        for _, size, entry_path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(entry_path)
+            except OSError, ex:
+                if ex.errno != errno.ENOENT:
+                    raise
+            total -= size
+        self._bytes = total
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        for _, _, entry_path in self._entries():
+            try:
+                os.unlink(entry_path)
+            except OSError, ex:
+                if ex.errno != errno.ENOENT:
+                    raise
+        self._bytes = 0
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+"""Map PD elements and objects onto their attribute names.
+
+The attribute names are read from one or more "known objects" files by
+pypd_known_reader, see that module for details of the file format. The
+first file is normally vanilla.txt, later files (e.g. for pd-extended or
+site-local objects) add to or replace the definitions of earlier ones.
+
+The files are read once into a lookup table of shared Layout instances.
+Each object name and alias maps directly onto the Layout for the obj
+element extended by that object's own attributes, so looking up the
+attributes for any line of a patch is a single dict lookup. The table can
+also be dumped to and loaded from a compiled (marshal) file, which is
+faster to load than parsing the text files."""
+
+import os
+import marshal
+import pypd_known_reader
+
+
+KNOWN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'vanilla.txt')
+
+# The element name that has its attributes extended by the object's own
+# attributes, e.g. "#X obj 10 10 osc~ 440"
+OBJ = 'obj'
+OBJ_NAME_INDEX = 2
+# There are two canvas definitions. One with 5 parameters for the top
+# level canvas, 6 for subpatches.
+CANVAS = 'canvas'
+CANVAS_5 = 'canvas-5'
+CANVAS_6 = 'canvas-6'
+
+_MARSHAL_VERSION = 2
+
+
+class Layout(object):
+
+    """The attribute names shared by all Objects of the same type.
+
+    One instance is created for each distinct list of attribute names and
+    shared by every Object with those attributes. It maps each attribute
+    name to the index of its value in the Object's params."""
+
+    __slots__ = ('attrs', 'index')
+
+    # Layouts indexed by their attribute names.
+    _layouts = {}
+
+    @staticmethod
+    def get(attrs):
+        """Return the shared Layout for the given attribute names."""
+        attrs = tuple([intern(attr) for attr in attrs])
+        try:
+            return Layout._layouts[attrs]
+        except KeyError:
+            layout = Layout._layouts[attrs] = Layout(attrs)
+            return layout
+
+    def __init__(self, attrs):
+        self.attrs = attrs
+        # If a name is repeated the last one wins, as it did when each
+        # Object had its own attribute dict.
+        self.index = dict([(name, i) for i, name in enumerate(attrs)])
+
+
+class _Table(object):
+
+    """The Layouts for every known element and object."""
+
+    def __init__(self, elements, objects, aliases):
+        """Build the table from the merged sections of the known files.
+
+        elements and objects map names to attribute lists, aliases maps
+        each alias to the object name it stands for."""
+        self.sections = (elements, objects, aliases)
+        # The merged known file sections the table was built from, if any
+        self.known = None
+        self.elements = dict([(intern(name), Layout.get(attrs)) \
+                              for name, attrs in elements.items()])
+        self.obj_layout = self.elements[OBJ]
+
+        obj_attrs = self.obj_layout.attrs
+        self.objects = dict([(intern(name), Layout.get(obj_attrs + attrs)) \
+                             for name, attrs in objects.items()])
+        for alias, name in aliases.items():
+            if name in self.objects:
+                self.objects[intern(alias)] = self.objects[name]
+
+
+def _sections(known):
+    """Return the elements, objects and aliases for _Table from the merged
+    sections of the known files."""
+    elements = dict([(name, tuple(attrs)) for name, attrs in \
+                     known.get('elements', {}).items()])
+    objects = dict([(name, tuple(attrs)) for name, attrs in \
+                    known.get('objects', {}).items()])
+    aliases = {}
+    for name, alias_list in known.get(pypd_known_reader.ALIASES, {}).items():
+        aliases.update([(alias, name) for alias in alias_list])
+    return elements, objects, aliases
+
+
+# The table is built on first use
+_table = None
+
+
+def load(paths=None):
+    """Build the lookup table from the given known objects files.
+
+    The default is to read vanilla.txt only. The files are read with
+    pypd_known_reader.read_layered(), so loading the same unchanged files
+    again keeps the current table."""
+    global _table
+    if paths is None:
+        paths = [KNOWN_PATH]
+    known = pypd_known_reader.read_layered(paths)
+    if _table is not None and _table.known is known:
+        return
+    _table = _Table(*_sections(known))
+    _table.known = known
+
+
+def dump(path):
+    """Write the current table to a compiled file for load_dump()."""
+    table = _table or _load_default()
+    with open(path, 'wb') as f:
+        marshal.dump(table.sections, f, _MARSHAL_VERSION)
+
+
+def load_dump(path):
+    """Load the table from a file written by dump()."""
+    global _table
+    with open(path, 'rb') as f:
+        _table = _Table(*marshal.load(f))
+
+
+def _load_default():
+    load()
+    return _table
+
+
+def layout(element, params):
+    """Return the Layout for the given element and params.
+
+    Raises KeyError if the element is not known."""
+    table = _table or _load_default()
+    if element == OBJ:
+        if len(params) > OBJ_NAME_INDEX:
+            return table.objects.get(params[OBJ_NAME_INDEX],
+                                     table.obj_layout)
+        return table.obj_layout
+    elif element == CANVAS:
+        return table.elements[len(params) == 5 and CANVAS_5 or CANVAS_6]
+    return table.elements[element]
+
+
+def get(element, params):
+    """Return the attribute names for the given element and params.
+
+    Raises KeyError if the element is not known."""
+    return layout(element, params).attrs
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+"""Find whether patches run on pd-vanilla or need pd-extended.
+
+The object names in the known objects files are compiled into frozen sets
+once, the vanilla objects from vanilla.txt and the extended objects from
+one or more extended files (see pypd_known_reader for the format). Each
+object box in a patch is then classified as:
+
+    VANILLA     a vanilla object or alias
+    EXTENDED    an object only in the extended files
+    UNKNOWN     neither, and not an abstraction that could be found
+
+An object that resolves to an abstraction (another patch file) has the
+compatibility of that abstraction, which is classified in turn. Each
+abstraction is classified once and the result is kept, so abstractions
+shared by many patches are only read once in a library wide run.
+
+The compatibility of a patch is the worst of its objects, and the objects
+that aren't vanilla are reported with the file and line they're on. An
+abstraction that uses itself, directly or indirectly, can't be loaded by
+PD so the object using it is UNKNOWN."""
+
+import pypd_patch
+import pypd_known_reader
+import pypd_class_attrs
+from pypd_class_attrs import OBJ, OBJ_NAME_INDEX
+from pypd_objectname import ObjectName
+from pypd_exceptions import PyPdException
+
+
+# Config key for the known objects files listing the pd-extended objects
+EXTENDED_PATH_KEY = 'extended_objects'
+
+VANILLA = 0
+EXTENDED = 1
+UNKNOWN = 2
+LEVEL_NAMES = ('vanilla', 'extended', 'unknown')
+
+_OBJECTS = 'objects'
+
+
+def _names(sections):
+    """Return a frozenset of the object names and aliases in sections."""
+    names = set(sections.get(_OBJECTS, {}))
+    for aliases in sections.get(pypd_known_reader.ALIASES, {}).values():
+        names.update(aliases)
+    return frozenset(names)
+
+
+class Result(object):
+
+    """The compatibility of a patch file or Tree.
+
+    level is VANILLA, EXTENDED or UNKNOWN. offending is a tuple of
+    (path, line_num, name, level) for each object that isn't vanilla, in
+    the patch or any abstraction it uses, sorted by path and line. For a
+    file that can't be read or parsed line_num is 0 and name is the
+    error."""
+
+    __slots__ = ('level', 'offending')
+
+    def __init__(self, level, offending):
+        self.level = level
+        self.offending = offending
+
+    @property
+    def name(self):
+        """The name of the level, e.g. "vanilla"."""
+        return LEVEL_NAMES[self.level]
+
+    def __repr__(self):
+        return '<Result %s, %d offending>' % (self.name, len(self.offending))
+
+
+# Returned for an abstraction that is already being classified
+_RECURSIVE = Result(UNKNOWN, ())
+
+
+class Classifier(object):
+
+    """Classify patches as VANILLA, EXTENDED or UNKNOWN."""
+
+    def __init__(self, extended_paths=(), resolve=None,
+                 vanilla_path=pypd_class_attrs.KNOWN_PATH):
+        """Compile the vanilla and extended object sets.
+
+        extended_paths are known objects files listing the pd-extended
+        objects. resolve(name, from_path) should return the list of
+        abstractions that an object name in the file from_path refers to,
+        e.g. PatchFiles.resolve. If it's None abstractions aren't looked
+        for and are UNKNOWN."""
+        self.vanilla = _names(pypd_known_reader.read(vanilla_path))
+        self.extended = _names(pypd_known_reader.read_layered(
+                                   extended_paths)) - self.vanilla
+        self.resolve = resolve
+        # Abstraction path -> Result
+        self._results = {}
+        # Abstraction path -> the paths whose results depend on it
+        self._users = {}
+        # Abstractions being classified, to stop at recursive uses
+        self._active = set()
+
+    def _name_level(self, name):
+        """Return the level of an object name that isn't an abstraction,
+        or None if the name isn't known."""
+        if name in self.vanilla:
+            return VANILLA
+        if name in self.extended:
+            return EXTENDED
+        # Extended objects are often used with their library name, e.g.
+        # "cyclone/comment"
+        try:
+            rname = ObjectName.intern(name).rname
+        except ValueError:
+            return None
+        if rname != name and rname in self.extended:
+            return EXTENDED
+        return None
+
+    def _classify(self, path, objects):
+        """Return the Result for (line_num, name) of each object box in
+        the file path, and the set of abstractions used."""
+        level, offending, used = VANILLA, [], set()
+        for line_num, name in objects:
+            name_level = self._name_level(name)
+            if name_level == VANILLA:
+                continue
+
+            abs_paths = []
+            if self.resolve is not None:
+                try:
+                    abs_paths = self.resolve(name, path)
+                except ValueError:
+                    # Not a valid object name
+                    pass
+            if abs_paths:
+                # PD uses the first abstraction found
+                result = self.classify_file(abs_paths[0])
+                used.add(abs_paths[0])
+                level = max(level, result.level)
+                if result is _RECURSIVE:
+                    offending.append((path, line_num, name, UNKNOWN))
+                else:
+                    offending.extend(result.offending)
+            else:
+                if name_level is None:
+                    name_level = UNKNOWN
+                level = max(level, name_level)
+                offending.append((path, line_num, name, name_level))
+
+        # Remove the duplicates from abstractions used more than once
+        return Result(level, tuple(sorted(set(offending)))), used
+
+    def classify_tree(self, tree, path=None):
+        """Classify a parsed patch Tree.
+
+        path is the file the tree was parsed from. It's used to resolve
+        abstractions relative to the patch and in the offending
+        objects."""
+        objects = [(node.value.line_num,
+                    node.value.params[OBJ_NAME_INDEX]) \
+                   for node, _ in tree.select(lambda node, depth: \
+                       node.value.element == OBJ and \
+                       len(node.value.params) > OBJ_NAME_INDEX)]
+        return self._classify(path, objects)[0]
+
+    def classify_file(self, path):
+        """Classify a patch file. The result is kept and returned again
+        for the same file, see forget() and clear()."""
+        result = self._results.get(path)
+        if result is not None:
+            return result
+        if path in self._active:
+            return _RECURSIVE
+
+        self._active.add(path)
+        used = ()
+        try:
+            with open(path) as f:
+                objects = [(line_num, params[OBJ_NAME_INDEX]) \
+                           for _, line_num, _, element, params in \
+                           pypd_patch.xevents(f) \
+                           if element == OBJ and len(params) > OBJ_NAME_INDEX]
+            result, used = self._classify(path, objects)
+        except (PyPdException, IOError), ex:
+            result = Result(UNKNOWN, ((path, 0, str(ex), UNKNOWN),))
+        finally:
+            self._active.discard(path)
+
+        self._results[path] = result
+        for abs_path in used:
+            self._users.setdefault(abs_path, set()).add(path)
+        return result
+
+    def forget(self, path):
+        """Forget the result for a file that has changed, and for every
+        file that uses it."""
+        paths = [path]
+        while paths:
+            path = paths.pop()
+            self._results.pop(path, None)
+            paths.extend(self._users.pop(path, ()))
+
+    def clear(self):
+        """Forget all the results, e.g. when abstractions are added or
+        removed and object names may resolve differently."""
+        self._results.clear()
+        self._users.clear()
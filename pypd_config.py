@@ -1,6 +1,16 @@
 #!/usr/bin/env python
 
+import os
+import re
 import ConfigParser
+from contextlib import contextmanager
+from pypd_atomic import atomic_write
+
+try:
+    import fcntl
+except ImportError:
+    # No file locking on this platform
+    fcntl = None
 
 
 class Config(object):
@@ -8,29 +18,99 @@ class Config(object):
     """Get/Set preference values in a PyPD config file."""
 
     SECTION = 'install'
+    LOCK_EXT = '.lock'
+
+    # Multiple values for a key are stored in keys of the form key_%d
+    _subkey_re = re.compile(r'^(.+)_(\d+)$')
+
+    def __init__(self, filename, flush=True, lock=False):
+        """Read and parse a PyPD config file.
 
-    def __init__(self, filename, flush=True):
-        """Read and parse a PyPD config file."""
+        If lock is true, writes and batches of changes hold an exclusive
+        lock on filename + LOCK_EXT so that concurrent writers in other
+        processes are serialised. Under the lock the config file is read
+        again and only the keys changed by this instance are written over
+        it, so the changes made by other writers are kept."""
         self.filename = filename
         self._config = None
+        # The keys changed since the last write, key -> value or None if
+        # the key was removed
+        self._changes = {}
         self._flush = flush
+        self._lock = lock
+        self._lock_fd = None
+        self._batch_depth = 0
+        self._read()
+
+        if not self._config.has_section(self.SECTION):
+            self._config.add_section(self.SECTION)
+            if self._flush:
+                self.write()
+
+    def _read(self):
         self._config = ConfigParser.RawConfigParser()
         self._config.read(self.filename)
 
         if self._config.has_section(self.SECTION):
-            self._items = dict(self._config.items(self.SECTION))
+            self._set_items(dict(self._config.items(self.SECTION)))
         else:
+            self._set_items({})
+
+    def _reread(self):
+        """Read the config file again, keeping the changes that haven't
+        been written yet."""
+        changes = self._changes
+        self._read()
+        if not self._config.has_section(self.SECTION):
             self._config.add_section(self.SECTION)
-            self._items = {}
-            if self._flush:
-                self.write()
+        for k, v in changes.items():
+            if v is None:
+                if self._items.pop(k, None) is not None:
+                    self._config.remove_option(self.SECTION, k)
+                    self._index_remove(k)
+            else:
+                self._config.set(self.SECTION, k, v)
+                if k not in self._items:
+                    self._index_add(k)
+                self._items[k] = v
+
+    def _set_items(self, items):
+        self._items = items
+
+        # An index of the numbered keys used for multiple values. Maps
+        # each base key to a dict of number to the numbered key, e.g.
+        # {'key': {1: 'key_1', 2: 'key_2'}}
+        self._subkeys = {}
+        for k in items:
+            self._index_add(k)
+
+    def _index_add(self, k):
+        match = self._subkey_re.match(k)
+        if match:
+            base, n = match.groups()
+            self._subkeys.setdefault(base, {})[int(n)] = k
+
+    def _index_remove(self, k):
+        match = self._subkey_re.match(k)
+        if match:
+            base, n = match.groups()
+            subkeys = self._subkeys.get(base)
+            if subkeys is not None:
+                subkeys.pop(int(n), None)
+                if not subkeys:
+                    del self._subkeys[base]
 
     def _set_flush(self, newval):
         if newval != self._flush:
             self._flush = newval
-            if newval and self._config:
+            if newval and self._config and not self._batch_depth:
                 self.write()
 
+    def _changed(self):
+        """Write out the changes if flush is on and we're not in a batch."""
+        if self._flush and not self._batch_depth:
+            self.write()
+
     flush = property(lambda self: self._flush, _set_flush, doc="""\
     When flush is true changes are written to the config file immediately.
 
@@ -51,10 +131,9 @@ class Config(object):
         except KeyError, ex:
             keyex = ex
 
-        val = [self._items[k] for k in self._items.keys() \
-               if k.startswith('%s_' % key)]
-        if val:
-            return val
+        subkeys = self._subkeys.get(key)
+        if subkeys:
+            return [self._items[subkeys[n]] for n in sorted(subkeys)]
         elif doex:
             raise keyex
         else:
@@ -73,7 +152,10 @@ class Config(object):
         Value may be single valued or a list of values."""
         if isinstance(value, basestring):
             self._config.set(self.SECTION, key, value)
+            if key not in self._items:
+                self._index_add(key)
             self._items[key] = value
+            self._changes[key] = value
         else:
             # Treat value as a sequence of values, each written with a separate
             # key. This is easier than parsing a config file for lists.
@@ -83,45 +165,46 @@ class Config(object):
             # saved in a separate key, which removes the need to parse a
             # multi-valued string when reading them back in.
 
-            # Find the number of existing keys that start with the given key
-            n = sum([k.startswith('%s_' % key) \
-                    for k in self._items.keys()]) + 1
+            # Number the new keys after the existing keys for this key
+            subkeys = self._subkeys.setdefault(key, {})
+            n = subkeys and max(subkeys) + 1 or 1
 
             for i, v in enumerate(value):
                 k = '%s_%d' % (key, i + n)
                 self._config.set(self.SECTION, k, v)
                 self._items[k] = v
+                self._changes[k] = v
+                subkeys[i + n] = k
+            if not subkeys:
+                del self._subkeys[key]
 
-        if self._flush:
-            self.write()
+        self._changed()
 
     def _delete(self, key, doex=False):
         # We may have a single key, or multiple keys of the form key_%d
         try:
             del self._items[key]
             self._config.remove_option(self.SECTION, key)
+            self._index_remove(key)
+            self._changes[key] = None
             keyex = None
         except KeyError, ex:
             keyex = ex
 
-        def rm(k):
-            if k.startswith('%s_' % key):
-                del self._items[k]
-                self._config.remove_option(self.SECTION, k)
-                return True
-            else:
-                return False
+        subkeys = self._subkeys.pop(key, {})
+        for k in subkeys.values():
+            del self._items[k]
+            self._config.remove_option(self.SECTION, k)
+            self._changes[k] = None
 
-        changed = any(map(rm, self._items.keys()))
-        if keyex and not changed:
+        if keyex and not subkeys:
             # No single or multiple keys found
             if doex:
                 raise keyex
             else:
                 return False
 
-        if self._flush:
-            self.write()
+        self._changed()
         return True
 
     def __delitem__(self, key):
@@ -132,12 +215,85 @@ class Config(object):
         """Remove key from config file. Return T/F for found/not found."""
         return self._delete(key, doex=False)
 
+    @contextmanager
+    def batch(self):
+        """Make a batch of changes and write them out once (context manager).
+
+        Within the with block changes are not written out, even if flush is
+        on. When the block completes, the changes are written once if flush
+        is on. If the block raises an exception all changes made within it
+        are discarded. Batches may be nested, only the outermost batch
+        writes.
+
+        If locking is on, the lock is held for the whole batch and the
+        config file is re-read at the start so that changes made by other
+        processes aren't lost. Changes made before the batch that haven't
+        been written yet are kept."""
+        if self._batch_depth:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            return
+
+        self._acquire_lock()
+        try:
+            if self._lock:
+                self._reread()
+            saved = dict(self._items), dict(self._changes)
+            self._batch_depth = 1
+            try:
+                yield self
+            except:
+                self._restore(*saved)
+                raise
+            finally:
+                self._batch_depth = 0
+            if self._flush:
+                self.write()
+        finally:
+            self._release_lock()
+
+    def _restore(self, items, changes):
+        self._config.remove_section(self.SECTION)
+        self._config.add_section(self.SECTION)
+        for k, v in items.items():
+            self._config.set(self.SECTION, k, v)
+        self._set_items(items)
+        self._changes = changes
+
+    def _acquire_lock(self):
+        if not (self._lock and fcntl) or self._lock_fd is not None:
+            return False
+        self._lock_fd = os.open(self.filename + self.LOCK_EXT,
+                                os.O_RDWR | os.O_CREAT, 0666)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        return True
+
+    def _release_lock(self):
+        if self._lock_fd is not None:
+            try:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
     def write(self):
-        """Write the config data out to the config file."""
-        fd = None
+        """Write the config data out to the config file.
+
+        The data is written to a temporary file which is then renamed over
+        the config file, so readers never see a partially written file. If
+        locking is on the config file is read again first, see
+        __init__()."""
+        locked = self._acquire_lock()
         try:
-            fd = open(self.filename, 'w')
-            self._config.write(fd)
+            if locked:
+                # In a batch the file was read when the lock was taken
+                self._reread()
+            with atomic_write(self.filename) as f:
+                self._config.write(f)
+            self._changes = {}
         finally:
-            if fd:
-                fd.close()
+            if locked:
+                self._release_lock()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+"""A read-only store of many parsed patches in a single file.
+
+Each patch Tree is saved with pypd_treefile. The file is:
+
+    MAGIC               8 bytes, the format name and version
+    index offset        8 bytes, little endian
+    index length        8 bytes, little endian
+    trees               each saved Tree, one after another
+    index               marshalled dict of patch path -> (offset, length)
+
+A Corpus memory maps the file and reads only the index when it's opened.
+Each Tree is loaded from the mapping when it's asked for, so only the pages
+holding that Tree are read. The mapping is read-only and shared, so worker
+processes opening (or inheriting) the same corpus share a single copy of
+it in the page cache.
+
+A corpus is written by CorpusWriter to a temporary file which is renamed
+into place when it's complete, so readers never see a partial corpus."""
+
+import os
+import mmap
+import struct
+import marshal
+import tempfile
+import pypd_patch
+import pypd_treefile
+from pypd_atomic import TMP_PREFIX, file_mode
+from pypd_exceptions import PyPdException
+
+
+MAGIC = 'PYPDCRP1'
+_HEADER = struct.Struct('<8sQQ')
+_MARSHAL_VERSION = 2
+
+
+class CorpusWriter(object):
+
+    """Write parsed patches to a new corpus file.
+
+    Use as a context manager, or call close() when all the patches have
+    been added. The corpus file only appears when close() is called. It
+    has the permissions of the corpus file it replaces, or those of a new
+    file for the umask, so other users can open it."""
+
+    def __init__(self, path):
+        self.path = path
+        self._index = {}
+        fd, self._tmp_path = tempfile.mkstemp(
+            prefix=TMP_PREFIX, dir=os.path.dirname(os.path.abspath(path)))
+        self._file = os.fdopen(fd, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, 0, 0))
+        self._offset = _HEADER.size
+
+    def add(self, patch_path, tree):
+        """Add the Tree parsed from patch_path, replacing any previous
+        one."""
+        data = pypd_treefile.dumps(tree)
+        self._file.write(data)
+        self._index[patch_path] = (self._offset, len(data))
+        self._offset += len(data)
+
+    def add_file(self, patch_path):
+        """Parse the given patch file and add it.
+
+        Raises InvalidLine or InvalidPatch if the file can't be parsed."""
+        self.add(patch_path, pypd_patch.Patch(patch_path).tree)
+
+    def close(self):
+        """Write the index and move the corpus file into place."""
+        if self._file is None:
+            return
+        try:
+            index = marshal.dumps(self._index, _MARSHAL_VERSION)
+            self._file.write(index)
+            self._file.seek(0)
+            self._file.write(_HEADER.pack(MAGIC, self._offset, len(index)))
+            self._file.close()
+            os.chmod(self._tmp_path, file_mode(self.path))
+            os.rename(self._tmp_path, self.path)
+        except:
+            self.abort()
+            raise
+        self._file = None
+
+    def abort(self):
+        """Discard the corpus being written."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.unlink(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, traceback):
+        if ex_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def build(path, patch_paths):
+    """Write a corpus of the given patch files.
+
+    Returns a dict of the error text for each file that couldn't be parsed,
+    those files are left out of the corpus."""
+    errors = {}
+    with CorpusWriter(path) as writer:
+        for patch_path in patch_paths:
+            try:
+                writer.add_file(patch_path)
+            except (PyPdException, IOError), ex:
+                errors[patch_path] = str(ex)
+    return errors
+
+
+class Corpus(object):
+
+    """A memory mapped corpus file written by CorpusWriter."""
+
+    def __init__(self, path):
+        """Open the given corpus file.
+
+        Raises ValueError if the file is not a corpus."""
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # An empty file can't be mapped
+                raise ValueError('%s is not a pypd corpus' % path)
+
+        try:
+            magic, offset, length = _HEADER.unpack(self._map[:_HEADER.size])
+            if magic != MAGIC:
+                raise ValueError
+            self._index = marshal.loads(self._map[offset:offset + length])
+            if not isinstance(self._index, dict):
+                raise ValueError
+        except (struct.error, ValueError, EOFError, TypeError):
+            self.close()
+            raise ValueError('%s is not a pypd corpus' % path)
+
+    def __len__(self):
+        """Return the number of patches in the corpus."""
+        return len(self._index)
+
+    def __contains__(self, patch_path):
+        return patch_path in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def paths(self):
+        """Return a list of the patch paths in the corpus."""
+        return self._index.keys()
+
+    def tree(self, patch_path):
+        """Load and return the Tree for the given patch path.
+
+        A new Tree is returned each time. Raises KeyError if the patch is
+        not in the corpus and ValueError if the corpus has been closed."""
+        if self._map is None:
+            raise ValueError('Corpus is closed')
+        offset, length = self._index[patch_path]
+        return pypd_treefile.loads(self._map[offset:offset + length])
+
+    __getitem__ = tree
+
+    def get(self, patch_path, default=None):
+        """Return the Tree for the given patch path, or default."""
+        if patch_path not in self._index:
+            return default
+        return self.tree(patch_path)
+
+    def close(self):
+        """Unmap the corpus file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, traceback):
+        self.close()
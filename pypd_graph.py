@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+"""The connections between the objects on each canvas of a patch.
+
+A "#X connect" chunk refers to the objects it connects by their index on
+the canvas it's in:
+
+    #X connect src_id src_out dest_id dest_out;
+
+Each object box, message, atom, comment, scalar and array on a canvas
+takes the next index in the order it appears, and so does each subpatch
+(at its "#X restore"). The objects inside a subpatch are numbered on that
+subpatch's own canvas.
+
+A Graph is built from a canvas node of a parsed patch Tree in one pass
+over its children. The connections are stored in compressed sparse row
+(CSR) form: the connections sorted by source object, with the start of
+each object's connections in an array, and an index of the same
+connections sorted by destination. The connections from or to an object
+are then a slice of the arrays and the number of them is a subtraction,
+the canvas isn't searched for each connection."""
+
+from array import array
+from itertools import izip
+
+
+CONNECT = 'connect'
+
+# The elements that are numbered as objects on a canvas
+BOX_ELEMENTS = frozenset(['obj', 'msg', 'floatatom', 'symbolatom',
+                          'listbox', 'text', 'scalar', 'array'])
+# Objects without inlets or outlets
+_UNCONNECTABLE = frozenset(['text', 'scalar', 'array'])
+
+TYPECODE = 'i'
+
+
+def _counting_sort(n, keys):
+    """Return (start, order) for keys in the range 0 ... n - 1.
+
+    order is the indices of keys sorted by key, keeping their order for
+    equal keys. The indices with key k are order[start[k]:start[k + 1]]."""
+    start = array(TYPECODE, [0]) * (n + 1)
+    for k in keys:
+        start[k + 1] += 1
+    for i in xrange(n):
+        start[i + 1] += start[i]
+    pos = start[:-1]
+    order = array(TYPECODE, [0]) * len(keys)
+    for i, k in enumerate(keys):
+        order[pos[k]] = i
+        pos[k] += 1
+    return start, order
+
+
+class Graph(object):
+
+    """The objects on a canvas and the connections between them.
+
+    Objects are referred to by their index on the canvas. For the
+    connection at index c, in order of source object and then the order
+    in the patch file:
+
+        sources[c]      the index of the source object
+        outlets[c]      the outlet number on the source object
+        dests[c]        the index of the destination object
+        inlets[c]       the inlet number on the destination object
+
+    The arrays are array.array instances. nodes[i] is the Tree node of
+    object i, for a subpatch it's the subpatch's canvas node."""
+
+    __slots__ = ('canvas', 'nodes', 'sources', 'outlets', 'dests', 'inlets',
+                 'invalid', '_out_start', '_in_start', '_in_order',
+                 '_indices')
+
+    @staticmethod
+    def from_canvas(canvas):
+        """Return the Graph of the given canvas node.
+
+        Connections that aren't valid, with params that aren't numbers or
+        object indices that aren't on the canvas, are left out of the
+        graph. Their nodes are listed in invalid."""
+        nodes, connects = [], []
+        # The restore closing a subpatch is neither, the subpatch is
+        # numbered on its parent's canvas
+        for child in canvas._children:
+            if child._children:
+                nodes.append(child)
+            else:
+                element = child.value.element
+                if element in BOX_ELEMENTS:
+                    nodes.append(child)
+                elif element == CONNECT:
+                    connects.append(child)
+
+        n = len(nodes)
+        edges, invalid = [], []
+        for node in connects:
+            try:
+                edge = map(int, node.value.params)
+            except ValueError:
+                edge = ()
+            if len(edge) == 4 and 0 <= edge[0] < n and 0 <= edge[2] < n \
+               and edge[1] >= 0 and edge[3] >= 0:
+                edges.append(edge)
+            else:
+                invalid.append(node)
+
+        out_start, out_order = _counting_sort(n, [e[0] for e in edges])
+        edges = [edges[c] for c in out_order]
+        columns = [array(TYPECODE, column) for column in izip(*edges)] or \
+                  [array(TYPECODE) for _ in xrange(4)]
+        in_start, in_order = _counting_sort(n, columns[2])
+        return Graph(canvas, nodes, columns, invalid, out_start, in_start,
+                     in_order)
+
+    def __init__(self, canvas, nodes, columns, invalid, out_start, in_start,
+                 in_order):
+        """Don't use this directly, use from_canvas() or graphs()."""
+        self.canvas, self.nodes, self.invalid = canvas, nodes, invalid
+        self.sources, self.outlets, self.dests, self.inlets = columns
+        (self._out_start, self._in_start, self._in_order) = \
+                (out_start, in_start, in_order)
+        self._indices = None
+
+    def __len__(self):
+        """Return the number of objects on the canvas."""
+        return len(self.nodes)
+
+    @property
+    def num_connections(self):
+        return len(self.sources)
+
+    def index(self, node):
+        """Return the index of the given object node.
+
+        Raises ValueError if the node isn't an object on the canvas."""
+        if self._indices is None:
+            self._indices = dict([(id(obj_node), i) \
+                                  for i, obj_node in enumerate(self.nodes)])
+        try:
+            return self._indices[id(node)]
+        except KeyError:
+            raise ValueError('Node is not an object on the canvas')
+
+    def connections(self):
+        """Yield (src, outlet, dest, inlet) for each connection."""
+        return izip(self.sources, self.outlets, self.dests, self.inlets)
+
+    def outgoing(self, i):
+        """Return a list of (outlet, dest, inlet) for the connections from
+        object i."""
+        start, end = self._out_start[i], self._out_start[i + 1]
+        return zip(self.outlets[start:end], self.dests[start:end],
+                   self.inlets[start:end])
+
+    def incoming(self, i):
+        """Return a list of (src, outlet, inlet) for the connections to
+        object i."""
+        return [(self.sources[c], self.outlets[c], self.inlets[c]) \
+                for c in self._in_order[self._in_start[i]:
+                                        self._in_start[i + 1]]]
+
+    def fan_out(self, i, outlet=None):
+        """Return the number of connections from object i, or from one of
+        its outlets."""
+        if outlet is None:
+            return self._out_start[i + 1] - self._out_start[i]
+        return self.outlets[self._out_start[i]:
+                            self._out_start[i + 1]].count(outlet)
+
+    def fan_in(self, i, inlet=None):
+        """Return the number of connections to object i, or to one of its
+        inlets."""
+        if inlet is None:
+            return self._in_start[i + 1] - self._in_start[i]
+        inlets = self.inlets
+        return sum([1 for c in self._in_order[self._in_start[i]:
+                                              self._in_start[i + 1]] \
+                    if inlets[c] == inlet])
+
+    def unconnected(self):
+        """Return the indices of the objects with no connections.
+
+        Comments, scalars and arrays have no inlets or outlets and aren't
+        included."""
+        out_start, in_start, nodes = self._out_start, self._in_start, \
+                                     self.nodes
+        return [i for i in xrange(len(nodes)) \
+                if out_start[i] == out_start[i + 1] and \
+                   in_start[i] == in_start[i + 1] and \
+                   (nodes[i]._children or \
+                    nodes[i].value.element not in _UNCONNECTABLE)]
+
+    def topological_order(self, hot_only=False):
+        """Return the object indices ordered so that each object comes
+        before the objects it's connected to.
+
+        The objects with no connections to them come first, in canvas
+        order. If hot_only is true the connections to inlets other than
+        the first are ignored. Messages to those (cold) inlets don't
+        trigger the object, which is how feedback loops such as a counter
+        are made. Raises ValueError if the connections form a cycle."""
+        n = len(self.nodes)
+        in_degree = array(TYPECODE, [0]) * n
+        dests, inlets = self.dests, self.inlets
+        for dest, inlet in izip(dests, inlets):
+            if not (hot_only and inlet):
+                in_degree[dest] += 1
+
+        out_start = self._out_start
+        order = [i for i in xrange(n) if not in_degree[i]]
+        # order grows as objects become ready, each is visited once
+        for i in order:
+            for c in xrange(out_start[i], out_start[i + 1]):
+                if hot_only and inlets[c]:
+                    continue
+                dest = dests[c]
+                in_degree[dest] -= 1
+                if not in_degree[dest]:
+                    order.append(dest)
+
+        if len(order) < n:
+            raise ValueError('Connections form a cycle, %d objects can\'t ' \
+                             'be ordered' % (n - len(order)))
+        return order
+
+
+def graphs(tree):
+    """Return a list of the Graph of each canvas in a parsed patch Tree,
+    depth first, starting with the top level canvas."""
+    return [Graph.from_canvas(node) for node, _ in \
+            tree.select(lambda node, depth: node._children or node is tree)]
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+"""An inverted index of the objects and send/receive symbols in patches.
+
+The index maps each object name to the patch files that use it and the
+line numbers of the objects within those files. Object names are matched
+using ObjectName equality, so looking up "freeverb~" finds uses of both
+"freeverb~" and "extra/freeverb~". Send and receive symbols (from send,
+receive and GUI objects) are indexed the same way.
+
+A node in a parsed patch Tree can be found from its line number, see
+Tree.find() and NameIndex.nodes(). The index can be updated as patch files
+change and saved to and loaded from a marshal file."""
+
+import marshal
+import pypd_patch
+import pypd_class_attrs
+from pypd_class_attrs import OBJ, OBJ_NAME_INDEX
+from pypd_objectname import ObjectName
+
+
+SEND = 'send'
+RECEIVE = 'receive'
+
+# Attribute names that hold send and receive symbols. send and receive
+# objects use dest and src, GUI objects use send and receive.
+SYMBOL_ATTRS = (('dest', SEND), ('send', SEND),
+                ('src', RECEIVE), ('receive', RECEIVE))
+
+# Values used by PD to mean "no symbol"
+NO_SYMBOL = ('empty', '-')
+
+_FORMAT = 'pypd-index-1'
+_MARSHAL_VERSION = 2
+
+
+class NameIndex(object):
+
+    """Map object names and send/receive symbols to the patches using them."""
+
+    def __init__(self):
+        # rname -> {object name -> {path -> [line numbers]}}
+        self._names = {}
+        # symbol -> {SEND or RECEIVE -> {path -> [line numbers]}}
+        self._symbols = {}
+        # path -> (object names, symbols) indexed for that path
+        self._paths = {}
+
+    def __len__(self):
+        """Return the number of patch files indexed."""
+        return len(self._paths)
+
+    def __contains__(self, path):
+        return path in self._paths
+
+    def paths(self):
+        """Return a list of the patch files indexed."""
+        return self._paths.keys()
+
+    def _add_chunk(self, path, line_num, element, params, names, symbols):
+        if element == OBJ and len(params) > OBJ_NAME_INDEX:
+            name = params[OBJ_NAME_INDEX]
+            try:
+                rname = ObjectName.intern(name).rname
+            except ValueError:
+                # Not a valid object name
+                rname = name
+            self._names.setdefault(rname, {}).setdefault(name, {}) \
+                       .setdefault(path, []).append(line_num)
+            names.add(name)
+
+        try:
+            index = pypd_class_attrs.layout(element, params).index
+        except KeyError:
+            return
+        for attr, kind in SYMBOL_ATTRS:
+            i = index.get(attr)
+            if i is not None and i < len(params) and \
+               params[i] not in NO_SYMBOL:
+                self._symbols.setdefault(params[i], {}) \
+                             .setdefault(kind, {}) \
+                             .setdefault(path, []).append(line_num)
+                symbols.add(params[i])
+
+    def add_file(self, path):
+        """Index the given patch file, replacing any previous entries.
+
+        The file is scanned with pypd_patch.xevents, no Tree is built."""
+        self.remove(path)
+        names, symbols = set(), set()
+        with open(path) as f:
+            try:
+                for _, line_num, _, element, params in \
+                    pypd_patch.xevents(f):
+                    self._add_chunk(path, line_num, element, params,
+                                    names, symbols)
+            except:
+                # Don't leave a partially indexed file
+                self._paths[path] = (names, symbols)
+                self.remove(path)
+                raise
+        self._paths[path] = (names, symbols)
+
+    def add_tree(self, path, tree):
+        """Index a parsed patch Tree, replacing any previous entries."""
+        self.remove(path)
+        names, symbols = set(), set()
+        for node, _ in tree:
+            obj = node.value
+            self._add_chunk(path, obj.line_num, obj.element, obj.params,
+                            names, symbols)
+        self._paths[path] = (names, symbols)
+
+    # Re-indexing a changed file is the same as adding it
+    update = add_file
+
+    def remove(self, path):
+        """Remove the entries for the given patch file, if any."""
+        try:
+            names, symbols = self._paths.pop(path)
+        except KeyError:
+            return False
+
+        for name in names:
+            try:
+                rname = ObjectName.intern(name).rname
+            except ValueError:
+                rname = name
+            by_name = self._names[rname]
+            del by_name[name][path]
+            if not by_name[name]:
+                del by_name[name]
+                if not by_name:
+                    del self._names[rname]
+
+        for symbol in symbols:
+            by_kind = self._symbols[symbol]
+            for kind in by_kind.keys():
+                by_kind[kind].pop(path, None)
+                if not by_kind[kind]:
+                    del by_kind[kind]
+            if not by_kind:
+                del self._symbols[symbol]
+        return True
+
+    def uses(self, name):
+        """Return a dict of path to line numbers of objects matching name."""
+        objname = ObjectName.intern(name)
+        found = {}
+        for used_name, by_path in self._names.get(objname.rname, {}).items():
+            if objname == ObjectName.intern(used_name):
+                for path, line_nums in by_path.items():
+                    found.setdefault(path, []).extend(line_nums)
+        for line_nums in found.values():
+            line_nums.sort()
+        return found
+
+    def senders(self, symbol):
+        """Return a dict of path to line numbers of objects sending symbol."""
+        return dict(self._symbols.get(symbol, {}).get(SEND, {}))
+
+    def receivers(self, symbol):
+        """Return a dict of path to line numbers of objects receiving on
+        symbol."""
+        return dict(self._symbols.get(symbol, {}).get(RECEIVE, {}))
+
+    @staticmethod
+    def nodes(tree, line_nums):
+        """Return the nodes in tree with the given line numbers, in order."""
+        line_nums = set(line_nums)
+        return [node for node, _ in \
+                tree.select(lambda node, depth: \
+                            node.value.line_num in line_nums)]
+
+    def save(self, path):
+        """Write the index to the given file."""
+        with open(path, 'wb') as f:
+            marshal.dump((_FORMAT, self._names, self._symbols,
+                          dict([(p, (list(names), list(symbols))) \
+                                for p, (names, symbols) in \
+                                self._paths.items()])),
+                         f, _MARSHAL_VERSION)
+
+    @staticmethod
+    def load(path):
+        """Return a NameIndex read from a file written by save()."""
+        with open(path, 'rb') as f:
+            data = marshal.load(f)
+        if not isinstance(data, tuple) or data[0] != _FORMAT:
+            raise ValueError('%s is not a pypd index file' % path)
+
+        index = NameIndex()
+        (_, index._names, index._symbols, paths) = data
+        index._paths = dict([(p, (set(names), set(symbols))) \
+                             for p, (names, symbols) in paths.items()])
+        return index
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+"""Opt-in timings and counters for the parsing, scanning and resolving
+code.
+
+Nothing is recorded until enable() is called. While disabled each
+instrumented function checks the enabled flag once per call, or once per
+file for the per-line and per-object phases, so the cost is negligible.
+The phases recorded are:
+
+    read            reading the lines of a patch file
+    tokenize        splitting the lines into chunks, see pypd_tokenize
+    object_factory  creating Objects, including looking up their layouts
+    tree_build      building the Tree, the rest of parse() and reparse()
+    patch           opening a patch file for Patch, the rest of Patch()
+    scan            scanning a file for PatchFiles, the rest of the scan
+    resolve         resolving an object name to patch files
+
+The time of each phase is its own (self) time: while a phase is active in
+another, e.g. tokenize within tree_build, the time is only added to the
+inner phase. The counters are:
+
+    cache_hit       a scan result found in the pypd_cache.ParseCache
+    cache_miss      a file scanned because it wasn't in the cache
+    known_hit       a known objects file read from the cache
+    known_miss      a known objects file parsed
+
+summary() returns the totals, format_summary() a table of them. If
+enable() is called with trace=True each tree_build, patch, scan and
+resolve is also recorded as a Chrome trace event, see write_trace(). The
+per-line and per-object phases are only in the totals, as an event for
+each line would be larger than the work being traced.
+
+Only the calling process is recorded, scan PatchFiles with processes=1
+to include the scanning of each file. For example:
+
+    pypd_instrument.enable(trace=True)
+    PatchFiles(roots, processes=1)
+    print pypd_instrument.format_summary()
+    pypd_instrument.write_trace('scan.json')"""
+
+import os
+import json
+import time
+import threading
+
+
+READ = 'read'
+TOKENIZE = 'tokenize'
+FACTORY = 'object_factory'
+BUILD = 'tree_build'
+PATCH = 'patch'
+SCAN = 'scan'
+RESOLVE = 'resolve'
+
+CACHE_HIT = 'cache_hit'
+CACHE_MISS = 'cache_miss'
+KNOWN_HIT = 'known_hit'
+KNOWN_MISS = 'known_miss'
+
+# Checked by the instrumented code, only set by enable() and disable()
+enabled = False
+
+_tracing = False
+_lock = threading.Lock()
+# phase -> [self time in seconds, calls]
+_phases = {}
+_counters = {}
+_events = []
+# The stack of active phases in each thread, [phase, start of the
+# current slice of its self time]
+_local = threading.local()
+_now = time.time
+
+
+def enable(trace=False):
+    """Start recording. If trace is true trace events are recorded too."""
+    global enabled, _tracing
+    _tracing = trace
+    enabled = True
+
+
+def disable():
+    """Stop recording. What was recorded is kept until reset()."""
+    global enabled, _tracing
+    enabled = _tracing = False
+
+
+def reset():
+    """Forget everything recorded."""
+    with _lock:
+        _phases.clear()
+        _counters.clear()
+        del _events[:]
+
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        stack = _local.stack = []
+        return stack
+
+
+def _add(name, secs, calls):
+    with _lock:
+        totals = _phases.get(name)
+        if totals is None:
+            _phases[name] = [secs, calls]
+        else:
+            totals[0] += secs
+            totals[1] += calls
+
+
+def _enter(name):
+    """Start a phase, pausing the current one."""
+    stack, now = _stack(), _now()
+    if stack:
+        _add(stack[-1][0], now - stack[-1][1], 0)
+    stack.append([name, now])
+    return now
+
+
+def _exit():
+    """End the current phase, resuming the one it's in."""
+    stack, now = _stack(), _now()
+    name, start = stack.pop()
+    _add(name, now - start, 1)
+    if stack:
+        stack[-1][1] = now
+    return now
+
+
+class _Phase(object):
+
+    """A context manager recording a phase."""
+
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name, self.args = name, args
+
+    def __enter__(self):
+        self.start = _enter(self.name)
+        return self
+
+    def __exit__(self, ex_type, ex_value, traceback):
+        end = _exit()
+        if _tracing:
+            event = dict(name=self.name, cat='pypd', ph='X',
+                         ts=self.start * 1e6, dur=(end - self.start) * 1e6,
+                         pid=os.getpid(), tid=threading.current_thread().ident)
+            if self.args:
+                event['args'] = self.args
+            with _lock:
+                _events.append(event)
+
+
+class _NoPhase(object):
+
+    """The context manager returned by phase() while disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, traceback):
+        pass
+
+
+_no_phase = _NoPhase()
+
+
+def phase(phase_name, **args):
+    """Return a context manager recording the time in its block as the
+    given phase. The keyword args are added to the trace event."""
+    if not enabled:
+        return _no_phase
+    return _Phase(phase_name, args)
+
+
+def timed(name, fn):
+    """Return fn wrapped to record each call as the given phase."""
+    def wrapper(*args, **kwargs):
+        _enter(name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _exit()
+    return wrapper
+
+
+def timed_iter(name, iterable):
+    """Yield the items of iterable, recording the time taken to get each
+    one as the given phase."""
+    it = iter(iterable)
+    while True:
+        _enter(name)
+        try:
+            item = next(it)
+        except StopIteration:
+            _exit()
+            return
+        except:
+            _exit()
+            raise
+        _exit()
+        yield item
+
+
+def count(name, n=1):
+    """Add n to the given counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def summary():
+    """Return a dict with the 'phases', a dict of phase -> {'seconds',
+    'calls'}, and the 'counters', a dict of counter -> count."""
+    with _lock:
+        return dict(phases=dict([(name, dict(seconds=secs, calls=calls)) \
+                                 for name, (secs, calls) in \
+                                 _phases.items()]),
+                    counters=dict(_counters))
+
+
+def format_summary():
+    """Return the summary as a table, the slowest phases first."""
+    data = summary()
+    phases = sorted(data['phases'].items(),
+                    key=lambda item: -item[1]['seconds'])
+    total = sum([totals['seconds'] for _, totals in phases]) or 1.0
+    lines = ['%-16s %10s %6s %10s' % ('phase', 'seconds', '%', 'calls')]
+    lines.extend(['%-16s %10.4f %6.1f %10d' % \
+                  (name, totals['seconds'], 100 * totals['seconds'] / total,
+                   totals['calls']) for name, totals in phases])
+    if data['counters']:
+        lines.append('')
+        lines.append('%-16s %10s' % ('counter', 'count'))
+        lines.extend(['%-16s %10d' % item \
+                      for item in sorted(data['counters'].items())])
+    return '\n'.join(lines)
+
+
+def trace_events():
+    """Return a list of the trace events recorded, in the Chrome trace
+    event format."""
+    with _lock:
+        return list(_events)
+
+
+def write_trace(path):
+    """Write the trace events to a JSON file that can be loaded by
+    chrome://tracing or Perfetto."""
+    with open(path, 'w') as f:
+        json.dump(dict(traceEvents=trace_events(), displayTimeUnit='ms'), f)
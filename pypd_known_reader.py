@@ -24,15 +24,99 @@ vslider         width, height, bottom, top, log, init, send, receive, \
 [aliases]
 vslider         vsl
 hslider         hsl
+
+Parsed files are cached for the life of the process and only re-read when
+they change on disk, so reading the same file again is a dict lookup.
+Several files (e.g. vanilla, extended and site-local objects) can be read
+as layers with read_layered().
 """
 
+import os
+from itertools import izip
+import pypd_instrument
+
 
 sep = ','
 
+ALIASES = 'aliases'
+
+# Parsed files, path -> (stat stamp, sections)
+_cache = {}
+# Merged layers, tuple of paths -> (sections of each layer, merged sections)
+_layered_cache = {}
+
+
+def _stamp(path):
+    """Return the stat values that change when the file is rewritten."""
+    st = os.stat(path)
+    return st.st_mtime, st.st_size, st.st_ino
+
+
 def read(path):
+    """Return the sections read from the given known objects file.
+
+    The result is cached and returned again until the file's modification
+    time, size or inode changes. The same dict is returned to every
+    caller, so it must not be modified."""
     # let exceptions bubble up
+    path = os.path.abspath(path)
+    stamp = _stamp(path)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == stamp:
+        if pypd_instrument.enabled:
+            pypd_instrument.count(pypd_instrument.KNOWN_HIT)
+        return cached[1]
+
+    if pypd_instrument.enabled:
+        pypd_instrument.count(pypd_instrument.KNOWN_MISS)
     with open(path) as f:
-        return _parse_known_lines(f.readlines())
+        sections = _parse_known_lines(f)
+    _cache[path] = (stamp, sections)
+    return sections
+
+
+def read_layered(paths):
+    """Return the sections of several known objects files merged in order.
+
+    Each file is read with read(). The merged result is cached and only
+    rebuilt when one of the files changes, see merge()."""
+    paths = tuple([os.path.abspath(path) for path in paths])
+    layers = [read(path) for path in paths]
+    cached = _layered_cache.get(paths)
+    if cached is not None and \
+       all([old is new for old, new in izip(cached[0], layers)]):
+        return cached[1]
+
+    merged = merge(layers)
+    _layered_cache[paths] = (layers, merged)
+    return merged
+
+
+def merge(sections_list):
+    """Merge the sections read from several known objects files.
+
+    Later files add to or replace the definitions in earlier ones. Aliases
+    are merged by alias, so an alias defined in a later file is removed
+    from the object it named in an earlier file."""
+    merged, alias_names = {}, {}
+    for sections in sections_list:
+        for section, items in sections.items():
+            if section == ALIASES:
+                for name, aliases in items.items():
+                    alias_names.update([(alias, name) for alias in aliases])
+            else:
+                merged.setdefault(section, {}).update(items)
+
+    aliases = merged[ALIASES] = {}
+    for alias, name in sorted(alias_names.items()):
+        aliases.setdefault(name, []).append(alias)
+    return merged
+
+
+def clear_cache():
+    """Forget all the files read, they are re-read on next use."""
+    _cache.clear()
+    _layered_cache.clear()
 
 
 def _parse_known_lines(lines):
@@ -76,14 +160,20 @@ def _parse_known_lines(lines):
 
 
 def _line_iter(lines):
-    linelst = []
-    for line in (s for s in (line.strip() for line in lines) \
-                            if s and not s.startswith('#')):
+    continued = None
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
         # A definition can be continued on the next line if it ends with a
         # "\" character.
         if line.endswith('\\'):
-            linelst.append(line[:-1])
+            if continued is None:
+                continued = line[:-1]
+            else:
+                continued += ' ' + line[:-1]
+        elif continued is not None:
+            yield continued + ' ' + line
+            continued = None
         else:
-            linelst.append(line)
-            yield ' '.join(linelst)
-            linelst = []
+            yield line
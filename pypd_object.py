@@ -1,12 +1,28 @@
 import pypd_class_attrs
-from itertools import izip_longest
+from pypd_class_attrs import Layout
+
+
+def _make(line_num, chunk, element, attrs, params):
+    """Recreate an Object when unpickling."""
+    return Object(line_num, chunk, element, Layout.get(attrs), params)
+
 
 class Object(object):
 
     """Abstraction for PD elements and objects.
 
     Each line in the PD patch file is used to create an instance of this
-    class."""
+    class. The parameters are stored once in a tuple, the attribute names
+    are held in a Layout shared with all other Objects of the same type.
+    Named attributes and arg1 ... argn are looked up in the params when
+    they're accessed."""
+
+    __slots__ = ('line_num', 'chunk', 'element', 'params', '_layout')
+
+    # Array data chunks (#A) have no element name in the patch file. They
+    # are given this element name for convenience.
+    ARRAY_CHUNK = '#A'
+    ARRAY_ELEMENT = 'array_data'
 
     @staticmethod
     def factory(line_num, chunk, element, params):
@@ -14,43 +30,82 @@ class Object(object):
 
         # Determine the attribute names appropriate for this element
         # and its parameters.
-        attrs = pypd_class_attrs.get(element, params)
+        layout = pypd_class_attrs.layout(element, params)
 
-        # Make a dict mapping attribute names to their values
-        kv = Object._make_instance_dict(attrs, params)
+        return Object(line_num, chunk, element, layout, tuple(params))
 
-        # All instances get these attributes too.
-        kv.update(line_num = line_num,
-                  chunk = chunk,
-                  element = element,
-                  ordered_attrs = attrs,
-                  num_ordered_attrs = len(attrs))
+    def __init__(self, line_num, chunk, element, layout, params):
+        """Simple constructor, don't use this directly, use the factory."""
+        setattr_ = super(Object, self).__setattr__
+        setattr_('line_num', line_num)
+        setattr_('chunk', chunk)
+        setattr_('element', element)
+        setattr_('params', params)
+        setattr_('_layout', layout)
 
-        # Return the created object.
-        return Object(kv)
+    # These are derived from the layout and params
+    ordered_attrs = property(lambda self: self._layout.attrs)
+    num_ordered_attrs = property(lambda self: len(self._layout.attrs))
+    num_args = property(lambda self: len(self.params))
 
-    @staticmethod
-    def _make_instance_dict(attrs, values):
-        """Create a map from the attribute names to their values."""
+    def __getattr__(self, name):
+        """Return the value of a named attribute or arg1 ... argn.
 
-        kv = dict(izip_longest(attrs, values))
-        if kv.has_key(None):
-            # If a key is set to None we have more values than attribute names
-            del kv[None]
-        # Also add arg1 ... argn for each value.
-        kv.update([('arg%d' % (n + 1), value) \
-                   for n, value in enumerate(values)])
-        return kv
+        Named attributes without a value are None."""
+        if name in self.__slots__:
+            # Not initialised yet
+            raise AttributeError(name)
 
-    def __init__(self, kv):
-        """Simple constructor takes a dictionary of attribute names/values.
+        params = self.params
+        try:
+            i = self._layout.index[name]
+        except KeyError:
+            if name.startswith('arg') and name[3:].isdigit():
+                i = int(name[3:]) - 1
+                if 0 <= i < len(params):
+                    return params[i]
+            raise AttributeError("'%s' object has no attribute '%s'" % \
+                                 (type(self).__name__, name))
 
-        Don't use this directly, use the static factory."""
-        self.__dict__.update(kv.items())
+        if i < len(params):
+            return params[i]
+        return None
 
     def __setattr__(self, name, value):
         raise AttributeError('Object instances are immutable')
 
+    def __delattr__(self, name):
+        raise AttributeError('Object instances are immutable')
+
+    def __eq__(self, other):
+        """Objects are equal if they were read from the same chunk text on
+        the same line. The layout follows from the element and params."""
+        if not isinstance(other, Object):
+            return NotImplemented
+        return self is other or \
+               (self.line_num == other.line_num and \
+                self.params == other.params and \
+                self.element == other.element and \
+                self.chunk == other.chunk)
+
+    def __ne__(self, other):
+        # Not written in terms of __eq__, Tree equality uses != on every
+        # node
+        if not isinstance(other, Object):
+            return NotImplemented
+        return self is not other and \
+               (self.line_num != other.line_num or \
+                self.params != other.params or \
+                self.element != other.element or \
+                self.chunk != other.chunk)
+
+    def __hash__(self):
+        return hash((self.line_num, self.chunk, self.element, self.params))
+
+    def __reduce__(self):
+        return _make, (self.line_num, self.chunk, self.element,
+                       self._layout.attrs, self.params)
+
     def __iter__(self):
         """Yield each attribute name/value."""
         for k in self.ordered_attrs:
@@ -58,6 +113,10 @@ class Object(object):
 
     def __str__(self):
         """Return the original text suitable for storing in a patch file."""
-        line_vals = [self.chunk, self.element]
-        line_vals.extend([v for k,v in self])
+        line_vals = [self.chunk]
+        if self.chunk != self.ARRAY_CHUNK:
+            line_vals.append(self.element)
+        # Use the params rather than the named attributes, there may be
+        # more values than attribute names.
+        line_vals.extend(self.params)
         return ' '.join(line_vals)
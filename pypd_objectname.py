@@ -1,10 +1,45 @@
 from itertools import izip_longest
 import os
 
+
+def _intern(objname):
+    """Re-intern an ObjectName when unpickling."""
+    return ObjectName.intern(objname)
+
+
 class ObjectName(object):
 
     sep = '/'
 
+    # Shared instances created by intern(), keyed by name. The cache is
+    # cleared when it reaches max_interned entries.
+    _interned = {}
+    max_interned = 10000
+
+    # Only interned instances are frozen
+    _frozen = False
+
+    @staticmethod
+    def intern(objname):
+        """Return a shared, immutable ObjectName for the given name.
+
+        The same names appear many times across a set of patches. Interned
+        instances are split and hashed once, and equal names compare by
+        identity. Each process has its own cache, interned instances are
+        re-interned when unpickled."""
+        try:
+            return ObjectName._interned[objname]
+        except KeyError:
+            pass
+
+        name = ObjectName(objname)
+        name._frozen = True
+        interned = ObjectName._interned
+        if len(interned) >= ObjectName.max_interned:
+            interned.clear()
+        interned[objname] = name
+        return name
+
     @staticmethod
     def split_valid_name(objname):
         parts = objname.split(ObjectName.sep)
@@ -18,8 +53,12 @@ class ObjectName(object):
             return [], parts[0]
 
     def set_name(self, objname):
+        if self._frozen:
+            raise AttributeError('Interned ObjectName instances are '
+                                 'immutable')
         self._name = objname
         self._path_parts, self._rname = self.split_valid_name(objname)
+        self._hash = hash(self._rname)
 
     # TODO: maybe this should be read-only after all
     name = property(lambda self: self._name, set_name)
@@ -31,21 +70,29 @@ class ObjectName(object):
         self.name = objname
 
     def __eq__(self, other):
-        return id(self) == id(other) or \
+        return self is other or \
                self._name == getattr(other, '_name', str(other)) or \
                (self.rname == getattr(other, 'rname', None) and \
                 self.match_path_parts(getattr(other, '_path_parts', [])))
 
-    def match_path(self, mpath):
+    @staticmethod
+    def split_path(mpath):
+        """Split a directory path into the parts compared by match_path."""
         if not mpath:
-            return not self._path_parts
+            return []
 
         if mpath.startswith(os.path.sep):
             mpath = mpath[1:]
         if mpath.endswith(os.path.sep):
             mpath = mpath[:-1]
 
-        return self.match_path_parts(mpath.split(self.sep))
+        return mpath.split(ObjectName.sep)
+
+    def match_path(self, mpath):
+        if not mpath:
+            return not self._path_parts
+
+        return self.match_path_parts(self.split_path(mpath))
 
     def match_path_parts(self, mpath_parts):
         for part, mpart in izip_longest(reversed(self._path_parts),
@@ -61,7 +108,90 @@ class ObjectName(object):
         return True
 
     def __hash__(self):
-        return hash(self.rname)
+        return self._hash
+
+    def __reduce__(self):
+        if self._frozen:
+            return _intern, (self._name,)
+        return ObjectName, (self._name,)
 
     def __str__(self):
         return self._name
+
+
+class NameResolver(object):
+
+    """Resolve object names to the files they may refer to.
+
+    The files are held in a trie for each rname (the file name without its
+    extension). Each level of the trie is a directory name, starting with
+    the directory that contains the file and working back towards the root.
+    Each trie node holds every file below it, so resolving a name is a
+    single walk along its path parts, in reverse. The files returned are
+    those whose directories ObjectName.match_path() would accept."""
+
+    def __init__(self, paths=(), ext=''):
+        """Add each of the given file paths.
+
+        ext is the file extension to remove to get the rname of a file."""
+        self.ext = ext
+        # rname -> node, each node is a tuple of (list of paths, {dir
+        # name -> node})
+        self._trie = {}
+        for path in paths:
+            self.add(path)
+
+    def _split(self, path):
+        dirname, filename = os.path.split(path)
+        if self.ext and filename.endswith(self.ext):
+            filename = filename[:-len(self.ext)]
+        return filename, reversed(ObjectName.split_path(dirname))
+
+    def add(self, path):
+        """Add a file path."""
+        rname, rparts = self._split(path)
+        node = self._trie.get(rname)
+        if node is None:
+            node = self._trie[rname] = ([], {})
+        node[0].append(path)
+        for part in rparts:
+            children = node[1]
+            node = children.get(part)
+            if node is None:
+                node = children[part] = ([], {})
+            node[0].append(path)
+
+    def remove(self, path):
+        """Remove a file path. Returns true if it was found."""
+        rname, rparts = self._split(path)
+        node = self._trie.get(rname)
+        if node is None or path not in node[0]:
+            return False
+
+        # Remove the path from every node on the way down, and any nodes
+        # left empty.
+        nodes = [(self._trie, rname, node)]
+        for part in rparts:
+            nodes.append((node[1], part, node[1][part]))
+            node = node[1][part]
+        for parent, key, node in nodes:
+            node[0].remove(path)
+            if not node[0]:
+                del parent[key]
+                break
+        return True
+
+    def resolve(self, name):
+        """Return a list of the files that the object name may refer to.
+
+        name may be a string or an ObjectName."""
+        if not isinstance(name, ObjectName):
+            name = ObjectName.intern(name)
+        node = self._trie.get(name.rname)
+        for part in reversed(name._path_parts):
+            if node is None:
+                break
+            node = node[1].get(part)
+        if node is None:
+            return []
+        return list(node[0])
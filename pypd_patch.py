@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+
+"""Parse PD patch files into a Tree of Objects.
+
+A PD patch file is a sequence of chunks, each terminated by a ";"
+character. A chunk may wrap across several lines of the file. Semicolons
+and commas that are part of a value are escaped with a backslash ("\\;"
+and "\\,") and do not terminate the chunk. Each chunk starts with a chunk
+type (#N, #X or #A) followed by an element name and its parameters:
+
+    #N canvas 0 0 450 300 10;
+    #X obj 30 27 osc~ 440;
+    #N canvas 0 0 450 300 sub 0;
+    #X obj 10 10 inlet;
+    #X restore 30 60 pd sub;
+    #X connect 0 0 1 0;
+
+Subpatches are opened with "#N canvas" and closed with "#X restore". The
+top level canvas is the root node of the tree, each subpatch canvas is a
+branch whose last child is the "restore" object that closes it. A depth
+first traversal of the tree yields each object in the order it appears
+in the patch file.
+
+Patches using data structures declare their templates with "#N struct"
+chunks before the top level canvas. These are the first children of the
+root node, ahead of the chunks that follow the canvas."""
+
+import pypd_graph
+import pypd_instrument
+from pypd_tree import Tree
+from pypd_object import Object
+from pypd_tokenize import xtokens
+from pypd_exceptions import InvalidPatch, InvalidLine
+
+
+CANVAS_CHUNK = '#N'
+CANVAS = 'canvas'
+STRUCT = 'struct'
+RESTORE = 'restore'
+CHUNK_TYPES = ('#N', '#X', Object.ARRAY_CHUNK)
+
+# Events yielded by xevents()
+CANVAS_OPEN = 'canvas-open'
+CANVAS_CLOSE = 'canvas-close'
+CHUNK = 'chunk'
+
+
+def xchunks(lines, tokenize=xtokens):
+    """Yield (line_num, chunk, element, params) for each chunk in lines.
+
+    This is the lowest level view of a patch, no Objects are created and
+    the nesting of subpatches is not checked. tokenize is the tokenizer
+    used to split the lines, see pypd_tokenize. Raises InvalidLine for
+    chunks that don't start with a known chunk type."""
+    for line_num, tokens in tokenize(lines):
+        chunk = tokens and tokens[0]
+        if chunk == Object.ARRAY_CHUNK:
+            yield line_num, chunk, Object.ARRAY_ELEMENT, tokens[1:]
+        elif chunk in CHUNK_TYPES and len(tokens) > 1:
+            yield line_num, chunk, tokens[1], tokens[2:]
+        else:
+            raise InvalidLine(' '.join(tokens), line_num)
+
+
+def xevents(lines, tokenize=xtokens):
+    """Yield (event, line_num, chunk, element, params) for each chunk.
+
+    event is CANVAS_OPEN for a "#N canvas" chunk, CANVAS_CLOSE for the
+    "#X restore" chunk that closes a subpatch and CHUNK for everything
+    else. The top level canvas is opened by the first event, or after the
+    "#N struct" chunks that may come before it, and is never closed.
+    Callers that only need to scan a patch for particular objects can use
+    this rather than parse() to avoid building a Tree of Objects.
+
+    The nesting of subpatches is checked as the chunks are read. Raises
+    InvalidLine and InvalidPatch as parse() does."""
+
+    if pypd_instrument.enabled:
+        chunks = pypd_instrument.timed_iter(pypd_instrument.TOKENIZE,
+            xchunks(pypd_instrument.timed_iter(pypd_instrument.READ, lines),
+                    tokenize))
+    else:
+        chunks = xchunks(lines, tokenize)
+
+    depth = 0
+    for line_num, chunk, element, params in chunks:
+        if chunk == CANVAS_CHUNK and element == CANVAS:
+            depth += 1
+            yield CANVAS_OPEN, line_num, chunk, element, params
+        elif not depth and (chunk != CANVAS_CHUNK or element != STRUCT):
+            raise InvalidLine(' '.join([chunk, element] + params), line_num,
+                              'Patch must start with a canvas')
+        elif element == RESTORE:
+            if depth == 1:
+                raise InvalidLine(' '.join([chunk, element] + params),
+                                  line_num, 'Restore without a subpatch')
+            depth -= 1
+            yield CANVAS_CLOSE, line_num, chunk, element, params
+        else:
+            yield CHUNK, line_num, chunk, element, params
+
+    if not depth:
+        raise InvalidPatch('Empty patch')
+    elif depth > 1:
+        raise InvalidPatch('%d unclosed subpatch(es)' % (depth - 1))
+
+
+def _make_object(line_num, chunk, element, params):
+    try:
+        return Object.factory(line_num, chunk, element, params)
+    except (KeyError, ValueError), ex:
+        raise InvalidLine(' '.join([chunk, element] + params), line_num,
+                          'Unknown element', ex)
+
+
+def parse(lines, tokenize=xtokens):
+    """Parse the lines of a patch file and return the resulting Tree.
+
+    The lines are read in a single pass. Other than the tree being built,
+    memory use is proportional to the depth of subpatch nesting. Raises
+    InvalidLine for lines that can't be parsed and InvalidPatch if the
+    patch is empty or has unclosed subpatches."""
+
+    make_object = _make_object
+    if pypd_instrument.enabled:
+        make_object = pypd_instrument.timed(pypd_instrument.FACTORY,
+                                            _make_object)
+
+    # The stack of open canvases. The bottom of the stack is the root.
+    stack, structs = [], []
+    with pypd_instrument.phase(pypd_instrument.BUILD):
+        for event, line_num, chunk, element, params in \
+            xevents(lines, tokenize):
+            obj = make_object(line_num, chunk, element, params)
+
+            if event == CANVAS_OPEN:
+                # A new canvas. It's attached to its parent when it's
+                # closed.
+                stack.append(Tree(obj))
+                if structs:
+                    stack[0].addChildren(structs)
+                    structs = []
+            elif event == CANVAS_CLOSE:
+                canvas = stack.pop()
+                canvas.add(obj)
+                stack[-1].addBranch(canvas)
+            elif stack:
+                stack[-1].add(obj)
+            else:
+                structs.append(obj)
+
+    return stack[0]
+
+
+class _Canvas(object):
+
+    """A canvas read by reparse(), before its node is created.
+
+    The entries are compared with those of the old canvases and used to
+    build a new node if there's no match. Each entry is either a chunk, as
+    (line number relative to the start, chunk, element, params) or a
+    subpatch, as (relative line number, _Canvas)."""
+
+    __slots__ = ('start', 'entries', 'key')
+
+    def __init__(self, line_num, chunk, element, params):
+        self.start = line_num
+        self.entries = [(0, chunk, element, tuple(params))]
+        self.key = None
+
+    def add(self, line_num, chunk, element, params):
+        self.entries.append((line_num - self.start, chunk, element,
+                             tuple(params)))
+
+    def add_canvas(self, canvas):
+        self.entries.append((canvas.start - self.start, canvas))
+
+    def close(self):
+        """Set the key, the entries with each subpatch replaced by its
+        key."""
+        self.key = tuple([len(entry) == 2 and (entry[0], entry[1].key) or \
+                          entry for entry in self.entries])
+
+
+def _canvas_keys(tree):
+    """Return a dict of key -> list of the canvas nodes in tree.
+
+    The key of a canvas is the same as the key of a _Canvas with the same
+    contents: its chunks, line numbers relative to the canvas's first line
+    and the keys of its subpatches."""
+    keys, node_keys = {}, {}
+    canvases = [node for node, _ in tree if node._children or node is tree]
+    # Subpatches follow their parents, so in reverse the key of each
+    # subpatch is known before its parent's key is needed.
+    for node in reversed(canvases):
+        obj = node.value
+        start = obj.line_num
+        entries = [(0, obj.chunk, obj.element, obj.params)]
+        for child in node._children:
+            obj = child.value
+            if child._children:
+                entries.append((obj.line_num - start,
+                                node_keys[id(child)]))
+            else:
+                entries.append((obj.line_num - start, obj.chunk,
+                                obj.element, obj.params))
+        key = node_keys[id(node)] = tuple(entries)
+        keys.setdefault(key, []).append(node)
+    return keys
+
+
+def _shifted(tree, delta):
+    """Return a copy of tree with delta added to every line number.
+
+    The Objects' layouts and params are shared with the originals, but
+    every node and Object is new. Line numbers are absolute, so this is
+    done for every canvas after a line is added or removed."""
+    nodes = []
+    for node, depth in tree:
+        obj = node.value
+        obj = Object(obj.line_num + delta, obj.chunk, obj.element,
+                     obj._layout, obj.params)
+        del nodes[depth:]
+        if nodes:
+            nodes.append(nodes[-1].add(obj))
+        else:
+            nodes.append(Tree(obj))
+    return nodes[0]
+
+
+class _Reparser(object):
+
+    """Build the new Tree for reparse(), reusing nodes of the old Tree.
+
+    An old canvas node is only reused where the new canvas starts on the
+    same line and has the same contents. The lines it covers are then
+    unchanged, so no part of it can be reused elsewhere in the new tree."""
+
+    def __init__(self, tree):
+        self.keys = _canvas_keys(tree)
+        # (node, old parent) for each node moved to the new tree
+        self.moved = []
+        self.make_object = _make_object
+        if pypd_instrument.enabled:
+            self.make_object = pypd_instrument.timed(
+                                   pypd_instrument.FACTORY, _make_object)
+
+    def _take(self, canvas):
+        """Return a node for canvas from the old tree, or None."""
+        candidates = self.keys.get(canvas.key)
+        if not candidates:
+            return None
+        for node in candidates:
+            if node.value.line_num == canvas.start:
+                break
+        else:
+            # Unchanged but moved, the Objects need new line numbers
+            node = candidates[0]
+            return _shifted(node, canvas.start - node.value.line_num)
+
+        parent = node.parent
+        if parent is not None:
+            self.moved.append((node, parent))
+        return node
+
+    def build(self, canvas):
+        """Return the node for canvas and its subpatches."""
+        node = self._take(canvas)
+        if node is not None:
+            return node
+
+        start = canvas.start
+        entries = iter(canvas.entries)
+        _, chunk, element, params = entries.next()
+        node = Tree(self.make_object(start, chunk, element, list(params)))
+        for entry in entries:
+            if len(entry) == 2:
+                node.addBranch(self.build(entry[1]))
+            else:
+                line_num, chunk, element, params = entry
+                node.add(self.make_object(start + line_num, chunk,
+                                          element, list(params)))
+        return node
+
+    def restore(self):
+        """Return the moved nodes to their old parents."""
+        for node, parent in self.moved:
+            node.parent = parent
+
+
+def reparse(tree, lines, tokenize=xtokens):
+    """Parse the new lines of a patch file previously parsed into tree.
+
+    Returns a Tree equal to parse(lines). Canvases (and the whole patch)
+    that are unchanged are reused from tree, with their nodes and Objects,
+    and only the changed canvases are built from the new lines. A canvas
+    whose contents are unchanged but which has moved within the file is
+    copied with new line numbers. The old tree shares nodes with the new
+    one and should not be used afterwards.
+
+    Line numbers are absolute, so an edit that adds or removes lines moves
+    every canvas after it. Those canvases are copied rather than parsed,
+    which saves tokenizing but still creates a node and an Object for each
+    of their chunks. Only the canvases before the edit are reused as they
+    are.
+
+    Raises InvalidLine and InvalidPatch as parse() does, tree is unchanged
+    if so."""
+
+    with pypd_instrument.phase(pypd_instrument.BUILD):
+        return _reparse(tree, lines, tokenize)
+
+
+def _reparse(tree, lines, tokenize):
+    # Read the whole file first, so that the old tree isn't changed if the
+    # file is invalid.
+    stack, structs = [], []
+    for event, line_num, chunk, element, params in xevents(lines, tokenize):
+        if event == CANVAS_OPEN:
+            stack.append(_Canvas(line_num, chunk, element, params))
+            if structs:
+                # Line numbers before the root canvas's are negative
+                for struct in structs:
+                    stack[0].add(*struct)
+                structs = []
+        elif event == CANVAS_CLOSE:
+            canvas = stack.pop()
+            canvas.add(line_num, chunk, element, params)
+            canvas.close()
+            stack[-1].add_canvas(canvas)
+        elif stack:
+            stack[-1].add(line_num, chunk, element, params)
+        else:
+            structs.append((line_num, chunk, element, params))
+    root = stack[0]
+    root.close()
+
+    reparser = _Reparser(tree)
+    try:
+        return reparser.build(root)
+    except:
+        reparser.restore()
+        raise
+
+
+class Patch(object):
+
+    """A PD patch file parsed into a Tree of Objects."""
+
+    def __init__(self, path):
+        """Read and parse the given patch file.
+
+        Raises InvalidLine or InvalidPatch if the file can't be parsed."""
+        self.path = path
+        with pypd_instrument.phase(pypd_instrument.PATCH, path=path), \
+             open(path) as f:
+            try:
+                self.tree = parse(f)
+            except InvalidPatch, ex:
+                raise InvalidPatch('%s: %s' % (path, ex))
+        # id(canvas node) -> Graph
+        self._graphs = {}
+
+    def reload(self):
+        """Read the patch file again after it has changed.
+
+        The unchanged canvases of the current tree are reused, see
+        reparse()."""
+        with pypd_instrument.phase(pypd_instrument.PATCH, path=self.path), \
+             open(self.path) as f:
+            try:
+                self.tree = reparse(self.tree, f)
+            except InvalidPatch, ex:
+                raise InvalidPatch('%s: %s' % (self.path, ex))
+        # A reused canvas node has the same objects and connections
+        graphs, self._graphs = self._graphs, {}
+        for node, _ in self.tree:
+            graph = graphs.get(id(node))
+            if graph is not None:
+                self._graphs[id(node)] = graph
+
+    def graph(self, canvas=None):
+        """Return the pypd_graph.Graph of the connections on a canvas node
+        of the tree, by default the top level canvas.
+
+        Each Graph is built when it's first asked for and kept until the
+        canvas changes."""
+        if canvas is None:
+            canvas = self.tree
+        graph = self._graphs.get(id(canvas))
+        if graph is None:
+            graph = self._graphs[id(canvas)] = \
+                    pypd_graph.Graph.from_canvas(canvas)
+        return graph
+
+    def __iter__(self):
+        """Yield each Object in the order it appears in the patch file."""
+        nodes = iter(self.tree)
+        root, _ = nodes.next()
+        # The struct declarations before the top level canvas are its first
+        # children
+        for node, depth in nodes:
+            if depth == 1 and node.value.line_num < root.value.line_num:
+                yield node.value
+                continue
+            yield root.value
+            yield node.value
+            break
+        else:
+            yield root.value
+        for node, depth in nodes:
+            yield node.value
+
+    def __str__(self):
+        """Return the text of the patch suitable for storing in a file."""
+        return ''.join(['%s;\n' % obj for obj in self])
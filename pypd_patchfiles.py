@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+"""Find the patch files under a set of search roots and their dependencies.
+
+Each patch file may use other patch files (abstractions) by naming them in
+an object box, e.g. "#X obj 10 10 mapping/curve" uses the abstraction
+curve.pd found in a "mapping" directory. PatchFiles scans every patch file
+under the search roots and resolves each object name against the patch
+files found, with the same rules as ObjectName.match_path()."""
+
+import os
+import bisect
+import multiprocessing
+import pypd_patch
+import pypd_instrument
+from pypd_class_attrs import OBJ, OBJ_NAME_INDEX
+from pypd_objectname import ObjectName, NameResolver
+from pypd_exceptions import PyPdException
+
+
+EXT = '.pd'
+
+
+def _scan_file(path):
+    """Return (path, object names used, error text) for the given file.
+
+    This is run in the worker processes. Only the object names are sent
+    back to the parent process, not the parsed patch."""
+    names = set()
+    try:
+        with pypd_instrument.phase(pypd_instrument.SCAN, path=path), \
+             open(path) as f:
+            for _, _, _, element, params in pypd_patch.xevents(f):
+                if element == OBJ and len(params) > OBJ_NAME_INDEX:
+                    names.add(params[OBJ_NAME_INDEX])
+    except (PyPdException, IOError), ex:
+        return path, (), str(ex)
+    return path, tuple(names), None
+
+
+def find_files(roots, ext=EXT):
+    """Return a sorted list of the files under roots with the given ext."""
+    paths = []
+    for root in roots:
+        for dirpath, _, filenames in os.walk(root):
+            paths.extend([os.path.join(dirpath, filename) \
+                          for filename in filenames \
+                          if filename.endswith(ext)])
+    return sorted(paths)
+
+
+class PatchFiles(object):
+
+    """The patch files found under a set of search roots.
+
+    Each file is parsed once when the instance is created. Files are parsed
+    in parallel by a pool of worker processes."""
+
+    def __init__(self, roots, processes=None, cache=None):
+        """Find and scan every patch file under the given search roots.
+
+        processes is the number of worker processes to use, the default is
+        the number of CPUs. If processes is 1 no worker processes are
+        created. If a pypd_cache.ParseCache is given only the files that
+        have changed since they were cached are scanned."""
+        self.roots = roots
+        self.cache = cache
+        self.paths = find_files(roots)
+
+        # The names of the objects used by each patch file.
+        self.uses = {}
+        # The error text for each patch file that couldn't be parsed.
+        self.errors = {}
+
+        # Patch files indexed by their name without path or extension,
+        # which is the rname of any ObjectName that refers to them.
+        self._resolver = NameResolver(self.paths, EXT)
+        # rname -> set of the patch files using an object with that rname
+        self._users = {}
+
+        self._scan(processes)
+
+    def _scan(self, processes):
+        paths, keys = self.paths, {}
+        if self.cache:
+            paths = []
+            for path in self.paths:
+                try:
+                    key = keys[path] = self.cache.key(path)
+                except OSError, ex:
+                    # Removed since it was found
+                    self._add_result(path, (), str(ex))
+                    continue
+                result = self.cache.get(path, key)
+                if pypd_instrument.enabled:
+                    pypd_instrument.count(result is None and \
+                                          pypd_instrument.CACHE_MISS or \
+                                          pypd_instrument.CACHE_HIT)
+                if result is None:
+                    paths.append(path)
+                else:
+                    self._add_result(path, *result)
+
+        for path, names, err in self._scan_files(paths, processes):
+            self._add_result(path, names, err)
+            if self.cache:
+                self.cache.put(path, (names, err), keys[path])
+
+    def _scan_files(self, paths, processes):
+        """Yield the result of _scan_file() for each of the given paths."""
+        if processes == 1 or len(paths) < 2:
+            for result in map(_scan_file, paths):
+                yield result
+            return
+
+        pool = multiprocessing.Pool(processes)
+        try:
+            # Hand out several files at a time to cut down on the overhead
+            # of passing work to the worker processes.
+            nprocs = processes or multiprocessing.cpu_count()
+            chunksize = max(1, len(paths) / (nprocs * 4))
+            for result in pool.imap_unordered(_scan_file, paths, chunksize):
+                yield result
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    def _add_result(self, path, names, err):
+        if err:
+            self.errors[path] = err
+            return
+        self.uses[path] = names
+        for name in names:
+            try:
+                rname = ObjectName.intern(name).rname
+            except ValueError:
+                continue
+            self._users.setdefault(rname, set()).add(path)
+
+    def _remove_result(self, path):
+        self.errors.pop(path, None)
+        for name in self.uses.pop(path, ()):
+            try:
+                users = self._users[ObjectName.intern(name).rname]
+            except (ValueError, KeyError):
+                continue
+            users.discard(path)
+
+    def update(self, path):
+        """Scan a patch file again after it has been added or changed.
+
+        path must be below one of the search roots."""
+        if path in self.uses or path in self.errors:
+            self._remove_result(path)
+        else:
+            bisect.insort(self.paths, path)
+            self._resolver.add(path)
+
+        key = None
+        if self.cache:
+            try:
+                key = self.cache.key(path)
+            except OSError, ex:
+                self._add_result(path, (), str(ex))
+                return
+        path, names, err = _scan_file(path)
+        self._add_result(path, names, err)
+        if key:
+            self.cache.put(path, (names, err), key)
+
+    def remove(self, path):
+        """Forget a patch file that has been deleted. Returns true if the
+        file was known."""
+        i = bisect.bisect_left(self.paths, path)
+        if i == len(self.paths) or self.paths[i] != path:
+            return False
+        del self.paths[i]
+        self._resolver.remove(path)
+        self._remove_result(path)
+        return True
+
+    def resolve(self, name, from_path=None):
+        """Return the list of patch files that the object name refers to.
+
+        If from_path is given, patch files in the same directory as
+        from_path are listed first."""
+        if pypd_instrument.enabled:
+            with pypd_instrument.phase(pypd_instrument.RESOLVE, name=name):
+                return self._resolve(name, from_path)
+        return self._resolve(name, from_path)
+
+    def _resolve(self, name, from_path):
+        paths = self._resolver.resolve(name)
+        if from_path and len(paths) > 1:
+            local_dir = os.path.dirname(from_path)
+            paths.sort(key=lambda path: os.path.dirname(path) != local_dir)
+        return paths
+
+    def dependencies(self, path):
+        """Return a dict of object name to the patch files it refers to.
+
+        Only the object names that refer to patch files are included."""
+        deps = {}
+        for name in self.uses.get(path, ()):
+            try:
+                paths = self.resolve(name, path)
+            except ValueError:
+                # Not a valid object name, so not an abstraction either
+                continue
+            if paths:
+                deps[name] = paths
+        return deps
+
+    def dependents(self, path):
+        """Return a sorted list of the patch files that use the given
+        file."""
+        rname = os.path.splitext(os.path.basename(path))[0]
+        return sorted([user for user in self._users.get(rname, ()) \
+                       if path in [dep for paths in \
+                                   self.dependencies(user).values() \
+                                   for dep in paths]])
+
+    def graph(self):
+        """Return a dict of each patch file to the set of files it uses."""
+        graph = {}
+        for path in self.uses:
+            graph[path] = set([dep for paths in \
+                               self.dependencies(path).values() \
+                               for dep in paths])
+        return graph
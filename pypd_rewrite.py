@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+"""Apply a set of edits to many patch files and write them back.
+
+Each file is streamed through pypd_patch.xevents, no Tree is built. Each
+edit names the elements it applies to and only the chunks with those
+elements are made into Objects and passed to the edits, e.g. renaming an
+object only looks at "obj" chunks. An edit returns a replacement Object,
+which is written out with Object.__str__. The other chunks are written
+out as they were read.
+
+A file is only written if an edit changed it. It's written to a temporary
+file in the same directory which is renamed over the original, so a file
+is never left partly written. Like Patch.__str__, each chunk of a
+rewritten file is written on a line of its own.
+
+Many files are rewritten in parallel by a pool of worker processes, as
+PatchFiles does when scanning. For example, to rename an object and move
+a declared path across a library:
+
+    rewriter = Rewriter([RenameObjects({'old/delay': 'delay'}),
+                         RepointDeclares({'../old': '../new'})])
+    changed, errors = rewriter.rewrite_files(find_files(roots))"""
+
+import multiprocessing
+import pypd_patch
+from pypd_object import Object
+from pypd_atomic import atomic_write
+from pypd_class_attrs import OBJ, OBJ_NAME_INDEX
+from pypd_exceptions import PyPdException, InvalidLine
+
+
+DECLARE = 'declare'
+# The flags of a declare followed by a path
+DECLARE_PATH_FLAGS = ('-path', '-stdpath')
+
+
+def _chunk_text(chunk, element, params):
+    """Return the text of a chunk, the same as str() of its Object."""
+    if chunk == Object.ARRAY_CHUNK:
+        return ' '.join([chunk] + params)
+    return ' '.join([chunk, element] + params)
+
+
+def _replace_params(obj, replacements):
+    """Return a copy of obj with params[i] replaced for each i: value in
+    the replacements dict."""
+    params = list(obj.params)
+    for i, value in replacements.items():
+        params[i] = value
+    return Object.factory(obj.line_num, obj.chunk, obj.element, params)
+
+
+class Edit(object):
+
+    """The base class of edits.
+
+    elements is the element names of the chunks the edit applies to, e.g.
+    ('obj',). apply() is called with an Object for each of those chunks
+    and returns a replacement Object, or None to leave it as it is. An
+    edit used with rewrite_files() is pickled and sent to the worker
+    processes."""
+
+    elements = ()
+
+    def apply(self, obj):
+        raise NotImplementedError
+
+
+class RenameObjects(Edit):
+
+    """Rename object boxes, e.g. to swap pd-extended objects for their
+    vanilla equivalents.
+
+    names is a dict of old name -> new name. Names are matched exactly,
+    the arguments of the object are kept."""
+
+    elements = (OBJ,)
+
+    def __init__(self, names):
+        self.names = dict(names)
+
+    def apply(self, obj):
+        params = obj.params
+        if len(params) > OBJ_NAME_INDEX:
+            name = self.names.get(params[OBJ_NAME_INDEX])
+            if name is not None:
+                return _replace_params(obj, {OBJ_NAME_INDEX: name})
+        return None
+
+
+class RepointDeclares(Edit):
+
+    """Change the paths in declare chunks and objects.
+
+    paths is a dict of old path -> new path. The paths following -path and
+    -stdpath are matched exactly."""
+
+    elements = (DECLARE, OBJ)
+
+    def __init__(self, paths):
+        self.paths = dict(paths)
+
+    def apply(self, obj):
+        params = obj.params
+        if obj.element == DECLARE:
+            start = 0
+        elif len(params) > OBJ_NAME_INDEX and \
+             params[OBJ_NAME_INDEX] == DECLARE:
+            start = OBJ_NAME_INDEX + 1
+        else:
+            return None
+
+        replacements = {}
+        for i in xrange(start, len(params) - 1):
+            if params[i] in DECLARE_PATH_FLAGS:
+                path = self.paths.get(params[i + 1])
+                if path is not None:
+                    replacements[i + 1] = path
+        return replacements and _replace_params(obj, replacements) or None
+
+
+class Rewriter(object):
+
+    """Apply a list of edits to patch files.
+
+    The edits are applied to each chunk in order, each to the result of
+    the one before."""
+
+    def __init__(self, edits):
+        self.edits = list(edits)
+        # element -> the edits that apply to it
+        self._by_element = {}
+        for edit in self.edits:
+            for element in edit.elements:
+                self._by_element.setdefault(element, []).append(edit)
+
+    def rewrite_lines(self, lines):
+        """Return (the rewritten text, the number of chunks changed).
+
+        The text is only built if a chunk is changed, it's None otherwise.
+        Raises InvalidLine and InvalidPatch if the lines can't be
+        parsed."""
+        by_element = self._by_element
+        out, changed = [], 0
+        for _, line_num, chunk, element, params in pypd_patch.xevents(lines):
+            edits = by_element.get(element)
+            if edits:
+                try:
+                    obj = orig = Object.factory(line_num, chunk, element,
+                                                params)
+                except (KeyError, ValueError), ex:
+                    raise InvalidLine(_chunk_text(chunk, element, params),
+                                      line_num, 'Unknown element', ex)
+                for edit in edits:
+                    obj = edit.apply(obj) or obj
+                if obj is not orig:
+                    changed += 1
+                    out.append(str(obj))
+                    continue
+            out.append(_chunk_text(chunk, element, params))
+
+        if not changed:
+            return None, 0
+        out.append('')
+        return ';\n'.join(out), changed
+
+    def rewrite_file(self, path, dry_run=False):
+        """Apply the edits to a patch file and return the number of chunks
+        changed.
+
+        The file is only written if a chunk was changed and dry_run is
+        false. Raises IOError if the file can't be read or written, and
+        InvalidLine or InvalidPatch if it can't be parsed. The file is
+        left unchanged if so."""
+        with open(path) as f:
+            text, changed = self.rewrite_lines(f)
+        if changed and not dry_run:
+            with atomic_write(path) as f:
+                f.write(text)
+        return changed
+
+    def rewrite_files(self, paths, processes=None, dry_run=False):
+        """Apply the edits to many patch files.
+
+        processes is the number of worker processes to use, the default is
+        the number of CPUs. If processes is 1 no worker processes are
+        created. Returns (changed, errors), dicts of the number of chunks
+        changed in each file that was changed and the error text for each
+        file that couldn't be rewritten."""
+        changed, errors = {}, {}
+        for path, count, err in self._rewrite_files(paths, processes,
+                                                    dry_run):
+            if err:
+                errors[path] = err
+            elif count:
+                changed[path] = count
+        return changed, errors
+
+    def _rewrite_files(self, paths, processes, dry_run):
+        """Yield the result of _rewrite_file() for each of the paths."""
+        if processes == 1 or len(paths) < 2:
+            for path in paths:
+                yield _rewrite_file(self, dry_run, path)
+            return
+
+        # The rewriter is sent to each worker once, not with every file
+        pool = multiprocessing.Pool(processes, _init_worker, (self, dry_run))
+        try:
+            nprocs = processes or multiprocessing.cpu_count()
+            chunksize = max(1, len(paths) / (nprocs * 4))
+            for result in pool.imap_unordered(_worker_rewrite_file, paths,
+                                              chunksize):
+                yield result
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+
+def _rewrite_file(rewriter, dry_run, path):
+    """Return (path, chunks changed, error text) for the given file."""
+    try:
+        return path, rewriter.rewrite_file(path, dry_run), None
+    except (PyPdException, IOError, OSError), ex:
+        return path, 0, str(ex)
+
+
+# The Rewriter and dry_run flag in each worker process
+_worker_args = None
+
+
+def _init_worker(rewriter, dry_run):
+    global _worker_args
+    _worker_args = (rewriter, dry_run)
+
+
+def _worker_rewrite_file(path):
+    return _rewrite_file(_worker_args[0], _worker_args[1], path)
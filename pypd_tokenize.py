@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""Split the lines of a patch file into ";" terminated chunks of tokens.
+
+A token is a run of non-space characters, any of which may be escaped with
+a backslash. An unescaped ";" ends a chunk. An escaped character, e.g.
+"\\;", "\\," or "\\$", is kept in the token with its backslash. A
+backslash at the end of a line, with nothing to escape, is a token on its
+own. So is an unescaped ",", which Pd reads as a separate atom, e.g. the
+", f 11" that Pd 0.46 and later add to a box with a set width.
+
+A tokenizer is called with an iterable of lines and yields (line_num,
+tokens) for each chunk, where line_num is the line number on which the
+chunk starts. There are two, which always give the same result:
+
+    xtokens             the fast path. Lines without a backslash or a
+                        ",", which is nearly all of them, are split with
+                        str.split. Other lines are split with a
+                        precompiled regular expression.
+    xtokens_careful     scans every line a character at a time, the
+                        reference that the fast path is checked against
+
+Either can be passed to pypd_patch.xchunks() and the functions built on it.
+Only the tokens of the current chunk are held in memory."""
+
+import re
+from pypd_exceptions import InvalidLine
+
+
+_END = ';'
+_COMMA = ','
+_ESCAPE = '\\'
+_SPACE = frozenset(' \t\n\r\f\v')
+_BREAK = _SPACE | frozenset([_END, _COMMA, _ESCAPE])
+
+# A token, ";", "," or a backslash with nothing to escape
+_token_re = re.compile(r'(?:\\.|[^\s;,\\])+|;|,|\\')
+
+
+def _split_escaped(line):
+    """Return the tokens in line as a list of segments, one for each ";"
+    in the line plus the segment after the last one."""
+    segments, tokens = [], []
+    for token in _token_re.findall(line):
+        if token == _END:
+            segments.append(tokens)
+            tokens = []
+        else:
+            tokens.append(token)
+    segments.append(tokens)
+    return segments
+
+
+def _split_careful(line):
+    """The same as _split_escaped(), scanning a character at a time."""
+    segments, tokens = [], []
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if c in _SPACE:
+            i += 1
+        elif c == _END:
+            segments.append(tokens)
+            tokens = []
+            i += 1
+        else:
+            start = i
+            while i < n:
+                c = line[i]
+                if c == _ESCAPE:
+                    # A backslash escapes any character but a newline
+                    if i + 1 < n and line[i + 1] != '\n':
+                        i += 2
+                        continue
+                    break
+                if c in _BREAK:
+                    break
+                i += 1
+            if i == start:
+                # A "," or a backslash with nothing to escape
+                i += 1
+            tokens.append(line[start:i])
+    segments.append(tokens)
+    return segments
+
+
+def _xtokens(lines, careful):
+    tokens, start_num = [], 0
+    for line_num, line in enumerate(lines, 1):
+        if careful:
+            segments = _split_careful(line)
+        elif _ESCAPE in line or _COMMA in line:
+            segments = _split_escaped(line)
+        else:
+            segments = [segment.split() for segment in line.split(_END)]
+
+        # Every segment but the last is ended by a ";"
+        last = segments.pop()
+        for segment in segments:
+            if segment:
+                if tokens:
+                    tokens.extend(segment)
+                else:
+                    tokens, start_num = segment, line_num
+            elif not tokens:
+                # An empty chunk, a lone ";", starts on this line
+                start_num = line_num
+            yield start_num, tokens
+            tokens = []
+        if last:
+            if tokens:
+                tokens.extend(last)
+            else:
+                tokens, start_num = last, line_num
+
+    if tokens:
+        raise InvalidLine(' '.join(tokens), start_num,
+                          'Unterminated chunk')
+
+
+def xtokens(lines):
+    """Yield (line_num, tokens) for each ";" terminated chunk in lines.
+
+    Raises InvalidLine if the last chunk isn't terminated."""
+    return _xtokens(lines, False)
+
+
+def xtokens_careful(lines):
+    """The same as xtokens(), scanning every line a character at a time."""
+    return _xtokens(lines, True)
@@ -1,12 +1,8 @@
 #!/usr/bin/env python
 
-from itertools import izip_longest
-
-# TODO
-#
-# Use weakref for child to parent links. Otherwise we have a circular reference
-# which will cause Python to use Garbage Collection, rather than ref-counting
-# which is much slower.
+import weakref
+from array import array
+from itertools import izip, izip_longest
 
 
 class Tree(object):
@@ -15,11 +11,30 @@ class Tree(object):
 
     This class dispenses with the notion of separate tree and node classes and
     uses a single class for both. All nodes in the tree are instances of
-    Tree."""
+    Tree.
+
+    Child to parent links are weak references. Otherwise we have a circular
+    reference which will cause Python to use Garbage Collection, rather than
+    ref-counting which is much slower. A consequence is that a node's
+    parent is None once nothing else refers to the parent."""
 
     def __init__(self, value=None, parent=None):
         (self.parent, self.value, self._children) = (parent, value, [])
 
+    def _get_parent(self):
+        if self._parent is None:
+            return None
+        return self._parent()
+
+    def _set_parent(self, parent):
+        if parent is None:
+            self._parent = None
+        else:
+            self._parent = weakref.ref(parent)
+
+    parent = property(_get_parent, _set_parent, doc="""\
+    The parent node or None for the root node.""")
+
     def __len__(self):
         return len(self._children)
 
@@ -33,13 +48,13 @@ class Tree(object):
 
     def add(self, value):
         """Add the given value as a child of this node."""
-        tree = Tree(value, parent=self)
+        tree = self.__class__(value, parent=self)
         self._children.append(tree)
         return tree
 
     def addChildren(self, children):
         """Add a list of children to this node."""
-        child_nodes = [Tree(c, parent=self) for c in children]
+        child_nodes = [self.__class__(c, parent=self) for c in children]
         self._children.extend(child_nodes)
         return child_nodes
 
@@ -79,6 +94,8 @@ class Tree(object):
                                     reversed(child._children)])
 
     def __eq__(self, other):
+        if isinstance(other, FlatTree):
+            return other == self
         return id(self) == id(other) or self._eq_tree(other)
 
     def _eq_tree(self, other):
@@ -91,7 +108,7 @@ class Tree(object):
                 if depth1 != depth2 or node1.value != node2.value:
                     return False
             return True
-        except (TypeError, ValueError):
+        except (TypeError, ValueError, AttributeError):
             # Other is not a Tree
             return False
 
@@ -105,3 +122,163 @@ class Tree(object):
         appears in the patch file."""
         for (node, depth) in self:
             fn(node, depth)
+
+    def select(self, pred=None, prune=None):
+        """Yield (node, depth) for each node that pred(node, depth) accepts.
+
+        Nodes are visited in the same depth first order as __iter__. If
+        pred is None every node is yielded. If prune(node, depth) returns
+        true the children of that node are skipped, whether or not the node
+        itself matched."""
+        child_stack = [(self, 0)]
+        while child_stack:
+            (node, depth) = child_stack.pop()
+            if pred is None or pred(node, depth):
+                yield (node, depth)
+
+            if node._children and not (prune and prune(node, depth)):
+                child_stack.extend([(c, depth + 1) for c in \
+                                    reversed(node._children)])
+
+    def apply_batch(self, fn, pred=None, prune=None, batch_size=256):
+        """Call fn with lists of up to batch_size (node, depth) tuples.
+
+        The nodes are those selected by select() with the given pred and
+        prune functions. If fn returns true the traversal stops. Returns
+        true if the traversal was stopped by fn."""
+        batch = []
+        for item in self.select(pred, prune):
+            batch.append(item)
+            if len(batch) == batch_size:
+                if fn(batch):
+                    return True
+                batch = []
+        return bool(batch) and bool(fn(batch))
+
+    def find(self, pred, prune=None):
+        """Return the first (node, depth) that pred accepts, or None."""
+        for item in self.select(pred, prune):
+            return item
+        return None
+
+    def any(self, pred, prune=None):
+        """Return true if pred accepts any node. Stops at the first match."""
+        return self.find(pred, prune) is not None
+
+    def flatten(self):
+        """Return a FlatTree copy of this tree."""
+        return FlatTree.from_tree(self)
+
+
+class FlatTree(object):
+
+    """A frozen tree stored as arrays in depth first (preorder) order.
+
+    Nodes are referred to by their index in the arrays, the root node is at
+    index 0. For the node at index i:
+
+        values[i]       the node value
+        depths[i]       the depth of the node, the root is at depth 0
+        parents[i]      the index of the parent node, -1 for the root
+        sizes[i]        the number of nodes in the subtree rooted at i,
+                        including i. The subtree is at i ... i + sizes[i] - 1
+
+    The depths, parents and sizes are stored in array.array instances.
+    Traversal, equality and subtree slicing are loops over the arrays,
+    no intermediate nodes or lists are created."""
+
+    __slots__ = ('values', 'depths', 'parents', 'sizes')
+
+    TYPECODE = 'i'
+
+    @staticmethod
+    def from_tree(tree):
+        """Return a FlatTree with the same values and shape as tree."""
+        values = []
+        depths, parents = array(FlatTree.TYPECODE), array(FlatTree.TYPECODE)
+
+        # The indices of the nodes on the path from the root to the
+        # current node.
+        path = []
+        for node, depth in tree:
+            del path[depth:]
+            if path:
+                parents.append(path[-1])
+            else:
+                parents.append(-1)
+            path.append(len(values))
+            values.append(node.value)
+            depths.append(depth)
+
+        # Each node adds its subtree size to its parent. Children always
+        # follow their parent so one reverse pass is enough.
+        sizes = array(FlatTree.TYPECODE, [1]) * len(values)
+        for i in xrange(len(values) - 1, 0, -1):
+            sizes[parents[i]] += sizes[i]
+
+        return FlatTree(tuple(values), depths, parents, sizes)
+
+    def __init__(self, values, depths, parents, sizes):
+        """Don't use this directly, use from_tree() or Tree.flatten()."""
+        (self.values, self.depths, self.parents, self.sizes) = \
+                (values, depths, parents, sizes)
+
+    def __len__(self):
+        """Return the total number of nodes in the tree."""
+        return len(self.values)
+
+    def __iter__(self):
+        """Yield (value, depth) for each node, depth first."""
+        return izip(self.values, self.depths)
+
+    def children(self, i=0):
+        """Return the indices of the immediate children of node i."""
+        sizes, end = self.sizes, i + self.sizes[i]
+        indices, i = [], i + 1
+        while i < end:
+            indices.append(i)
+            i += sizes[i]
+        return indices
+
+    def leaf(self, i=0):
+        """Return true if node i is a leaf node."""
+        return self.sizes[i] == 1
+
+    def subtree(self, i):
+        """Return the subtree rooted at node i as a new FlatTree."""
+        end = i + self.sizes[i]
+        depth = self.depths[i]
+        depths = array(self.TYPECODE, [d - depth for d in self.depths[i:end]])
+        parents = array(self.TYPECODE, [p - i for p in self.parents[i:end]])
+        parents[0] = -1
+        return FlatTree(self.values[i:end], depths, parents, self.sizes[i:end])
+
+    def __eq__(self, other):
+        if isinstance(other, Tree):
+            other = other.flatten()
+        elif not isinstance(other, FlatTree):
+            return False
+        # The depths in depth first order fully determine the shape
+        return self is other or (self.depths == other.depths and \
+                                 self.values == other.values)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def apply(self, fn):
+        """Apply the given function to the value and depth of every node.
+
+        Iteration is depth first, each value being visited in the order it
+        appears in the patch file."""
+        for value, depth in izip(self.values, self.depths):
+            fn(value, depth)
+
+    def to_tree(self):
+        """Return a new Tree with the same values and shape."""
+        nodes = []
+        for value, parent in izip(self.values, self.parents):
+            if parent < 0:
+                nodes.append(Tree(value))
+            else:
+                nodes.append(nodes[parent].add(value))
+        return nodes[0]
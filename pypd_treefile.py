@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+"""Save and load parsed patch Trees in a compact binary format.
+
+Loading a saved Tree is much faster than parsing the patch file again and
+the file is smaller than a pickle of the Tree. The format is:
+
+    MAGIC               6 bytes, the format name and version
+    ints length         varint, the length in bytes of the ints section
+    ints                varints, see below
+    strings             the bytes of each string in the string table
+
+All the integers are unsigned varints, 7 bits per byte with the high bit set
+on every byte except the last. The ints section holds, in order:
+
+    the number of strings followed by the length of each string
+    the number of layouts followed by, for each layout, the number of
+        attribute names and the string index of each name
+    the number of nodes followed by each node in depth first (preorder)
+        order, see _dump_node
+
+Every string (chunk types, element names, attribute names and params) is
+stored once in the string table and referred to by its index. The
+attribute names of each Object are saved with it, so a loaded Object has
+the same ordered_attrs whatever known objects files are loaded. The string
+table is sorted with the most used strings first, so that most string
+indices fit in one byte, and line numbers are stored as the difference from
+the previous node's line number."""
+
+import re
+from collections import defaultdict
+from pypd_class_attrs import Layout
+from pypd_object import Object
+from pypd_tree import Tree
+
+
+MAGIC = 'PYPDT1'
+
+# A varint longer than one byte
+_multi_byte_re = re.compile(r'[\x80-\xff]+[\x00-\x7f]')
+
+
+def _encode(ints):
+    """Return the ints encoded as varints."""
+    data = bytearray()
+    append = data.append
+    for n in ints:
+        if n < 0:
+            raise ValueError('Negative value %d' % n)
+        while n > 0x7f:
+            append((n & 0x7f) | 0x80)
+            n >>= 7
+        append(n)
+    return data
+
+
+def _decode(data):
+    """Return a list of the varints in data.
+
+    Most values fit in one byte. Runs of one byte values are converted in
+    one step, only the longer varints are decoded a byte at a time."""
+    ints = []
+    extend, append = ints.extend, ints.append
+    pos = 0
+    for match in _multi_byte_re.finditer(data):
+        extend(bytearray(data[pos:match.start()]))
+        n = shift = 0
+        for b in bytearray(match.group()):
+            n |= (b & 0x7f) << shift
+            shift += 7
+        append(n)
+        pos = match.end()
+    if data and ord(data[-1]) & 0x80:
+        raise ValueError('Truncated varint')
+    extend(bytearray(data[pos:]))
+    return ints
+
+
+def _zigzag(n):
+    """Map signed ints onto unsigned ones, 0, -1, 1, -2 ... to 0, 1, 2, 3."""
+    return n < 0 and -2 * n - 1 or 2 * n
+
+
+class _Table(dict):
+
+    """Number each distinct value in the order it's first seen."""
+
+    def __missing__(self, value):
+        i = self[value] = len(self)
+        return i
+
+    def values_in_order(self):
+        values = [None] * len(self)
+        for value, i in self.iteritems():
+            values[i] = value
+        return values
+
+
+def _dump_node(node, prev_line_num, ints, strings, layouts):
+    """Add the ints for a node to ints and return its line number.
+
+    Each node is the number of its children and then either 0 for a node
+    with no value, or one plus the zigzag encoded difference between the
+    Object's line number and prev_line_num, the string indices of its chunk
+    and element, its layout index, the number of params and the string
+    index of each param. The string indices are those in strings, they're
+    renumbered once all the strings are known."""
+    obj = node.value
+    ints.append(len(node._children))
+    if obj is None:
+        ints.append(0)
+        return prev_line_num
+    params = obj.params
+    ints.extend((_zigzag(obj.line_num - prev_line_num) + 1,
+                 strings[obj.chunk], strings[obj.element],
+                 layouts[obj._layout.attrs], len(params)))
+    ints.extend([strings[param] for param in params])
+    return obj.line_num
+
+
+def dumps(tree):
+    """Return the given Tree of Objects as a string."""
+    ints, strings, layouts = [], _Table(), _Table()
+    # The positions in ints of the string indices
+    string_pos = []
+    num_nodes = prev_line_num = 0
+    for node, _ in tree:
+        start = len(ints)
+        prev_line_num = _dump_node(node, prev_line_num, ints, strings,
+                                   layouts)
+        if ints[start + 1]:
+            string_pos.extend((start + 2, start + 3))
+            string_pos.extend(xrange(start + 6, len(ints)))
+        num_nodes += 1
+
+    layout_attrs = layouts.values_in_order()
+    for attrs in layout_attrs:
+        for attr in attrs:
+            strings[attr]
+
+    # Renumber the strings, most used first
+    counts = defaultdict(int)
+    for pos in string_pos:
+        counts[ints[pos]] += 1
+    order = sorted(xrange(len(strings)), key=lambda i: -counts[i])
+    renumber = [0] * len(order)
+    for new, old in enumerate(order):
+        renumber[old] = new
+    for pos in string_pos:
+        ints[pos] = renumber[ints[pos]]
+    by_index = strings.values_in_order()
+    string_list = [by_index[old] for old in order]
+
+    header = [len(layout_attrs)]
+    for attrs in layout_attrs:
+        header.append(len(attrs))
+        header.extend([renumber[strings[attr]] for attr in attrs])
+    header.append(num_nodes)
+
+    head = [len(string_list)] + [len(s) for s in string_list] + header
+    body = _encode(head) + _encode(ints)
+    return ''.join([MAGIC, str(_encode([len(body)])), str(body)] +
+                   string_list)
+
+
+def dump(tree, f):
+    """Write the given Tree of Objects to the open (binary) file f."""
+    f.write(dumps(tree))
+
+
+def loads(data):
+    """Return the Tree saved in the string data by dumps().
+
+    Raises ValueError if data is not a saved Tree."""
+    if not data.startswith(MAGIC):
+        raise ValueError('Not a pypd tree file')
+    try:
+        # The length of the ints section, a varint of at most 10 bytes
+        pos = len(MAGIC)
+        end = pos
+        while ord(data[end]) & 0x80:
+            end += 1
+        body_len = _decode(data[pos:end + 1])[0]
+        pos = end + 1
+        ints = _decode(data[pos:pos + body_len])
+        pos += body_len
+        return _build(ints, data, pos)
+    except (IndexError, KeyError), ex:
+        raise ValueError('Corrupt pypd tree file: %s' % ex)
+
+
+def _build(ints, data, pos):
+    """Return the Tree from the decoded ints and the string table at
+    data[pos:]."""
+    num_strings = ints[0]
+    strings = []
+    for length in ints[1:num_strings + 1]:
+        strings.append(intern(data[pos:pos + length]))
+        pos += length
+    if pos != len(data):
+        raise ValueError('Corrupt pypd tree file: bad string table')
+
+    i = num_strings + 1
+    layouts = []
+    for _ in xrange(ints[i]):
+        num_attrs = ints[i + 1]
+        layouts.append(Layout.get([strings[s] for s in \
+                                   ints[i + 2:i + 2 + num_attrs]]))
+        i += 1 + num_attrs
+    num_nodes = ints[i + 1]
+    i += 2
+
+    get_string = strings.__getitem__
+    # parent is the node whose children are being added and remaining is
+    # the number of its children still to come. The stack holds the same
+    # for the ancestors of parent.
+    root = parent = None
+    stack, remaining, line_num = [], 0, 0
+    for _ in xrange(num_nodes):
+        num_children = ints[i]
+        delta = ints[i + 1] - 1
+        if delta >= 0:
+            # Undo _zigzag()
+            line_num += delta & 1 and -((delta + 1) >> 1) or delta >> 1
+            num_params = ints[i + 5]
+            params = tuple(map(get_string, ints[i + 6:i + 6 + num_params]))
+            value = Object(line_num, strings[ints[i + 2]],
+                           strings[ints[i + 3]], layouts[ints[i + 4]],
+                           params)
+            i += 6 + num_params
+        else:
+            value = None
+            i += 2
+
+        if parent is not None:
+            node = parent.add(value)
+            remaining -= 1
+        elif root is None:
+            node = root = Tree(value)
+        else:
+            raise ValueError('Corrupt pypd tree file: more than one root')
+
+        if num_children:
+            if remaining:
+                stack.append((parent, remaining))
+            parent, remaining = node, num_children
+        else:
+            while not remaining and parent is not None:
+                parent, remaining = stack and stack.pop() or (None, 0)
+
+    if root is None or parent is not None or i != len(ints):
+        raise ValueError('Corrupt pypd tree file: bad structure')
+    return root
+
+
+def load(f):
+    """Return the Tree saved in the open (binary) file f by dump()."""
+    return loads(f.read())
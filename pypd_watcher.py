@@ -0,0 +1,613 @@
+#!/usr/bin/env python
+
+"""Keep the patch files under a set of search roots scanned as they change.
+
+A WatchDaemon scans the search roots once with PatchFiles and NameIndex and
+then watches them for changes. Changed patch files are scanned again in a
+background thread and the dependency graph and name index are updated
+for just those files. Queries are answered over a local (Unix domain)
+socket, so tools such as editor integrations get answers without a full
+scan each time.
+
+Changes are found with Linux inotify where it's available. Otherwise the
+search roots are polled for changed modification times and sizes.
+
+The protocol is one JSON object per line. A request names the query and
+its arguments, e.g. {"query": "dependents", "path": "/lib/curve.pd"}, and
+the response is {"result": ...} or {"error": "message"}. See
+WatchDaemon.query() for the queries and query() for a client.
+
+The search roots are read from a Config with the search_path key, e.g.
+
+    [install]
+    search_path_1 = /usr/lib/pd/extra
+    search_path_2 = /home/user/pd
+
+and can be run as:
+
+    python pypd_watcher.py config_file [socket_path]"""
+
+import os
+import sys
+import json
+import time
+import errno
+import select
+import socket
+import struct
+import logging
+import threading
+import SocketServer
+import ctypes
+import ctypes.util
+from pypd_config import Config
+from pypd_cache import ParseCache
+from pypd_index import NameIndex
+from pypd_compat import Classifier, EXTENDED_PATH_KEY, LEVEL_NAMES
+from pypd_patchfiles import PatchFiles, find_files, EXT
+from pypd_exceptions import PyPdException
+
+
+# Config keys
+SEARCH_PATH_KEY = 'search_path'
+SOCKET_PATH_KEY = 'watch_socket'
+
+DEFAULT_SOCKET_NAME = '.pypd-watch.sock'
+
+# Events returned by the watchers. REMOVED is also used for directories,
+# RESCAN means changes were missed and everything must be scanned again.
+CHANGED = 'changed'
+REMOVED = 'removed'
+RESCAN = 'rescan'
+
+# Seconds to wait for more events after the first, editors often write a
+# file in several steps.
+SETTLE_TIME = 0.05
+# Seconds to wait before reading the watcher again after it failed
+RETRY_TIME = 1.0
+
+_log = logging.getLogger('pypd.watcher')
+
+
+class PollingWatcher(object):
+
+    """Find changed patch files by comparing their modification times and
+    sizes with those found the last time.
+
+    The search roots are walked at most once every interval seconds,
+    however often read() is called."""
+
+    name = 'polling'
+
+    def __init__(self, roots, ext=EXT, interval=1.0):
+        self.roots, self.ext, self.interval = roots, ext, interval
+        self._stamps = self._scan()
+        self._next_poll = time.time() + interval
+        self._closed = threading.Event()
+
+    def _scan(self):
+        stamps = {}
+        for path in find_files(self.roots, self.ext):
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Removed since it was found
+                continue
+            stamps[path] = (st.st_mtime, st.st_size)
+        return stamps
+
+    def read(self, timeout=None):
+        """Return a list of (event, path) for the changes found.
+
+        Waits until the next poll is due, or for timeout seconds if that's
+        less. Returns an empty list if nothing has changed or the next poll
+        isn't due yet."""
+        wait = self._next_poll - time.time()
+        if timeout is not None and timeout < wait:
+            self._closed.wait(timeout)
+            return []
+        if wait > 0:
+            self._closed.wait(wait)
+        if self._closed.is_set():
+            return []
+
+        self._next_poll = time.time() + self.interval
+        stamps = self._scan()
+        events = [(CHANGED, path) for path, stamp in stamps.items() \
+                  if self._stamps.get(path) != stamp]
+        events.extend([(REMOVED, path) for path in self._stamps \
+                       if path not in stamps])
+        self._stamps = stamps
+        return events
+
+    def close(self):
+        self._closed.set()
+
+
+# Flags from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 02000000
+IN_NONBLOCK = 04000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | \
+              IN_DELETE | IN_DELETE_SELF
+
+# struct inotify_event, followed by len bytes of name
+_EVENT = struct.Struct('iIII')
+
+
+def _libc():
+    """Return the C library with the inotify functions, or raise
+    OSError."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        for fn in ('inotify_init1', 'inotify_add_watch', 'inotify_rm_watch'):
+            getattr(libc, fn)
+    except (OSError, AttributeError), ex:
+        raise OSError(errno.ENOSYS, 'inotify is not available: %s' % ex)
+    return libc
+
+
+class InotifyWatcher(object):
+
+    """Find changed patch files with Linux inotify.
+
+    Every directory under the search roots is watched, including those
+    created after the watcher is."""
+
+    name = 'inotify'
+
+    def __init__(self, roots, ext=EXT):
+        """Raises OSError if inotify is not available."""
+        self.roots, self.ext = roots, ext
+        self._libc = _libc()
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self._fd < 0:
+            self._raise()
+        # watch descriptor -> directory
+        self._dirs = {}
+        for root in roots:
+            self._add_tree(root)
+
+    def _raise(self):
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+    def _add_tree(self, root):
+        """Watch root and the directories below it. Returns the patch files
+        found, they may have been created before the watch was added."""
+        paths = []
+        for dirpath, _, filenames in os.walk(root):
+            wd = self._libc.inotify_add_watch(self._fd, dirpath, _WATCH_MASK)
+            if wd < 0:
+                if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR):
+                    # Removed while walking
+                    continue
+                self._raise()
+            self._dirs[wd] = dirpath
+            paths.extend([os.path.join(dirpath, filename) \
+                          for filename in filenames \
+                          if filename.endswith(self.ext)])
+        return paths
+
+    def _read_events(self):
+        """Yield (wd, mask, name) for each event that can be read."""
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError, ex:
+                if ex.errno == errno.EAGAIN:
+                    return
+                raise
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, pos)
+                pos += _EVENT.size
+                yield wd, mask, data[pos:pos + length].rstrip('\0')
+                pos += length
+
+    def read(self, timeout=None):
+        """Return a list of (event, path) for the changes found.
+
+        Waits for up to timeout seconds, or forever if timeout is None.
+        Returns an empty list if nothing has changed."""
+        if self._fd is None:
+            return []
+        try:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+        except select.error, ex:
+            if ex.args[0] == errno.EINTR:
+                return []
+            raise
+        if not readable:
+            return []
+
+        events = []
+        for wd, mask, name in self._read_events():
+            if mask & IN_Q_OVERFLOW:
+                events.append((RESCAN, None))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            dirpath = self._dirs.get(wd)
+            if dirpath is None:
+                continue
+            path = os.path.join(dirpath, name)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    events.extend([(CHANGED, p) for p in \
+                                   self._add_tree(path)])
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    events.append((REMOVED, path))
+            elif mask & IN_DELETE_SELF:
+                events.append((REMOVED, dirpath))
+            elif name.endswith(self.ext):
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    events.append((CHANGED, path))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    events.append((REMOVED, path))
+        return events
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def make_watcher(roots, ext=EXT):
+    """Return an InotifyWatcher if inotify is available, otherwise a
+    PollingWatcher."""
+    try:
+        return InotifyWatcher(roots, ext)
+    except OSError:
+        return PollingWatcher(roots, ext)
+
+
+def _last_events(events):
+    """Return the last of the (event, path) for each path, in the order
+    those last events arrived."""
+    seen, last = set(), []
+    for event, path in reversed(events):
+        if path not in seen:
+            seen.add(path)
+            last.append((event, path))
+    last.reverse()
+    return last
+
+
+def _remove_stale_socket(socket_path):
+    """Remove a socket left behind by a daemon that didn't shut down
+    cleanly. Raises PyPdException if a daemon is listening on it."""
+    if not os.path.exists(socket_path):
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error, ex:
+        if ex.errno != errno.ECONNREFUSED:
+            raise
+        os.unlink(socket_path)
+    else:
+        raise PyPdException('Another daemon is using %s' % socket_path)
+    finally:
+        sock.close()
+
+
+class _Handler(SocketServer.StreamRequestHandler):
+
+    """Answer each line of JSON from a client with a line of JSON."""
+
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            try:
+                request = json.loads(line)
+                # Paths are byte strings, as they are from os.walk()
+                args = dict([(str(k), isinstance(v, unicode) and \
+                                      v.encode('utf-8') or v) \
+                             for k, v in request.items() if k != 'query'])
+                response = {'result': self.server.watch_daemon.query(
+                                request['query'], **args)}
+            except Exception, ex:
+                response = {'error': '%s: %s' % (type(ex).__name__, ex)}
+            self.wfile.write(json.dumps(response) + '\n')
+            self.wfile.flush()
+
+
+class _Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+
+    daemon_threads = True
+
+
+class WatchDaemon(object):
+
+    """Keep PatchFiles and a NameIndex of the search roots up to date and
+    answer queries about them."""
+
+    def __init__(self, roots, socket_path, processes=None, cache=None,
+                 watcher=None, extended_paths=()):
+        """Scan the search roots and start watching them.
+
+        processes and cache are passed to PatchFiles. watcher is the
+        watcher to use, the default is make_watcher(roots).
+        extended_paths are the known objects files listing the pd-extended
+        objects, see pypd_compat."""
+        self.roots = roots
+        self.socket_path = socket_path
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+        # The watcher is created first so that no change is missed
+        self.watcher = watcher or make_watcher(roots)
+        self.files = PatchFiles(roots, processes, cache)
+        self.index = NameIndex()
+        for path in self.files.uses:
+            self._index_file(path)
+        self.classifier = Classifier(extended_paths, self.files.resolve)
+        # The number of changes applied since the initial scan
+        self.updates = 0
+
+    @staticmethod
+    def from_config(config, socket_path=None, processes=None):
+        """Create a daemon for the search roots in a Config.
+
+        The socket path is read from the config if not given, the default
+        is DEFAULT_SOCKET_NAME in the directory of the config file. A
+        ParseCache is used if the config has a cache directory, and the
+        extended objects files are read from the extended_objects key."""
+        roots = config.get(SEARCH_PATH_KEY)
+        if not roots:
+            raise PyPdException('No %s in %s' % (SEARCH_PATH_KEY,
+                                                 config.filename))
+        if not isinstance(roots, list):
+            roots = [roots]
+        socket_path = socket_path or config.get(SOCKET_PATH_KEY) or \
+                      os.path.join(os.path.dirname(
+                          os.path.abspath(config.filename)),
+                          DEFAULT_SOCKET_NAME)
+        extended_paths = config.get(EXTENDED_PATH_KEY) or []
+        if not isinstance(extended_paths, list):
+            extended_paths = [extended_paths]
+        return WatchDaemon(roots, socket_path, processes,
+                           ParseCache.from_config(config),
+                           extended_paths=extended_paths)
+
+    def _index_file(self, path):
+        try:
+            self.index.add_file(path)
+        except (PyPdException, IOError):
+            self.index.remove(path)
+
+    def apply(self, events):
+        """Update the scanned files for a list of (event, path).
+
+        A file that can't be read, e.g. because it was removed after the
+        event, is logged and forgotten as if it had been removed."""
+        with self._lock:
+            for event, path in events:
+                try:
+                    self._apply(event, path)
+                except EnvironmentError, ex:
+                    _log.warning('Failed to update %s: %s', path, ex)
+                    if path is not None:
+                        self._remove(path)
+                    self.classifier.clear()
+                self.updates += 1
+
+    def _apply(self, event, path):
+        if event == RESCAN:
+            self._rescan()
+            self.classifier.clear()
+        elif event == CHANGED and os.path.isfile(path):
+            if path in self.files.uses or path in self.files.errors:
+                self.classifier.forget(path)
+            else:
+                # Object names may now resolve to the new file
+                self.classifier.clear()
+            self.files.update(path)
+            self._index_file(path)
+        else:
+            self._remove(path)
+            self.classifier.clear()
+
+    def _remove(self, path):
+        if self.files.remove(path):
+            self.index.remove(path)
+            return
+        # A directory, remove every file below it
+        prefix = path.rstrip(os.sep) + os.sep
+        for file_path in [p for p in self.files.paths \
+                          if p.startswith(prefix)]:
+            self.files.remove(file_path)
+            self.index.remove(file_path)
+
+    def _rescan(self):
+        paths = set(find_files(self.roots))
+        for path in set(self.files.paths) - paths:
+            self.files.remove(path)
+            self.index.remove(path)
+        for path in paths:
+            self.files.update(path)
+            self._index_file(path)
+
+    def _watch(self):
+        """Apply the changes found by the watcher until stopped.
+
+        An unexpected error is logged and everything is scanned again, the
+        thread only stops when the daemon does."""
+        events = []
+        while not self._stop.is_set():
+            try:
+                events.extend(self.watcher.read(0.5))
+                if not events:
+                    continue
+                # Wait for any related changes
+                more = self.watcher.read(SETTLE_TIME)
+                while more:
+                    events.extend(more)
+                    more = self.watcher.read(SETTLE_TIME)
+                self.apply(_last_events(events))
+                events = []
+            except Exception:
+                _log.exception('Error watching %s, scanning again',
+                               ', '.join(self.roots))
+                # Changes may have been missed
+                events = [(RESCAN, None)]
+                self._stop.wait(RETRY_TIME)
+
+    def query(self, query, **args):
+        """Answer a query. The queries and their arguments are:
+
+            paths                       all the patch files found
+            errors                      path -> error for unparsable files
+            uses(path)                  the object names a file uses
+            dependencies(path)          object name -> files it refers to
+            dependents(path)            the files that use a file
+            resolve(name, from_path)    the files an object name refers to
+            objects(name)               path -> line numbers of the objects
+                                        named name
+            senders(symbol)             path -> line numbers of the objects
+            receivers(symbol)           sending or receiving on symbol
+            compat(path)                {"level": "vanilla", "extended"
+                                        or "unknown", "offending": list of
+                                        [path, line_num, name, level]}
+            status                      the number of files, errors and
+                                        updates and the watcher used
+
+        Raises ValueError for an unknown query."""
+        fn = getattr(self, '_query_' + query, None)
+        if fn is None:
+            raise ValueError('Unknown query "%s"' % query)
+        with self._lock:
+            return fn(**args)
+
+    def _query_paths(self):
+        return list(self.files.paths)
+
+    def _query_errors(self):
+        return dict(self.files.errors)
+
+    def _query_uses(self, path):
+        return sorted(self.files.uses.get(path, ()))
+
+    def _query_dependencies(self, path):
+        return self.files.dependencies(path)
+
+    def _query_dependents(self, path):
+        return self.files.dependents(path)
+
+    def _query_resolve(self, name, from_path=None):
+        return self.files.resolve(name, from_path)
+
+    def _query_objects(self, name):
+        return self.index.uses(name)
+
+    def _query_senders(self, symbol):
+        return self.index.senders(symbol)
+
+    def _query_receivers(self, symbol):
+        return self.index.receivers(symbol)
+
+    def _query_compat(self, path):
+        result = self.classifier.classify_file(path)
+        return {'level': result.name,
+                'offending': [(p, line_num, name, LEVEL_NAMES[level]) \
+                              for p, line_num, name, level in \
+                              result.offending]}
+
+    def _query_status(self):
+        return {'paths': len(self.files.paths),
+                'errors': len(self.files.errors),
+                'updates': self.updates,
+                'watcher': self.watcher.name}
+
+    def start(self):
+        """Start watching and serving queries in background threads.
+
+        Raises PyPdException if another daemon is using the socket path."""
+        _remove_stale_socket(self.socket_path)
+        self._thread = threading.Thread(target=self._watch)
+        self._thread.daemon = True
+        self._thread.start()
+
+        self._server = _Server(self.socket_path, _Handler)
+        self._server.watch_daemon = self
+        server_thread = threading.Thread(target=self._server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+    def serve_forever(self):
+        """Start and wait until stopped, e.g. by KeyboardInterrupt."""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                self._stop.wait(1.0)
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stop watching and serving queries and remove the socket."""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+        # The watcher thread checks for stop at least every half second,
+        # the watcher can't be closed while it's being read.
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.watcher.close()
+
+
+def query(socket_path, query, **args):
+    """Send a query to a WatchDaemon and return the result.
+
+    Raises PyPdException if the daemon returns an error."""
+    request = dict(args, query=query)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        f = sock.makefile('r+b')
+        f.write(json.dumps(request) + '\n')
+        f.flush()
+        response = json.loads(f.readline())
+        f.close()
+    finally:
+        sock.close()
+    if 'error' in response:
+        raise PyPdException(response['error'])
+    return response['result']
+
+
+def main(argv):
+    if len(argv) not in (2, 3):
+        print >> sys.stderr, 'usage: %s config_file [socket_path]' % argv[0]
+        return 2
+    logging.basicConfig(format='%(asctime)s %(name)s: %(message)s')
+    daemon = WatchDaemon.from_config(Config(argv[1], flush=False),
+                                     len(argv) > 2 and argv[2] or None)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,3 +1,4 @@
+import os
 import testutils
 
 
@@ -10,3 +11,19 @@ def pytest_generate_tests(metafunc):
     for arg, params in testutils.args_params:
         if arg in metafunc.funcargnames:
             metafunc.parametrize(arg, params, indirect=True)
+
+
+def pytest_funcarg__write_file(request):
+    """Return a function write_file(path, text) that writes text to path,
+    relative to the test's tmpdir, and returns the full path. Any missing
+    directories are created."""
+    tmpdir = str(request.getfuncargvalue('tmpdir'))
+
+    def write_file(path, text):
+        path = os.path.join(tmpdir, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+    return write_file
@@ -0,0 +1,40 @@
+import os
+import stat
+import pytest
+from pypd.pypd_atomic import atomic_write, default_mode, file_mode
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_new_file(tmpdir):
+    path = str(tmpdir.join('new'))
+    old_umask = os.umask(022)
+    try:
+        with atomic_write(path) as f:
+            f.write('text')
+        assert _mode(path) == default_mode() == 0644
+    finally:
+        os.umask(old_umask)
+    assert open(path).read() == 'text'
+    assert os.listdir(str(tmpdir)) == ['new']
+
+
+def test_keeps_mode(write_file):
+    path = write_file('old', 'old')
+    os.chmod(path, 0640)
+    with atomic_write(path) as f:
+        f.write('new')
+    assert open(path).read() == 'new'
+    assert _mode(path) == file_mode(path) == 0640
+
+
+def test_error_leaves_file(tmpdir, write_file):
+    path = write_file('old', 'old')
+    with pytest.raises(ZeroDivisionError):
+        with atomic_write(path) as f:
+            f.write('new')
+            1 / 0
+    assert open(path).read() == 'old'
+    assert os.listdir(str(tmpdir)) == ['old']
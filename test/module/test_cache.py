@@ -0,0 +1,146 @@
+import os
+import stat
+import time
+import pypd
+from pypd import pypd_patchfiles
+from pypd.pypd_cache import ParseCache, CACHE_DIR_KEY, CACHE_MAX_BYTES_KEY
+
+
+CANVAS = '#N canvas 0 0 450 300 10;\n'
+
+
+def _touch_later(path):
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+
+
+def test_get_put(tmpdir, write_file):
+    cache = ParseCache(str(tmpdir.join('cache')))
+    path = write_file('a.pd', CANVAS)
+
+    key = cache.key(path)
+    assert cache.get(path, key) is None
+    assert cache.put(path, (('osc~',), None), key)
+    assert cache.get(path) == (('osc~',), None)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A new instance sees the same entries
+    assert ParseCache(cache.directory).get(path) == (('osc~',), None)
+
+
+def test_entry_mode(tmpdir, write_file):
+    cache = ParseCache(str(tmpdir.join('cache')))
+    path = write_file('a.pd', CANVAS)
+    old_umask = os.umask(022)
+    try:
+        cache.put(path, ((), None), cache.key(path))
+    finally:
+        os.umask(old_umask)
+    # Not the owner only mode of a temporary file
+    names = os.listdir(cache.directory)
+    assert len(names) == 1
+    st = os.stat(os.path.join(cache.directory, names[0]))
+    assert stat.S_IMODE(st.st_mode) == 0644
+
+
+def test_changed_file(tmpdir, write_file):
+    cache = ParseCache(str(tmpdir.join('cache')))
+    path = write_file('a.pd', CANVAS)
+    cache.put(path, ((), None), cache.key(path))
+
+    _touch_later(path)
+    assert cache.get(path) is None
+
+    cache.put(path, ((), None), cache.key(path))
+    write_file(path, CANVAS + '#X obj 10 10 osc~;\n')
+    assert cache.get(path) is None
+
+
+def test_changed_file_since_key(tmpdir, write_file):
+    cache = ParseCache(str(tmpdir.join('cache')))
+    path = write_file('a.pd', CANVAS)
+    key = cache.key(path)
+    write_file(path, CANVAS + CANVAS)
+    assert not cache.put(path, ((), None), key)
+
+
+def test_hash(tmpdir, write_file):
+    cache = ParseCache(str(tmpdir.join('cache')), use_hash=True)
+    path = write_file('a.pd', CANVAS)
+    cache.put(path, ((), None), cache.key(path))
+
+    # Same contents, new mtime
+    _touch_later(path)
+    assert cache.get(path) == ((), None)
+
+
+def test_evict(tmpdir, write_file):
+    cache = ParseCache(str(tmpdir.join('cache')), max_bytes=1000)
+    paths = [write_file('%d.pd' % i, CANVAS) for i in range(20)]
+    for i, path in enumerate(paths):
+        cache.put(path, (('x' * 100,), None), cache.key(path))
+        # Make sure each entry has a distinct access time
+        entry = cache._entry_path(path)
+        os.utime(entry, (time.time() - 100 + i, time.time() - 100 + i))
+
+    assert cache._entries_size() <= 1000
+    assert cache.get(paths[-1]) is not None
+    assert cache.get(paths[0]) is None
+
+
+def test_from_config(tmpdir):
+    cfg = pypd.Config(str(tmpdir.join('pypd.cfg')))
+    assert ParseCache.from_config(cfg) is None
+
+    cfg[CACHE_DIR_KEY] = str(tmpdir.join('cache'))
+    cfg[CACHE_MAX_BYTES_KEY] = '2048'
+    cache = ParseCache.from_config(cfg)
+    assert cache.directory == cfg[CACHE_DIR_KEY]
+    assert cache.max_bytes == 2048 and not cache.use_hash
+
+
+def test_patch_files(tmpdir, write_file):
+    root = tmpdir.mkdir('patches')
+    for i in range(4):
+        write_file('patches/%d.pd' % i, CANVAS + '#X obj 1 1 osc~;\n')
+    cache = ParseCache(str(tmpdir.join('cache')))
+
+    pf = pypd.PatchFiles([str(root)], processes=1, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 4)
+
+    write_file('patches/0.pd', CANVAS + '#X obj 1 1 dac~;\n')
+    _touch_later(str(root.join('0.pd')))
+    pf2 = pypd.PatchFiles([str(root)], processes=1, cache=cache)
+    assert (cache.hits, cache.misses) == (3, 5)
+    assert pf2.uses[str(root.join('0.pd'))] == ('dac~',)
+    assert pf2.uses[str(root.join('1.pd'))] == pf.uses[str(root.join('1.pd'))]
+
+
+def test_removed_file(tmpdir, write_file):
+    cache = ParseCache(str(tmpdir.join('cache')), use_hash=True)
+    path = write_file('a.pd', CANVAS)
+    key = cache.key(path)
+    cache.put(path, ((), None), key)
+    os.unlink(path)
+    assert not cache.put(path, ((), None), key)
+    assert cache.get(path, (key[0] + 10, key[1])) is None
+
+
+def test_patch_files_removed(tmpdir, monkeypatch, write_file):
+    root = tmpdir.mkdir('patches')
+    for i in range(2):
+        write_file('patches/%d.pd' % i, CANVAS + '#X obj 1 1 osc~;\n')
+    gone = str(root.join('gone.pd'))
+    # A file removed between being found and being scanned
+    find_files = pypd_patchfiles.find_files
+    monkeypatch.setattr(pypd_patchfiles, 'find_files',
+                        lambda roots: find_files(roots) + [gone])
+    cache = ParseCache(str(tmpdir.join('cache')))
+
+    pf = pypd.PatchFiles([str(root)], processes=1, cache=cache)
+    assert sorted(pf.uses) == [str(root.join('0.pd')), str(root.join('1.pd'))]
+    assert gone in pf.errors
+
+    pf.update(gone)
+    assert gone in pf.errors and gone not in pf.uses
+    assert cache.get(str(root.join('0.pd'))) == (('osc~',), None)
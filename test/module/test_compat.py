@@ -0,0 +1,129 @@
+import os
+import pypd
+from pypd import pypd_compat, pypd_patch
+from pypd.pypd_compat import VANILLA, EXTENDED, UNKNOWN
+import testutils
+
+
+EXTENDED_TEXT = """
+[objects]
+comment         text
+mtof_tuning
+osc~            freq
+
+[aliases]
+comment         cmt
+"""
+
+# Relative path of each patch file and the objects it uses
+PATCHES = {
+    'vanilla.pd':       ['osc~', 'f', 'dac~'],
+    'extended.pd':      ['osc~', 'cyclone/comment', 'mtof_tuning', 'cmt'],
+    'unknown.pd':       ['osc~', 'nosuchobject'],
+    'uses_abs.pd':      ['shared', 'abs/shared', 'vanilla'],
+    'uses_both.pd':     ['shared', 'extended', 'unknown'],
+    'abs/shared.pd':    ['extended', 'osc~'],
+    'loop1.pd':         ['loop2'],
+    'loop2.pd':         ['loop1', 'vanilla'],
+}
+
+
+def pytest_funcarg__library(request):
+    write_file = request.getfuncargvalue('write_file')
+    for relpath, names in PATCHES.items():
+        write_file(os.path.join('lib', relpath),
+                   testutils.patch_text(names))
+    root = os.path.join(str(request.getfuncargvalue('tmpdir')), 'lib')
+    extended = write_file('extended.txt', EXTENDED_TEXT)
+    files = pypd.PatchFiles([root], processes=1)
+    classifier = pypd_compat.Classifier([extended], files.resolve)
+    return root, classifier
+
+
+def _path(root, relpath):
+    return os.path.join(root, relpath)
+
+
+def test_sets(library):
+    _, classifier = library
+    assert isinstance(classifier.vanilla, frozenset)
+    assert 'osc~' in classifier.vanilla and 'f' in classifier.vanilla
+    assert classifier.extended == frozenset(['comment', 'cmt',
+                                             'mtof_tuning'])
+
+
+def test_vanilla(library):
+    root, classifier = library
+    result = classifier.classify_file(_path(root, 'vanilla.pd'))
+    assert (result.level, result.name, result.offending) == \
+           (VANILLA, 'vanilla', ())
+
+
+def test_extended(library):
+    root, classifier = library
+    path = _path(root, 'extended.pd')
+    result = classifier.classify_file(path)
+    assert result.level == EXTENDED
+    assert result.offending == ((path, 3, 'cyclone/comment', EXTENDED),
+                                (path, 4, 'mtof_tuning', EXTENDED),
+                                (path, 5, 'cmt', EXTENDED))
+
+
+def test_unknown(library):
+    root, classifier = library
+    path = _path(root, 'unknown.pd')
+    assert classifier.classify_file(path).offending == \
+           ((path, 3, 'nosuchobject', UNKNOWN),)
+
+
+def test_abstractions(library):
+    root, classifier = library
+    result = classifier.classify_file(_path(root, 'uses_abs.pd'))
+    assert result.level == EXTENDED
+    # Used twice, reported once
+    assert [o[0] for o in result.offending] == \
+           [_path(root, 'extended.pd')] * 3
+
+    result = classifier.classify_file(_path(root, 'uses_both.pd'))
+    assert result.level == UNKNOWN
+    assert len(result.offending) == 4
+
+
+def test_memoised(library):
+    root, classifier = library
+    shared = _path(root, 'abs/shared.pd')
+    classifier.classify_file(_path(root, 'uses_abs.pd'))
+    result = classifier.classify_file(shared)
+    os.unlink(shared)
+    assert classifier.classify_file(shared) is result
+    assert classifier.classify_file(_path(root, 'uses_both.pd')).level == \
+           UNKNOWN
+
+    # Forgetting shared also forgets the patches using it
+    classifier.forget(shared)
+    result = classifier.classify_file(_path(root, 'uses_abs.pd'))
+    assert result.level == UNKNOWN
+    assert (shared, 0) in [o[:2] for o in result.offending]
+
+
+def test_recursive(library):
+    root, classifier = library
+    result = classifier.classify_file(_path(root, 'loop1.pd'))
+    assert result.level == UNKNOWN
+    assert [o[2:] for o in result.offending] == [('loop1', UNKNOWN)]
+    assert classifier.classify_file(_path(root, 'loop2.pd')).level == \
+           UNKNOWN
+
+
+def test_classify_tree(library):
+    root, classifier = library
+    path = _path(root, 'uses_both.pd')
+    with open(path) as f:
+        tree = pypd_patch.parse(f)
+    assert classifier.classify_tree(tree, path).offending == \
+           classifier.classify_file(path).offending
+
+    # Without resolve() abstractions are unknown objects
+    result = pypd_compat.Classifier().classify_tree(tree)
+    assert [o[2] for o in result.offending] == \
+           ['shared', 'extended', 'unknown']
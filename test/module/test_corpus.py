@@ -0,0 +1,116 @@
+import os
+import stat
+import multiprocessing
+import pytest
+from pypd import pypd_corpus
+from pypd.pypd_atomic import default_mode
+
+
+PATCH_TEXT = """#N canvas 0 0 450 300 10;
+#X obj 30 27 osc~ %d;
+#X obj 30 60 dac~;
+#N canvas 0 0 450 300 sub 0;
+#X obj 10 10 inlet;
+#X restore 30 90 pd sub;
+#X connect 0 0 1 0;
+"""
+
+
+def _text(tree):
+    return ''.join(['%s;\n' % node.value for node, _ in tree])
+
+
+def pytest_funcarg__patches(request):
+    write_file = request.getfuncargvalue('write_file')
+    return [write_file('patch%d.pd' % i, PATCH_TEXT % i) for i in range(20)]
+
+
+def pytest_funcarg__corpus_path(request):
+    patches = request.getfuncargvalue('patches')
+    path = os.path.join(os.path.dirname(patches[0]), 'test.corpus')
+    assert pypd_corpus.build(path, patches) == {}
+    return path
+
+
+def test_corpus_access(patches, corpus_path):
+    with pypd_corpus.Corpus(corpus_path) as corpus:
+        assert len(corpus) == len(patches)
+        assert sorted(corpus.paths()) == sorted(patches)
+        for i in (7, 0, 19, 7):
+            assert _text(corpus.tree(patches[i])) == PATCH_TEXT % i
+        assert _text(corpus[patches[3]]) == PATCH_TEXT % 3
+        assert corpus[patches[3]][2][0].value.line_num == 5
+
+
+def test_corpus_missing(corpus_path):
+    with pypd_corpus.Corpus(corpus_path) as corpus:
+        assert 'nosuch.pd' not in corpus
+        assert corpus.get('nosuch.pd') is None
+        with pytest.raises(KeyError):
+            corpus.tree('nosuch.pd')
+
+
+def test_corpus_closed(patches, corpus_path):
+    corpus = pypd_corpus.Corpus(corpus_path)
+    corpus.close()
+    with pytest.raises(ValueError) as exinfo:
+        corpus.tree(patches[0])
+    assert str(exinfo.value) == 'Corpus is closed'
+
+
+def test_corpus_mode(patches, corpus_path):
+    # Not the owner only permissions of the temporary file
+    assert stat.S_IMODE(os.stat(corpus_path).st_mode) == default_mode()
+    os.chmod(corpus_path, 0640)
+    pypd_corpus.build(corpus_path, patches[:1])
+    assert stat.S_IMODE(os.stat(corpus_path).st_mode) == 0640
+
+
+def test_corpus_errors(patches, tmpdir, write_file):
+    bad = write_file('bad.pd', '#N canvas 0 0 450 300 10;\n'
+                               '#X nosuchelement 1;\n')
+    path = os.path.join(str(tmpdir), 'errors.corpus')
+    errors = pypd_corpus.build(path, [bad, patches[0], 'nosuch.pd'])
+    assert sorted(errors.keys()) == sorted([bad, 'nosuch.pd'])
+    with pypd_corpus.Corpus(path) as corpus:
+        assert corpus.paths() == [patches[0]]
+
+
+def test_writer_abort(patches, tmpdir):
+    path = os.path.join(str(tmpdir), 'abort.corpus')
+    with pytest.raises(ZeroDivisionError):
+        with pypd_corpus.CorpusWriter(path) as writer:
+            writer.add_file(patches[0])
+            1 / 0
+    assert sorted(os.listdir(str(tmpdir))) == \
+           sorted([os.path.basename(p) for p in patches])
+
+
+@pytest.mark.parametrize('data', ['', 'not a corpus file',
+                                  pypd_corpus.MAGIC + '\0' * 16])
+def test_corpus_invalid(data, write_file):
+    path = write_file('invalid.corpus', data)
+    with pytest.raises(ValueError):
+        pypd_corpus.Corpus(path)
+
+
+# The corpus opened by the parent process, inherited by the workers
+_corpus = None
+
+
+def _text_in_worker(patch_path):
+    return _text(_corpus.tree(patch_path))
+
+
+def test_corpus_shared(patches, corpus_path):
+    global _corpus
+    _corpus = pypd_corpus.Corpus(corpus_path)
+    pool = multiprocessing.Pool(2)
+    try:
+        texts = pool.map(_text_in_worker, patches)
+    finally:
+        pool.close()
+        pool.join()
+        _corpus.close()
+        _corpus = None
+    assert texts == [PATCH_TEXT % i for i in range(len(patches))]
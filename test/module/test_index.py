@@ -0,0 +1,98 @@
+import os
+import pytest
+import pypd
+from pypd.pypd_index import NameIndex
+
+
+MAIN = """#N canvas 0 0 450 300 10;
+#X obj 10 10 freeverb~ 0.5;
+#X obj 10 40 s tempo;
+#N canvas 0 0 450 300 sub 0;
+#X obj 10 10 extra/freeverb~;
+#X floatatom 10 40 5 0 0 0 - tempo level;
+#X restore 10 70 pd sub;
+#X obj 10 100 receive level;
+"""
+
+OTHER = """#N canvas 0 0 450 300 10;
+#X obj 10 10 freeverb~;
+#X obj 10 40 r tempo;
+"""
+
+
+def pytest_funcarg__index_paths(request):
+    write_file = request.getfuncargvalue('write_file')
+    main = write_file('main.pd', MAIN)
+    other = write_file('other.pd', OTHER)
+    index = NameIndex()
+    index.add_file(main)
+    index.add_file(other)
+    return index, main, other
+
+
+def test_uses(index_paths):
+    index, main, other = index_paths
+    assert index.uses('freeverb~') == {main: [2, 5], other: [2]}
+    assert index.uses('extra/freeverb~') == {main: [5]}
+    assert index.uses('osc~') == {}
+
+
+def test_symbols(index_paths):
+    index, main, other = index_paths
+    assert index.senders('tempo') == {main: [3]}
+    assert index.receivers('tempo') == {main: [6], other: [3]}
+    assert index.senders('level') == {main: [6]}
+    assert index.receivers('level') == {main: [8]}
+    assert index.senders('-') == {}
+
+
+def test_update(index_paths, write_file):
+    index, main, other = index_paths
+    write_file(other, OTHER.replace('freeverb~', 'osc~'))
+    index.update(other)
+    assert index.uses('freeverb~') == {main: [2, 5]}
+    assert index.uses('osc~') == {other: [2]}
+    assert len(index) == 2
+
+
+def test_remove(index_paths):
+    index, main, other = index_paths
+    assert index.remove(main)
+    assert not index.remove(main)
+    assert index.uses('freeverb~') == {other: [2]}
+    assert index.senders('tempo') == {}
+    assert sorted(index._names.keys()) == ['freeverb~', 'r']
+
+
+def test_add_tree(index_paths):
+    index, main, other = index_paths
+    tree_index = NameIndex()
+    tree_index.add_tree(main, pypd.Patch(main).tree)
+    tree_index.add_file(other)
+    assert tree_index._names == index._names
+    assert tree_index._symbols == index._symbols
+
+
+def test_nodes(index_paths):
+    index, main, other = index_paths
+    tree = pypd.Patch(main).tree
+    nodes = NameIndex.nodes(tree, index.uses('freeverb~')[main])
+    assert [node.value.name for node in nodes] == \
+           ['freeverb~', 'extra/freeverb~']
+
+
+def test_save_load(index_paths, tmpdir):
+    index, main, other = index_paths
+    path = os.path.join(str(tmpdir), 'index.bin')
+    index.save(path)
+    loaded = NameIndex.load(path)
+    assert loaded.uses('freeverb~') == index.uses('freeverb~')
+    assert loaded.receivers('tempo') == index.receivers('tempo')
+    assert loaded.remove(main)
+    assert loaded.uses('freeverb~') == {other: [2]}
+
+
+def test_load_invalid(write_file):
+    path = write_file('bad.bin', 'not an index')
+    with pytest.raises(ValueError):
+        NameIndex.load(path)
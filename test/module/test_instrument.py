@@ -0,0 +1,126 @@
+import os
+import json
+import pypd
+from pypd import pypd_instrument, pypd_known_reader, pypd_class_attrs
+from pypd.pypd_patch import parse
+from pypd.pypd_cache import ParseCache
+
+
+PATCH_TEXT = """#N canvas 0 0 450 300 10;
+#X obj 30 27 osc~ 440;
+#X obj 30 60 lib/voice;
+#N canvas 0 0 450 300 sub 0;
+#X obj 10 10 inlet;
+#X restore 30 90 pd sub;
+#X connect 0 0 1 0;
+"""
+
+VOICE_TEXT = '#N canvas 0 0 450 300 10;\n#X obj 10 10 outlet~;\n'
+
+
+def pytest_funcarg__instrument(request):
+    """Start recording with nothing recorded, stop after the test."""
+    pypd_instrument.reset()
+    pypd_instrument.enable(trace=True)
+    request.addfinalizer(pypd_instrument.reset)
+    request.addfinalizer(pypd_instrument.disable)
+    return pypd_instrument
+
+
+def pytest_funcarg__library(request):
+    write_file = request.getfuncargvalue('write_file')
+    write_file('lib/voice.pd', VOICE_TEXT)
+    main = write_file('main.pd', PATCH_TEXT)
+    return os.path.dirname(main), main
+
+
+def test_disabled(library):
+    pypd_instrument.reset()
+    pypd.Patch(library[1])
+    assert pypd_instrument.summary() == dict(phases={}, counters={})
+    assert pypd_instrument.trace_events() == []
+
+
+def test_patch_phases(instrument, library):
+    pypd.Patch(library[1])
+    phases = instrument.summary()['phases']
+    assert sorted(phases) == [instrument.FACTORY, instrument.PATCH,
+                              instrument.READ, instrument.TOKENIZE,
+                              instrument.BUILD]
+    assert phases[instrument.FACTORY]['calls'] == 7
+    # One call for each line and one at the end of the file
+    assert phases[instrument.READ]['calls'] == 8
+    assert phases[instrument.PATCH]['calls'] == 1
+    assert all([totals['seconds'] >= 0 for totals in phases.values()])
+
+    events = instrument.trace_events()
+    assert [event['name'] for event in events] == \
+           [instrument.BUILD, instrument.PATCH]
+    assert events[1]['args'] == dict(path=library[1])
+    assert events[1]['ph'] == 'X'
+    assert events[0]['ts'] >= events[1]['ts']
+
+
+def test_self_time(instrument):
+    parse(PATCH_TEXT.splitlines(True))
+    phases = instrument.summary()['phases']
+    build = instrument.trace_events()[0]
+    # The nested phases aren't counted twice
+    total = sum([totals['seconds'] for totals in phases.values()])
+    assert total <= build['dur'] / 1e6 + 1e-6
+
+
+def test_reparse(instrument, library, write_file):
+    patch = pypd.Patch(library[1])
+    instrument.reset()
+    write_file('main.pd', PATCH_TEXT.replace('osc~', 'phasor~'))
+    patch.reload()
+    phases = instrument.summary()['phases']
+    # Only the changed top level canvas is rebuilt
+    assert phases[instrument.FACTORY]['calls'] == 4
+    assert phases[instrument.BUILD]['calls'] == 1
+
+
+def test_scan_and_resolve(instrument, library):
+    root = library[0]
+    cache = ParseCache(os.path.join(root, 'cache'))
+    pypd.PatchFiles([root], processes=1, cache=cache)
+    files = pypd.PatchFiles([root], processes=1, cache=cache)
+    assert files.resolve('lib/voice') == [os.path.join(root, 'lib/voice.pd')]
+
+    data = instrument.summary()
+    assert data['counters'] == {instrument.CACHE_MISS: 2,
+                                instrument.CACHE_HIT: 2}
+    assert data['phases'][instrument.SCAN]['calls'] == 2
+    assert data['phases'][instrument.RESOLVE]['calls'] >= 1
+    resolves = [event for event in instrument.trace_events() \
+                if event['name'] == instrument.RESOLVE]
+    assert resolves[-1]['args'] == dict(name='lib/voice')
+
+
+def test_known_reader(instrument):
+    pypd_known_reader.clear_cache()
+    pypd_known_reader.read(pypd_class_attrs.KNOWN_PATH)
+    pypd_known_reader.read(pypd_class_attrs.KNOWN_PATH)
+    assert instrument.summary()['counters'] == {instrument.KNOWN_MISS: 1,
+                                                instrument.KNOWN_HIT: 1}
+
+
+def test_format_summary(instrument, library):
+    pypd.Patch(library[1])
+    instrument.count(instrument.CACHE_HIT, 3)
+    lines = instrument.format_summary().splitlines()
+    assert lines[0].split() == ['phase', 'seconds', '%', 'calls']
+    assert len(lines) == 1 + 5 + 3
+    assert lines[-1].split() == [instrument.CACHE_HIT, '3']
+
+
+def test_write_trace(instrument, library, tmpdir):
+    pypd.Patch(library[1])
+    path = str(tmpdir.join('trace.json'))
+    instrument.write_trace(path)
+    with open(path) as f:
+        data = json.load(f)
+    assert len(data['traceEvents']) == 2
+    assert set(data['traceEvents'][0]) >= set(['name', 'ph', 'ts', 'dur',
+                                               'pid', 'tid'])
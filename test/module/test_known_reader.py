@@ -46,3 +46,33 @@ def test_parse(known_parse_args):
 
     for section, keyvals in expected.items():
         assert results and results[section] == keyvals
+
+
+def test_read_cached(known_parse_args, write_file):
+    path, expected = known_parse_args
+    results = pypd.pypd_known_reader.read(path)
+    assert pypd.pypd_known_reader.read(path) is results
+
+    # Rewriting the file is noticed
+    write_file(path, '[objects]\nclip~ lower\n')
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+    results = pypd.pypd_known_reader.read(path)
+    assert results == {'objects': {'clip~': ['lower']}}
+    assert pypd.pypd_known_reader.read(path) is results
+
+
+def test_read_layered(write_file):
+    base = write_file('base.txt', '[objects]\nvslider width\nfoo a, b\n\n'
+                                  '[aliases]\nvslider vsl, vs\n')
+    site = write_file('site.txt',
+                      '[objects]\nfoo c\nbar\n\n[aliases]\nbar vs\n')
+
+    read_layered = pypd.pypd_known_reader.read_layered
+    merged = read_layered([base, site])
+    assert merged['objects'] == {'vslider': ['width'], 'foo': ['c'],
+                                 'bar': []}
+    # The alias "vs" moves from vslider to bar
+    assert merged['aliases'] == {'vslider': ['vsl'], 'bar': ['vs']}
+    assert read_layered([base, site]) is merged
+    assert read_layered([site, base]) is not merged
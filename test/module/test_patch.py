@@ -0,0 +1,89 @@
+import pytest
+import pypd
+
+
+PATCH_TEXT = """#N canvas 0 0 450 300 10;
+#X obj 30 27 osc~ 440;
+#X obj 30 60 dac~;
+#N canvas 0 0 450 300 sub 0;
+#X obj 10 10 inlet;
+#N canvas 0 0 450 300 subsub 0;
+#X text 10 10 nested \\, subpatch;
+#X restore 10 40 pd subsub;
+#X restore 30 90 pd sub;
+#X obj 30 120 cyclone/comment;
+#X connect 0 0 1 0;
+#X connect 0 0 1 1;
+"""
+
+
+def test_patch_round_trip(write_file):
+    patch = pypd.Patch(write_file('test.pd', PATCH_TEXT))
+    assert str(patch) == PATCH_TEXT
+
+
+def test_patch_structs_round_trip(write_file):
+    text = '#N struct point float x float y;\n' \
+           '#N struct label symbol text;\n' + PATCH_TEXT
+    patch = pypd.Patch(write_file('test.pd', text))
+    assert [obj.line_num for obj in patch] == range(1, 15)
+    assert str(patch) == text
+    assert patch.graph().connections().next() == (0, 0, 1, 0)
+
+
+def test_patch_iter(write_file):
+    patch = pypd.Patch(write_file('test.pd', PATCH_TEXT))
+    names = [obj.name for obj in patch if obj.element == 'obj']
+    assert names == ['osc~', 'dac~', 'inlet', 'cyclone/comment']
+
+
+def test_patch_nesting(write_file):
+    patch = pypd.Patch(write_file('test.pd', PATCH_TEXT))
+    sub = patch.tree[2]
+    assert sub.value.canvas_name == 'sub'
+    assert sub[1].value.canvas_name == 'subsub'
+    assert sub[-1].value.element == 'restore'
+    assert sub.parent is patch.tree
+
+
+def test_patch_wrapped_lines(write_file):
+    text = PATCH_TEXT.replace('#X obj 30 27 osc~ 440;',
+                              '#X obj 30 27\nosc~\n440;')
+    patch = pypd.Patch(write_file('test.pd', text))
+    assert str(patch) == PATCH_TEXT
+    assert [obj.line_num for obj in patch][:3] == [1, 2, 5]
+
+
+def test_patch_unclosed(write_file):
+    text = PATCH_TEXT.replace('#X restore 30 90 pd sub;\n', '')
+    path = write_file('test.pd', text)
+    with pytest.raises(pypd.InvalidPatch) as exinfo:
+        pypd.Patch(path)
+    assert path in str(exinfo.value)
+
+
+def test_patch_reload(write_file):
+    path = write_file('test.pd', PATCH_TEXT)
+    patch = pypd.Patch(path)
+    sub = patch.tree[2]
+    write_file('test.pd', PATCH_TEXT.replace('dac~', 'dac~ 1 2'))
+    patch.reload()
+    assert str(patch) == PATCH_TEXT.replace('dac~', 'dac~ 1 2')
+    assert patch.tree[2] is sub
+
+
+def test_patch_graph(write_file):
+    path = write_file('test.pd', PATCH_TEXT)
+    patch = pypd.Patch(path)
+    graph = patch.graph()
+    assert list(graph.connections()) == [(0, 0, 1, 0), (0, 0, 1, 1)]
+    assert graph.nodes[2] is patch.tree[2]
+    assert patch.graph() is graph
+    sub_graph = patch.graph(patch.tree[2])
+    assert len(sub_graph) == 2
+
+    # Only the changed canvases' graphs are rebuilt
+    write_file('test.pd', PATCH_TEXT.replace('dac~', 'dac~ 1 2'))
+    patch.reload()
+    assert patch.graph() is not graph
+    assert patch.graph(patch.tree[2]) is sub_graph
@@ -0,0 +1,103 @@
+import os
+import pypd
+import testutils
+
+
+# Relative path of each patch file and the objects it uses
+PATCHES = {
+    'main.pd':              ['osc~', 'mapping/curve', 'local', 'missing'],
+    'local.pd':             ['dac~', 'curve'],
+    'extra/mapping/curve.pd': ['line~'],
+    'other/curve.pd':       [],
+    'other/bad.pd':         None,
+}
+
+
+def _make_patches(write_file):
+    for relpath, names in PATCHES.items():
+        if names is None:
+            write_file(relpath, '#X obj 10 10 osc~;\n')
+        else:
+            write_file(relpath, testutils.patch_text(names))
+    write_file('notes.txt', '')
+
+
+@testutils.parametrize([1, 2])
+def pytest_funcarg__patch_files(request):
+    root = str(request.getfuncargvalue('tmpdir'))
+    _make_patches(request.getfuncargvalue('write_file'))
+    return root, pypd.PatchFiles([root], processes=request.param)
+
+
+def test_paths(patch_files):
+    root, pf = patch_files
+    assert pf.paths == sorted([os.path.join(root, p) for p in PATCHES])
+
+
+def test_errors(patch_files):
+    root, pf = patch_files
+    assert pf.errors.keys() == [os.path.join(root, 'other/bad.pd')]
+
+
+def test_uses(patch_files):
+    root, pf = patch_files
+    assert sorted(pf.uses[os.path.join(root, 'main.pd')]) == \
+           sorted(PATCHES['main.pd'])
+
+
+def test_resolve(patch_files):
+    root, pf = patch_files
+    curve = os.path.join(root, 'extra/mapping/curve.pd')
+    other = os.path.join(root, 'other/curve.pd')
+    assert pf.resolve('mapping/curve') == [curve]
+    assert sorted(pf.resolve('curve')) == sorted([curve, other])
+    assert pf.resolve('curve', os.path.join(root, 'other/x.pd')) == \
+           [other, curve]
+    assert pf.resolve('osc~') == []
+
+
+def test_graph(patch_files):
+    root, pf = patch_files
+    join = lambda p: os.path.join(root, p)
+    graph = pf.graph()
+    assert graph[join('main.pd')] == set([join('extra/mapping/curve.pd'),
+                                          join('local.pd')])
+    assert graph[join('local.pd')] == set([join('extra/mapping/curve.pd'),
+                                           join('other/curve.pd')])
+    assert graph[join('other/curve.pd')] == set()
+
+
+def test_dependents(patch_files):
+    root, pf = patch_files
+    join = lambda p: os.path.join(root, p)
+    assert pf.dependents(join('extra/mapping/curve.pd')) == \
+           [join('local.pd'), join('main.pd')]
+    assert pf.dependents(join('other/curve.pd')) == [join('local.pd')]
+    assert pf.dependents(join('main.pd')) == []
+
+
+def test_update(patch_files, write_file):
+    root, pf = patch_files
+    join = lambda p: os.path.join(root, p)
+    write_file('new.pd', testutils.patch_text(['local']))
+    write_file('local.pd', testutils.patch_text(['dac~']))
+    pf.update(join('new.pd'))
+    pf.update(join('local.pd'))
+
+    assert join('new.pd') in pf.paths and pf.paths == sorted(pf.paths)
+    assert pf.dependents(join('local.pd')) == [join('main.pd'),
+                                               join('new.pd')]
+    assert pf.dependents(join('other/curve.pd')) == []
+    assert pf.resolve('new') == [join('new.pd')]
+
+
+def test_remove(patch_files):
+    root, pf = patch_files
+    join = lambda p: os.path.join(root, p)
+    assert pf.remove(join('local.pd'))
+    assert not pf.remove(join('local.pd'))
+    assert join('local.pd') not in pf.paths
+    assert pf.resolve('local') == []
+    assert pf.graph()[join('main.pd')] == \
+           set([join('extra/mapping/curve.pd')])
+    assert pf.dependents(join('other/curve.pd')) == []
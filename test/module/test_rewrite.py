@@ -0,0 +1,115 @@
+import os
+import stat
+import pytest
+from pypd import InvalidPatch
+from pypd.pypd_patchfiles import find_files
+from pypd.pypd_rewrite import Rewriter, Edit, RenameObjects, \
+                              RepointDeclares
+import testutils
+
+
+PATCH_TEXT = """#N canvas 0 0 450 300 10;
+#X declare -path ../old -lib zexy;
+#X obj 30 27 cyclone/speedlim 100;
+#X obj 30 60 declare -path ../old -stdpath extra;
+#N canvas 0 0 450 300 sub 0;
+#X obj 10 10 cyclone/speedlim;
+#X text 10 40 cyclone/speedlim \\, comment;
+#X restore 30 90 pd sub;
+#X connect 0 0 1 0;
+"""
+
+EXPECTED = PATCH_TEXT.replace('cyclone/speedlim 100', 'speedlimit 100') \
+                     .replace('10 cyclone/speedlim', '10 speedlimit') \
+                     .replace('../old', '../new')
+
+EDITS = [RenameObjects({'cyclone/speedlim': 'speedlimit'}),
+         RepointDeclares({'../old': '../new'})]
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_rewrite_lines():
+    text, changed = Rewriter(EDITS).rewrite_lines(
+                        PATCH_TEXT.splitlines(True))
+    assert text == EXPECTED
+    assert changed == 4
+
+
+def test_rewrite_lines_unchanged():
+    rewriter = Rewriter([RenameObjects({'osc~': 'phasor~'})])
+    assert rewriter.rewrite_lines(PATCH_TEXT.splitlines(True)) == (None, 0)
+
+
+def test_rewrite_edits_in_order():
+    rewriter = Rewriter([RenameObjects({'cyclone/speedlim': 'a'}),
+                         RenameObjects({'a': 'b'})])
+    text, _ = rewriter.rewrite_lines(PATCH_TEXT.splitlines(True))
+    assert text == PATCH_TEXT.replace('cyclone/speedlim 100', 'b 100') \
+                             .replace('10 cyclone/speedlim', '10 b')
+
+
+def test_rewrite_custom_edit():
+    class Move(Edit):
+        elements = ('obj',)
+
+        def apply(self, obj):
+            return obj.factory(obj.line_num, obj.chunk, obj.element,
+                               [str(int(obj.x) + 5)] + list(obj.params[1:]))
+
+    text, changed = Rewriter([Move()]).rewrite_lines(
+                        PATCH_TEXT.splitlines(True))
+    assert changed == 3
+    assert '#X obj 35 27 cyclone/speedlim 100;' in text
+
+
+def test_rewrite_file(tmpdir, write_file):
+    path = write_file('test.pd', PATCH_TEXT)
+    os.chmod(path, 0640)
+    rewriter = Rewriter(EDITS)
+    assert rewriter.rewrite_file(path, dry_run=True) == 4
+    assert _read(path) == PATCH_TEXT
+
+    assert rewriter.rewrite_file(path) == 4
+    assert _read(path) == EXPECTED
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0640
+    assert os.listdir(str(tmpdir)) == ['test.pd']
+
+
+def test_rewrite_file_unchanged(write_file):
+    # A file that isn't changed isn't written, so its wrapped lines are kept
+    text = PATCH_TEXT.replace('cyclone/speedlim 100', 'f\n100')
+    path = write_file('test.pd', text)
+    assert Rewriter([RenameObjects({'osc~': 'phasor~'})]) \
+           .rewrite_file(path) == 0
+    assert _read(path) == text
+    assert Rewriter(EDITS[:1]).rewrite_file(path) == 1
+    assert _read(path) == text.replace('f\n100', 'f 100') \
+                              .replace('10 cyclone/speedlim', '10 speedlimit')
+
+
+def test_rewrite_file_invalid(write_file):
+    text = PATCH_TEXT.replace('#X restore 30 90 pd sub;\n', '')
+    path = write_file('test.pd', text)
+    with pytest.raises(InvalidPatch):
+        Rewriter(EDITS).rewrite_file(path)
+    assert _read(path) == text
+
+
+@testutils.parametrize([1, 2])
+def pytest_funcarg__processes(request):
+    return request.param
+
+
+def test_rewrite_files(tmpdir, write_file, processes):
+    paths = [write_file('p%d.pd' % i, PATCH_TEXT) for i in xrange(10)]
+    write_file('same.pd', '#N canvas 0 0 450 300 10;\n#X obj 1 1 f;\n')
+    bad = write_file('bad.pd', '#X obj 1 1 f;\n')
+    changed, errors = Rewriter(EDITS).rewrite_files(
+                          find_files([str(tmpdir)]), processes)
+    assert changed == dict([(path, 4) for path in paths])
+    assert errors.keys() == [bad]
+    assert all([_read(path) == EXPECTED for path in paths])
@@ -0,0 +1,110 @@
+import os
+import gc
+import pickle
+import pytest
+import pypd
+from pypd import pypd_patch, pypd_treefile
+
+
+PATCH_TEXT = """#N canvas 0 0 450 300 10;
+#X obj 30 27 osc~ 440;
+#X obj 30 60 dac~;
+#N canvas 0 0 450 300 sub 0;
+#X obj 10 10 inlet;
+#N canvas 0 0 450 300 subsub 0;
+#X text 10 10 nested \\, subpatch;
+#X restore 10 40 pd subsub;
+#X array table 4 float 0;
+#A 0 1 2 3 4;
+#X restore 30 90 pd sub;
+#X obj 30 120 cyclone/comment;
+#X obj 30 120 nosuchabs 1 2 3 4 5 6 7 8 9 10 11 12 13 14 15 16 17 18 19 20;
+#X connect 0 0 1 0;
+#X connect 0 0 1 1;
+"""
+
+
+def _nodes(tree):
+    return [(depth, len(node), node.value.line_num, node.value.chunk,
+             node.value.element, node.value.params,
+             node.value.ordered_attrs) for node, depth in tree]
+
+
+def pytest_funcarg__tree(request):
+    # Long lines give line numbers needing more than one varint byte
+    lines = PATCH_TEXT.replace('\n', '\n' * 100).splitlines(True)
+    return pypd_patch.parse(lines)
+
+
+def test_round_trip(tree):
+    loaded = pypd_treefile.loads(pypd_treefile.dumps(tree))
+    assert _nodes(loaded) == _nodes(tree)
+    assert loaded == tree
+    assert ''.join(['%s;\n' % node.value for node, _ in loaded]) == \
+           PATCH_TEXT
+    assert loaded[2][0].parent is loaded[2] and loaded[2].parent is loaded
+
+
+def test_round_trip_file(tree, tmpdir):
+    path = os.path.join(str(tmpdir), 'test.pdt')
+    with open(path, 'wb') as f:
+        pypd_treefile.dump(tree, f)
+    with open(path, 'rb') as f:
+        assert _nodes(pypd_treefile.load(f)) == _nodes(tree)
+
+
+def test_layouts_shared(tree):
+    loaded = pypd_treefile.loads(pypd_treefile.dumps(tree))
+    assert loaded[0].value._layout is tree[0].value._layout
+
+
+def test_no_value():
+    tree = pypd.Tree()
+    tree.add(None).add(None)
+    tree.add(None)
+    loaded = pypd_treefile.loads(pypd_treefile.dumps(tree))
+    assert loaded == tree
+
+
+def test_line_nums_any_order():
+    tree = pypd.Tree(pypd.Object.factory(1000, '#N', 'canvas',
+                                         ['0', '0', '450', '300', '10']))
+    for line_num in (5, 0, 300, 299, 70000, 2):
+        tree.add(pypd.Object.factory(line_num, '#X', 'obj',
+                                     ['1', '2', 'f']))
+    loaded = pypd_treefile.loads(pypd_treefile.dumps(tree))
+    assert _nodes(loaded) == _nodes(tree)
+
+
+def test_smaller_than_pickle(tree):
+    # Tree itself can't be pickled, its parent links are weakrefs
+    assert len(pypd_treefile.dumps(tree)) < \
+           len(pickle.dumps(tree.flatten(), pickle.HIGHEST_PROTOCOL)) / 2
+
+
+@pytest.mark.parametrize('data', ['', 'not a tree file',
+                                  pypd_treefile.MAGIC,
+                                  pypd_treefile.MAGIC + '\x80'])
+def test_invalid(data):
+    with pytest.raises(ValueError):
+        pypd_treefile.loads(data)
+
+
+def test_truncated(tree):
+    data = pypd_treefile.dumps(tree)
+    for end in (len(data) - 1, len(data) / 2, len(pypd_treefile.MAGIC) + 1):
+        with pytest.raises(ValueError):
+            pypd_treefile.loads(data[:end])
+
+
+def test_gc_state_kept(tree):
+    # Loading leaves the garbage collector as the caller set it
+    data = pypd_treefile.dumps(tree)
+    gc.disable()
+    try:
+        pypd_treefile.loads(data)
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+    pypd_treefile.loads(data)
+    assert gc.isenabled()
@@ -0,0 +1,231 @@
+import os
+import time
+import errno
+import socket
+import pytest
+import pypd
+from pypd import pypd_watcher
+from pypd.pypd_exceptions import PyPdException
+import testutils
+
+
+def pytest_funcarg__root(request):
+    write_file = request.getfuncargvalue('write_file')
+    write_file('lib/abs/curve.pd', testutils.patch_text(['line~']))
+    main = write_file('lib/main.pd', testutils.patch_text(['osc~', 'curve']))
+    return os.path.dirname(main)
+
+
+def _wait_for(fn, timeout=5.0):
+    """Call fn until it returns true or the timeout expires."""
+    end = time.time() + timeout
+    while not fn():
+        assert time.time() < end
+        time.sleep(0.01)
+
+
+def _collect(watcher, expected, timeout=5.0):
+    """Read events from watcher until all of expected have been seen."""
+    seen = set()
+    end = time.time() + timeout
+    while not expected <= seen and time.time() < end:
+        seen.update(watcher.read(0.1))
+    return seen
+
+
+def _make_changes(root, write_file):
+    join = lambda p: os.path.join(root, p)
+    write_file(join('main.pd'), testutils.patch_text(['osc~']))
+    write_file(join('new/other.pd'), testutils.patch_text([]))
+    os.unlink(join('abs/curve.pd'))
+    write_file(join('notes.txt'), '')
+    return set([(pypd_watcher.CHANGED, join('main.pd')),
+                (pypd_watcher.CHANGED, join('new/other.pd')),
+                (pypd_watcher.REMOVED, join('abs/curve.pd'))])
+
+
+def test_polling_watcher(root, write_file):
+    watcher = pypd_watcher.PollingWatcher([root], interval=0.01)
+    assert watcher.read(0.01) == []
+    expected = _make_changes(root, write_file)
+    assert set(watcher.read(0.01)) == expected
+    assert watcher.read(0.01) == []
+    watcher.close()
+
+
+def test_inotify_watcher(root, write_file):
+    try:
+        watcher = pypd_watcher.InotifyWatcher([root])
+    except OSError:
+        pytest.skip('inotify is not available')
+    try:
+        assert watcher.read(0.01) == []
+        expected = _make_changes(root, write_file)
+        seen = _collect(watcher, expected)
+        assert expected <= seen
+        assert [e for e in seen if e[1].endswith('.txt')] == []
+    finally:
+        watcher.close()
+
+
+def pytest_funcarg__daemon(request):
+    root = request.getfuncargvalue('root')
+    socket_path = os.path.join(os.path.dirname(root), 'watch.sock')
+    daemon = pypd_watcher.WatchDaemon(
+        [root], socket_path, processes=1,
+        watcher=pypd_watcher.PollingWatcher([root], interval=0.01))
+    daemon.start()
+    request.addfinalizer(daemon.stop)
+    return root, daemon
+
+
+def test_daemon_query(daemon):
+    root, daemon = daemon
+    query = lambda *args, **kw: \
+            pypd_watcher.query(daemon.socket_path, *args, **kw)
+    main, curve = os.path.join(root, 'main.pd'), \
+                  os.path.join(root, 'abs', 'curve.pd')
+    assert query('paths') == [curve, main]
+    assert query('dependents', path=curve) == [main]
+    assert query('dependencies', path=main) == {'curve': [curve]}
+    assert query('resolve', name='abs/curve') == [curve]
+    assert query('objects', name='osc~') == {main: [2]}
+    with pytest.raises(PyPdException):
+        query('nosuchquery')
+    with pytest.raises(PyPdException):
+        query('uses')
+
+
+def test_daemon_updates(daemon, write_file):
+    root, daemon = daemon
+    main, curve = os.path.join(root, 'main.pd'), \
+                  os.path.join(root, 'abs', 'curve.pd')
+    other = os.path.join(root, 'other', 'curve.pd')
+    write_file(main, testutils.patch_text(['dac~', 'other/curve']))
+    write_file(other, testutils.patch_text([]))
+    _wait_for(lambda: daemon.query('dependents', path=other) == [main])
+    assert daemon.query('dependents', path=curve) == []
+    assert daemon.query('objects', name='osc~') == {}
+
+    os.unlink(main)
+    _wait_for(lambda: main not in daemon.query('paths'))
+    assert daemon.query('dependents', path=other) == []
+    assert daemon.query('objects', name='dac~') == {}
+
+
+def test_daemon_stop(daemon):
+    root, daemon = daemon
+    assert os.path.exists(daemon.socket_path)
+    daemon.stop()
+    assert not os.path.exists(daemon.socket_path)
+
+
+def test_from_config(root, tmpdir):
+    other = str(tmpdir.join('other'))
+    os.makedirs(other)
+    config = pypd.Config(os.path.join(str(tmpdir), 'pypd.cfg'))
+    config[pypd_watcher.SEARCH_PATH_KEY] = [root, other]
+    daemon = pypd_watcher.WatchDaemon.from_config(config, processes=1)
+    try:
+        assert daemon.roots == [root, other]
+        assert daemon.socket_path == os.path.join(
+            str(tmpdir), pypd_watcher.DEFAULT_SOCKET_NAME)
+        assert len(daemon.query('paths')) == 2
+    finally:
+        daemon.watcher.close()
+
+    with pytest.raises(PyPdException):
+        pypd_watcher.WatchDaemon.from_config(
+            pypd.Config(os.path.join(str(tmpdir), 'empty.cfg')))
+
+
+def test_daemon_compat(daemon, write_file):
+    root, daemon = daemon
+    main, curve = os.path.join(root, 'main.pd'), \
+                  os.path.join(root, 'abs', 'curve.pd')
+    assert pypd_watcher.query(daemon.socket_path, 'compat', path=main) == \
+           {'level': 'vanilla', 'offending': []}
+
+    write_file(curve, testutils.patch_text(['line~', 'nosuchobject']))
+    _wait_for(lambda: daemon.query('compat', path=main)['level'] == \
+                      'unknown')
+    assert daemon.query('compat', path=main)['offending'] == \
+           [(curve, 3, 'nosuchobject', 'unknown')]
+
+
+def test_polling_interval(root, monkeypatch):
+    watcher = pypd_watcher.PollingWatcher([root], interval=60)
+    scans = []
+    monkeypatch.setattr(watcher, '_scan', lambda: scans.append(1) or {})
+    for _ in range(5):
+        assert watcher.read(0.01) == []
+    assert scans == []
+    watcher._next_poll = time.time()
+    assert len(watcher.read(0.01)) == 2 and scans == [1]
+    watcher.close()
+
+
+def test_last_events():
+    events = [('changed', 'b'), ('changed', 'a'), ('removed', 'b'),
+              ('changed', 'c'), ('changed', 'a')]
+    assert pypd_watcher._last_events(events) == \
+           [('removed', 'b'), ('changed', 'c'), ('changed', 'a')]
+
+
+def test_daemon_update_error(daemon, monkeypatch):
+    root, daemon = daemon
+    main = os.path.join(root, 'main.pd')
+
+    def update(path):
+        raise OSError(errno.ENOENT, 'No such file or directory', path)
+    monkeypatch.setattr(daemon.files, 'update', update)
+    daemon.apply([(pypd_watcher.CHANGED, main)])
+    # Forgotten, as if it had been removed
+    assert main not in daemon.query('paths')
+    assert daemon.updates == 1
+
+
+def test_daemon_watch_error(daemon, monkeypatch, write_file):
+    root, daemon = daemon
+    monkeypatch.setattr(pypd_watcher, 'RETRY_TIME', 0.01)
+    read = daemon.watcher.read
+    failures = []
+
+    def failing_read(timeout=None):
+        if not failures:
+            failures.append(1)
+            raise OSError(errno.EIO, 'Input/output error')
+        return read(timeout)
+    monkeypatch.setattr(daemon.watcher, 'read', failing_read)
+    new = os.path.join(root, 'new.pd')
+    write_file(new, testutils.patch_text([]))
+    # The thread carries on, scanning everything again
+    _wait_for(lambda: new in daemon.query('paths'))
+    assert failures and daemon._thread.is_alive()
+
+
+def test_daemon_socket_in_use(daemon):
+    root, daemon = daemon
+    other = pypd_watcher.WatchDaemon(
+        [root], daemon.socket_path, processes=1,
+        watcher=pypd_watcher.PollingWatcher([root], interval=0.01))
+    with pytest.raises(PyPdException):
+        other.start()
+    other.watcher.close()
+    assert pypd_watcher.query(daemon.socket_path, 'status')['paths'] == 2
+
+
+def test_daemon_stale_socket(root, tmpdir):
+    socket_path = str(tmpdir.join('stale.sock'))
+    # Bound but nothing listening, as left by a daemon that was killed
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(socket_path)
+    sock.close()
+    daemon = pypd_watcher.WatchDaemon(
+        [root], socket_path, processes=1,
+        watcher=pypd_watcher.PollingWatcher([root], interval=0.01))
+    daemon.start()
+    try:
+        assert len(pypd_watcher.query(socket_path, 'paths')) == 2
+    finally:
+        daemon.stop()
@@ -51,6 +51,13 @@ def parametrize(params):
     return decorator
 
 
+def patch_text(names):
+    """Return the text of a patch file with an object box for each of the
+    object names."""
+    return '#N canvas 0 0 450 300 10;\n' + \
+           ''.join(['#X obj 10 10 %s;\n' % name for name in names])
+
+
 def splitdrive(path):
     if os.pathsep in path:
         drive, rpath = path.split(os.pathsep)
@@ -0,0 +1,91 @@
+import os
+import pytest
+from pypd import pypd_class_attrs
+
+
+EXTENDED = """
+[elements]
+obj             x, y, name
+
+[objects]
+osc~            frequency
+freeverb~       roomsize, damping
+
+[aliases]
+freeverb~       fv~
+"""
+
+
+def pytest_funcarg__extended(request):
+    tmpdir = request.getfuncargvalue('tmpdir')
+    path = os.path.join(str(tmpdir), 'extended.txt')
+    with open(path, 'w') as f:
+        f.write(EXTENDED)
+
+    # Restore the default table after the test
+    request.addfinalizer(pypd_class_attrs.load)
+    return path
+
+
+@pytest.mark.parametrize(('element', 'params', 'attrs'), [
+    ('obj', ['1', '2', 'osc~', '440'], ('x', 'y', 'name', 'freq')),
+    ('obj', ['1', '2', 'nosuchabs', '1'], ('x', 'y', 'name')),
+    ('obj', ['1', '2'], ('x', 'y', 'name')),
+    ('obj', ['1', '2', 'del', '10'], ('x', 'y', 'name', 'ms')),
+    ('canvas', ['0', '0', '450', '300', '10'],
+     ('x', 'y', 'width', 'height', 'font_size')),
+    ('canvas', ['0', '0', '450', '300', 'sub', '0'],
+     ('x', 'y', 'width', 'height', 'canvas_name', 'open_on_load')),
+    ('connect', ['0', '0', '1', '0'],
+     ('src_id', 'src_out', 'dest_id', 'dest_out'))])
+def test_get(element, params, attrs):
+    assert pypd_class_attrs.get(element, params) == attrs
+
+
+def test_get_unknown():
+    with pytest.raises(KeyError):
+        pypd_class_attrs.get('nosuchelement', [])
+
+
+def test_layout_shared():
+    layout = pypd_class_attrs.layout
+    assert layout('obj', ['1', '2', 'delay']) is \
+           layout('obj', ['3', '4', 'del', '5'])
+    assert layout('obj', ['1', '2', 'abs1']) is \
+           layout('obj', ['3', '4', 'abs2'])
+
+
+def test_load_layered(extended):
+    pypd_class_attrs.load([pypd_class_attrs.KNOWN_PATH, extended])
+    get = pypd_class_attrs.get
+    assert get('obj', ['1', '2', 'osc~']) == ('x', 'y', 'name', 'frequency')
+    assert get('obj', ['1', '2', 'fv~']) == \
+           ('x', 'y', 'name', 'roomsize', 'damping')
+    assert get('obj', ['1', '2', 'dac~']) == ('x', 'y', 'name', 'outputs')
+    assert get('obj', ['1', '2', 'f']) == ('x', 'y', 'name', 'init')
+
+
+def test_dump_load(extended, tmpdir):
+    pypd_class_attrs.load([pypd_class_attrs.KNOWN_PATH, extended])
+    path = os.path.join(str(tmpdir), 'known.bin')
+    pypd_class_attrs.dump(path)
+    expected = pypd_class_attrs.layout('obj', ['1', '2', 'fv~'])
+
+    pypd_class_attrs.load()
+    assert pypd_class_attrs.layout('obj', ['1', '2', 'fv~']) is not expected
+    pypd_class_attrs.load_dump(path)
+    assert pypd_class_attrs.layout('obj', ['1', '2', 'fv~']) is expected
+
+
+def test_load_unchanged(extended):
+    pypd_class_attrs.load([pypd_class_attrs.KNOWN_PATH, extended])
+    expected = pypd_class_attrs.layout('obj', ['1', '2', 'fv~'])
+    table = pypd_class_attrs._table
+    pypd_class_attrs.load([pypd_class_attrs.KNOWN_PATH, extended])
+    assert pypd_class_attrs._table is table
+
+    with open(extended, 'w') as f:
+        f.write(EXTENDED.replace('damping', 'damp'))
+    pypd_class_attrs.load([pypd_class_attrs.KNOWN_PATH, extended])
+    assert pypd_class_attrs._table is not table
+    assert pypd_class_attrs.layout('obj', ['1', '2', 'fv~']) is not expected
@@ -0,0 +1,125 @@
+import os
+import stat
+import multiprocessing
+import pytest
+import pypd
+
+
+def pytest_funcarg__cfg_path(request):
+    tmpdir = request.getfuncargvalue('tmpdir')
+    return os.path.join(str(tmpdir), 'batch.cfg')
+
+
+def _count_writes(cfg):
+    writes = []
+    write = cfg.write
+
+    def counting_write():
+        writes.append(1)
+        write()
+    cfg.write = counting_write
+    return writes
+
+
+def test_batch_writes_once(cfg_path):
+    cfg = pypd.Config(cfg_path)
+    writes = _count_writes(cfg)
+    with cfg.batch():
+        cfg['key1'] = 'val1'
+        cfg['multi'] = ['a', 'b', 'c']
+        del cfg['key1']
+        cfg['key2'] = 'val2'
+        # Nothing written yet
+        assert pypd.Config(cfg_path).get('key2') is None
+    assert len(writes) == 1
+
+    cfg2 = pypd.Config(cfg_path)
+    assert cfg2.get('key1') is None and cfg2['key2'] == 'val2'
+    assert sorted(cfg2['multi']) == ['a', 'b', 'c']
+
+
+def test_batch_nested(cfg_path):
+    cfg = pypd.Config(cfg_path)
+    writes = _count_writes(cfg)
+    with cfg.batch():
+        with cfg.batch():
+            cfg['key1'] = 'val1'
+        cfg['key2'] = 'val2'
+    assert len(writes) == 1
+
+
+def test_batch_no_flush(cfg_path):
+    cfg = pypd.Config(cfg_path, flush=False)
+    writes = _count_writes(cfg)
+    with cfg.batch():
+        cfg['key1'] = 'val1'
+    assert not writes and cfg['key1'] == 'val1'
+
+
+def test_batch_rollback(cfg_path):
+    cfg = pypd.Config(cfg_path)
+    cfg['key1'] = 'val1'
+    writes = _count_writes(cfg)
+    with pytest.raises(ZeroDivisionError):
+        with cfg.batch():
+            cfg['key1'] = 'changed'
+            cfg['key2'] = ['a', 'b']
+            1 / 0
+    assert not writes
+    assert cfg['key1'] == 'val1' and cfg.get('key2') is None
+    cfg.write()
+    assert pypd.Config(cfg_path).get('key2') is None
+
+
+def test_write_keeps_mode(cfg_path):
+    cfg = pypd.Config(cfg_path)
+    os.chmod(cfg_path, 0640)
+    cfg['key'] = 'val'
+    assert stat.S_IMODE(os.stat(cfg_path).st_mode) == 0640
+    assert [f for f in os.listdir(os.path.dirname(cfg_path)) \
+            if f.startswith('.tmp')] == []
+
+
+def _increment(cfg_path, num):
+    for _ in range(num):
+        cfg = pypd.Config(cfg_path, lock=True)
+        with cfg.batch():
+            cfg['count'] = str(int(cfg.get('count') or '0') + 1)
+
+
+def test_batch_locked(cfg_path):
+    pypd.Config(cfg_path)['count'] = '0'
+    procs = [multiprocessing.Process(target=_increment, args=(cfg_path, 20)) \
+             for _ in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    assert pypd.Config(cfg_path)['count'] == '80'
+
+
+def test_batch_keeps_unwritten(cfg_path):
+    cfg = pypd.Config(cfg_path, flush=False, lock=True)
+    cfg['key1'] = 'val1'
+    with cfg.batch():
+        assert cfg['key1'] == 'val1'
+        cfg['key2'] = 'val2'
+    cfg.write()
+    cfg2 = pypd.Config(cfg_path)
+    assert (cfg2['key1'], cfg2['key2']) == ('val1', 'val2')
+
+
+def test_locked_writers_merge(cfg_path):
+    pypd.Config(cfg_path)['old'] = 'val'
+    cfg1 = pypd.Config(cfg_path, lock=True)
+    cfg2 = pypd.Config(cfg_path, lock=True)
+    cfg1['key1'] = 'val1'
+    cfg2['key2'] = 'val2'
+    del cfg2['old']
+    with cfg1.batch():
+        cfg1['multi'] = ['a', 'b']
+    # Each instance only wrote over the keys it changed
+    cfg = pypd.Config(cfg_path)
+    assert (cfg['key1'], cfg['key2'], cfg.get('old')) == ('val1', 'val2', None)
+    assert cfg['multi'] == ['a', 'b']
+    assert cfg1.get('old') is None and cfg1['key2'] == 'val2'
@@ -0,0 +1,56 @@
+import os
+import pypd
+
+
+CFG_TEXT = """[install]
+path_2 = /two
+path_1 = /one
+path_10 = /ten
+pd_root = /usr/bin
+"""
+
+
+def pytest_funcarg__cfg(request):
+    tmpdir = request.getfuncargvalue('tmpdir')
+    filename = os.path.join(str(tmpdir), 'multi.cfg')
+    with open(filename, 'w') as f:
+        f.write(CFG_TEXT)
+    return pypd.Config(filename, flush=False)
+
+
+def test_multi_ordered(cfg):
+    assert cfg['path'] == ['/one', '/two', '/ten']
+
+
+def test_multi_append(cfg):
+    cfg['path'] = ['/eleven', '/twelve']
+    assert cfg['path'] == ['/one', '/two', '/ten', '/eleven', '/twelve']
+    assert cfg['path_12'] == '/twelve'
+
+
+def test_multi_not_numbered(cfg):
+    # pd_root is a single key, not a value of "pd"
+    assert cfg.get('pd') is None
+    assert cfg['pd_root'] == '/usr/bin'
+
+
+def test_multi_single_subkey(cfg):
+    del cfg['path_2']
+    assert cfg['path'] == ['/one', '/ten']
+    cfg['path_3'] = '/three'
+    assert cfg['path'] == ['/one', '/three', '/ten']
+
+
+def test_multi_delete(cfg):
+    assert cfg.delete('path')
+    assert cfg.get('path') is None
+    assert not cfg.delete('path')
+    cfg['path'] = ['/new']
+    assert cfg['path'] == ['/new'] and cfg['path_1'] == '/new'
+
+
+def test_multi_written(cfg):
+    cfg['path'] = ['/eleven']
+    cfg.write()
+    cfg2 = pypd.Config(cfg.filename)
+    assert cfg2['path'] == ['/one', '/two', '/ten', '/eleven']
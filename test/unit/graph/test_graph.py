@@ -0,0 +1,114 @@
+import pytest
+from pypd.pypd_patch import parse
+from pypd.pypd_graph import Graph, graphs
+
+
+PATCH = """#N canvas 0 0 450 300 10;
+#X obj 10 10 metro 100;
+#X obj 10 40 f;
+#X obj 50 40 + 1;
+#N canvas 0 0 450 300 sub 0;
+#X obj 10 10 inlet;
+#X obj 10 40 print;
+#X obj 50 40 print unused;
+#X connect 0 0 1 0;
+#X restore 10 70 pd sub;
+#X text 10 100 a counter;
+#X msg 10 130 stop;
+#X floatatom 50 130 5 0 0 0 - - -;
+#X connect 0 0 1 0;
+#X connect 1 0 2 0;
+#X connect 2 0 1 1;
+#X connect 1 0 3 0;
+#X connect 5 0 0 0;
+"""
+
+
+def _lines(text):
+    return text.splitlines(True)
+
+
+def pytest_funcarg__tree(request):
+    return parse(_lines(PATCH))
+
+
+def pytest_funcarg__graph(request):
+    return Graph.from_canvas(request.getfuncargvalue('tree'))
+
+
+def test_graph_nodes(tree, graph):
+    assert len(graph) == 7
+    assert graph.canvas is tree
+    assert graph.nodes[3] is tree[3]
+    assert [node.value.element for node in graph.nodes] == \
+           ['obj', 'obj', 'obj', 'canvas', 'text', 'msg', 'floatatom']
+    assert graph.index(tree[3]) == 3
+    with pytest.raises(ValueError):
+        graph.index(tree[-1])
+
+
+def test_graph_connections(graph):
+    assert graph.num_connections == 5
+    # Sorted by source, then in patch order
+    assert list(graph.connections()) == \
+           [(0, 0, 1, 0), (1, 0, 2, 0), (1, 0, 3, 0), (2, 0, 1, 1),
+            (5, 0, 0, 0)]
+    assert graph.outgoing(1) == [(0, 2, 0), (0, 3, 0)]
+    assert graph.outgoing(6) == []
+    assert graph.incoming(1) == [(0, 0, 0), (2, 0, 1)]
+    assert graph.incoming(5) == []
+    assert graph.invalid == []
+
+
+def test_graph_fan(graph):
+    assert graph.fan_out(1) == 2
+    assert graph.fan_out(1, 0) == 2
+    assert graph.fan_out(1, 1) == 0
+    assert graph.fan_in(1) == 2
+    assert graph.fan_in(1, 1) == 1
+    assert graph.fan_in(4) == 0
+
+
+def test_graph_unconnected(graph):
+    # The comment can't be connected
+    assert graph.unconnected() == [6]
+
+
+def test_graph_topological_order(graph):
+    with pytest.raises(ValueError):
+        graph.topological_order()
+    assert graph.topological_order(hot_only=True) == [4, 5, 6, 0, 1, 2, 3]
+
+
+def test_graph_subpatch(tree):
+    sub_graph = Graph.from_canvas(tree[3])
+    assert len(sub_graph) == 3
+    assert list(sub_graph.connections()) == [(0, 0, 1, 0)]
+    assert sub_graph.unconnected() == [2]
+    assert sub_graph.topological_order() == [0, 2, 1]
+
+
+def test_graph_invalid():
+    tree = parse(_lines('#N canvas 0 0 450 300 10;\n'
+                        '#X obj 10 10 f;\n'
+                        '#X obj 10 40 f;\n'
+                        '#X connect 0 0 1 0;\n'
+                        '#X connect 0 0 2 0;\n'
+                        '#X connect 0 x 1 0;\n'
+                        '#X connect 0 0 1;\n'))
+    graph = Graph.from_canvas(tree)
+    assert list(graph.connections()) == [(0, 0, 1, 0)]
+    assert [node.value.line_num for node in graph.invalid] == [5, 6, 7]
+
+
+def test_graph_empty():
+    graph = Graph.from_canvas(parse(_lines('#N canvas 0 0 450 300 10;\n')))
+    assert len(graph) == 0
+    assert list(graph.connections()) == []
+    assert graph.unconnected() == []
+    assert graph.topological_order() == []
+
+
+def test_graphs(tree):
+    canvases = [graph.canvas for graph in graphs(tree)]
+    assert canvases == [tree, tree[3]]
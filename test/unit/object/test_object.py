@@ -0,0 +1,91 @@
+import pickle
+import pytest
+from pypd import Object
+import testutils
+
+
+@testutils.parametrize(['osc', 'msg', 'empty_obj', 'array_data'])
+def pytest_funcarg__object_args(request):
+    """Return (factory args, expected named attrs, expected str)."""
+    args = {
+        'osc': ((2, '#X', 'obj', ['30', '27', 'osc~', '440']),
+                [('x', '30'), ('y', '27'), ('name', 'osc~'),
+                 ('freq', '440')],
+                '#X obj 30 27 osc~ 440'),
+        'msg': ((3, '#X', 'msg', ['10', '10', 'a', 'b', 'c']),
+                [('x', '10'), ('y', '10'), ('text', 'a')],
+                '#X msg 10 10 a b c'),
+        'empty_obj': ((4, '#X', 'obj', ['10', '10']),
+                      [('x', '10'), ('y', '10'), ('name', None)],
+                      '#X obj 10 10'),
+        'array_data': ((5, '#A', 'array_data', ['0', '1', '2']),
+                       [('start_idx', '0'), ('values', '1')],
+                       '#A 0 1 2')}
+    return args[request.param]
+
+
+def test_object_attrs(object_args):
+    (line_num, chunk, element, params), attrs, _ = object_args
+    obj = Object.factory(line_num, chunk, element, params)
+    assert (obj.line_num, obj.chunk, obj.element) == \
+           (line_num, chunk, element)
+    for name, value in attrs:
+        assert getattr(obj, name) == value
+    assert obj.num_ordered_attrs == len(attrs)
+    assert obj.num_args == len(params)
+
+
+def test_object_args(object_args):
+    (line_num, chunk, element, params), _, _ = object_args
+    obj = Object.factory(line_num, chunk, element, params)
+    for n, value in enumerate(params):
+        assert getattr(obj, 'arg%d' % (n + 1)) == value
+    for name in ['arg0', 'arg%d' % (len(params) + 1), 'argx', 'nosuchattr']:
+        assert not hasattr(obj, name)
+
+
+def test_object_iter(object_args):
+    factory_args, attrs, _ = object_args
+    assert list(Object.factory(*factory_args)) == attrs
+
+
+def test_object_str(object_args):
+    factory_args, _, text = object_args
+    assert str(Object.factory(*factory_args)) == text
+
+
+def test_object_immutable(object_args):
+    factory_args, attrs, _ = object_args
+    obj = Object.factory(*factory_args)
+    for name in ['x', 'line_num', 'params', 'new_attr']:
+        with pytest.raises(AttributeError):
+            setattr(obj, name, 'value')
+        with pytest.raises(AttributeError):
+            delattr(obj, name)
+
+
+def test_object_pickle(object_args):
+    factory_args, attrs, text = object_args
+    obj = pickle.loads(pickle.dumps(Object.factory(*factory_args)))
+    assert list(obj) == attrs and str(obj) == text
+
+
+def test_object_shared_layout():
+    obj1 = Object.factory(1, '#X', 'obj', ['1', '2', 'osc~', '440'])
+    obj2 = Object.factory(2, '#X', 'obj', ['3', '4', 'osc~'])
+    obj3 = Object.factory(3, '#X', 'obj', ['3', '4', 'dac~'])
+    assert obj1._layout is obj2._layout
+    assert obj1._layout is not obj3._layout
+    assert not hasattr(obj1, '__dict__')
+
+
+def test_object_eq(object_args):
+    factory_args, _, _ = object_args
+    obj = Object.factory(*factory_args)
+    other = pickle.loads(pickle.dumps(obj))
+    assert obj == other and not obj != other
+    assert hash(obj) == hash(other)
+    line_num, chunk, element, params = factory_args
+    moved = Object.factory(line_num + 1, chunk, element, params)
+    assert obj != moved and not obj == moved
+    assert obj != str(obj)
@@ -0,0 +1,59 @@
+import pickle
+import pytest
+from pypd import ObjectName
+import testutils
+
+
+@testutils.parametrize(['no_path', 'one_path', 'multi_path'])
+def pytest_funcarg__interned_name(request):
+    args = {'no_path':    ('abs', [], 'abs'),
+            'one_path':   ('cyclone/abs', ['cyclone'], 'abs'),
+            'multi_path': ('lib/dir1/dir2/name', ['lib', 'dir1', 'dir2'],
+                           'name')}
+    return args[request.param]
+
+
+def test_intern_shared(interned_name):
+    name, path_parts, rname = interned_name
+    objname = ObjectName.intern(name)
+    assert ObjectName.intern(name) is objname
+    assert (objname._path_parts, objname.rname) == (path_parts, rname)
+    assert objname == ObjectName(name) and objname == name
+    assert hash(objname) == hash(ObjectName(name))
+
+
+def test_intern_immutable(interned_name):
+    name, _, _ = interned_name
+    objname = ObjectName.intern(name)
+    with pytest.raises(AttributeError):
+        objname.name = 'other'
+    assert objname.name == name
+
+    # Instances created directly are still mutable
+    ObjectName(name).name = 'other'
+
+
+def test_intern_pickle(interned_name):
+    name, _, _ = interned_name
+    objname = ObjectName.intern(name)
+    assert pickle.loads(pickle.dumps(objname)) is objname
+
+    plain = pickle.loads(pickle.dumps(ObjectName(name)))
+    assert plain is not objname and plain.name == name
+
+
+def test_intern_bounded():
+    max_interned = ObjectName.max_interned
+    ObjectName.max_interned = 5
+    try:
+        names = [ObjectName.intern(n) for n in testutils.fake_names(20)]
+        assert len(ObjectName._interned) <= 5
+        assert ObjectName.intern(names[-1].name) is names[-1]
+    finally:
+        ObjectName.max_interned = max_interned
+
+
+def test_intern_invalid():
+    with pytest.raises(ValueError):
+        ObjectName.intern('/abs')
+    assert '/abs' not in ObjectName._interned
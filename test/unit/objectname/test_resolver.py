@@ -0,0 +1,56 @@
+import os
+import pytest
+from pypd import ObjectName
+from pypd.pypd_objectname import NameResolver
+import testutils
+
+
+PATHS = ['/usr/lib/pd/extra/mapping/curve.pd',
+         '/usr/lib/pd/extra/curve.pd',
+         '/home/user/pd/mapping/curve.pd',
+         '/home/user/pd/abs.pd',
+         '/cyclone/abs.pd',
+         'abs.pd',
+         'local/abs.pd']
+
+
+def _brute_force(name, paths):
+    objname = ObjectName(name)
+    return [path for path in paths \
+            if os.path.basename(path)[:-3] == objname.rname and \
+               objname.match_path(os.path.dirname(path))]
+
+
+@pytest.mark.parametrize('name', ['curve', 'mapping/curve',
+                                  'extra/mapping/curve', 'pd/curve',
+                                  'lib/pd/extra/curve', 'x/mapping/curve',
+                                  'abs', 'cyclone/abs', 'local/abs',
+                                  'pd/abs', 'nosuchname', 'no/such/name'])
+def test_resolve(name):
+    resolver = NameResolver(PATHS, '.pd')
+    assert resolver.resolve(name) == _brute_force(name, PATHS)
+    assert resolver.resolve(ObjectName(name)) == _brute_force(name, PATHS)
+
+
+def test_resolve_fake_names():
+    paths = [os.path.join('/root', name + '.pd') \
+             for name in testutils.xfake_names(40)]
+    resolver = NameResolver(paths, '.pd')
+    for path in paths:
+        name = path[len('/root/'):-3]
+        assert resolver.resolve(name) == [path]
+        assert resolver.resolve(name) == _brute_force(name, paths)
+
+
+def test_remove():
+    resolver = NameResolver(PATHS, '.pd')
+    assert resolver.remove('/usr/lib/pd/extra/mapping/curve.pd')
+    assert not resolver.remove('/usr/lib/pd/extra/mapping/curve.pd')
+    assert not resolver.remove('/not/added.pd')
+    assert resolver.resolve('extra/mapping/curve') == []
+    assert resolver.resolve('mapping/curve') == \
+           ['/home/user/pd/mapping/curve.pd']
+
+    for path in PATHS[1:]:
+        assert resolver.remove(path)
+    assert resolver._trie == {}
@@ -0,0 +1,69 @@
+import pytest
+from pypd import InvalidLine, InvalidPatch
+from pypd.pypd_patch import xchunks, xevents, parse, \
+                            CANVAS_OPEN, CANVAS_CLOSE, CHUNK
+
+
+LINES = ['#N canvas 0 0 450 300 10;',
+         '#X obj 30 27 osc~ 440;',
+         '#N canvas 0 0 450 300 sub 0;',
+         '#X obj 10 10',
+         'inlet;',
+         '#X restore 30 60 pd sub;',
+         '#A 0 1 2;',
+         '#X connect 0 0 1 0;']
+
+
+def test_xchunks():
+    assert list(xchunks(LINES)) == [
+        (1, '#N', 'canvas', ['0', '0', '450', '300', '10']),
+        (2, '#X', 'obj', ['30', '27', 'osc~', '440']),
+        (3, '#N', 'canvas', ['0', '0', '450', '300', 'sub', '0']),
+        (4, '#X', 'obj', ['10', '10', 'inlet']),
+        (6, '#X', 'restore', ['30', '60', 'pd', 'sub']),
+        (7, '#A', 'array_data', ['0', '1', '2']),
+        (8, '#X', 'connect', ['0', '0', '1', '0'])]
+
+
+def test_xevents():
+    events = [(event, line_num) for event, line_num, _, _, _ in \
+              xevents(LINES)]
+    assert events == [(CANVAS_OPEN, 1), (CHUNK, 2), (CANVAS_OPEN, 3),
+                      (CHUNK, 4), (CANVAS_CLOSE, 6), (CHUNK, 7), (CHUNK, 8)]
+
+
+def test_xevents_structs():
+    lines = ['#N struct point float x;', '#N struct label symbol text;'] + \
+            LINES[:2]
+    events = [(event, line_num, element) \
+              for event, line_num, _, element, _ in xevents(lines)]
+    assert events == [(CHUNK, 1, 'struct'), (CHUNK, 2, 'struct'),
+                      (CANVAS_OPEN, 3, 'canvas'), (CHUNK, 4, 'obj')]
+
+
+def test_xevents_match_parse():
+    # The events and the tree are built from the same chunks
+    events = [(line_num, chunk, element, params) \
+              for _, line_num, chunk, element, params in xevents(LINES)]
+    nodes = [(obj.line_num, obj.chunk, obj.element,
+              [getattr(obj, 'arg%d' % (n + 1)) for n in range(obj.num_args)]) \
+             for obj in (node.value for node, _ in parse(LINES))]
+    assert events == nodes
+
+
+def test_xevents_lazy():
+    # Nothing past the first chunk is read
+    def lines():
+        yield '#N canvas 0 0 450 300 10;'
+        raise AssertionError('read too far')
+    assert next(xevents(lines()))[0] == CANVAS_OPEN
+
+
+@pytest.mark.parametrize(('lines', 'exception'), [
+    (LINES[:5], InvalidPatch),
+    (LINES[1:], InvalidLine),
+    (['#N struct point float x;'] + LINES[1:], InvalidLine),
+    (LINES[:2] + LINES[5:], InvalidLine)])
+def test_xevents_invalid(lines, exception):
+    with pytest.raises(exception):
+        list(xevents(lines))
@@ -0,0 +1,112 @@
+import pytest
+from pypd import InvalidLine, InvalidPatch
+from pypd.pypd_patch import parse
+import testutils
+
+
+PATCH = """#N canvas 0 0 450 300 10;
+#X obj 30 27 osc~ 440;
+#N canvas 0 0 450 300 sub 0;
+#X obj 10 10 inlet;
+#X msg 10 40 1 2 3 \\; pd dsp 1 \\, 4
+5 6;
+#X restore 30 60 pd sub;
+#X connect 0 0 1 0;
+"""
+
+
+@testutils.parametrize(['no_newline', 'newline', 'crlf'])
+def pytest_funcarg__patch_lines(request):
+    text = {'no_newline': PATCH.rstrip(),
+            'newline':    PATCH,
+            'crlf':       PATCH.replace('\n', '\r\n')}[request.param]
+    return text.splitlines(True)
+
+
+def test_parse_order(patch_lines):
+    tree = parse(patch_lines)
+    actual = [(node.value.element, depth) for node, depth in tree]
+    assert actual == [('canvas', 0), ('obj', 1), ('canvas', 1), ('obj', 2),
+                      ('msg', 2), ('restore', 2), ('connect', 1)]
+
+
+def test_parse_line_nums(patch_lines):
+    tree = parse(patch_lines)
+    assert [node.value.line_num for node, _ in tree] == [1, 2, 3, 4, 5, 7, 8]
+
+
+def test_parse_eq(patch_lines):
+    tree = parse(patch_lines)
+    assert tree == parse(patch_lines)
+    # The same objects, one line later
+    assert tree != parse(['\n'] + patch_lines)
+
+
+def test_parse_escapes(patch_lines):
+    msg = parse(patch_lines)[1][1].value
+    assert msg.text == '1'
+    assert str(msg) == '#X msg 10 40 1 2 3 \\; pd dsp 1 \\, 4 5 6'
+
+
+def test_parse_attrs(patch_lines):
+    osc = parse(patch_lines)[0].value
+    assert (osc.x, osc.y, osc.name, osc.freq) == ('30', '27', 'osc~', '440')
+    assert osc.arg4 == '440'
+
+
+def test_parse_box_width():
+    # Pd 0.46 and later save the width of a box after a ","
+    obj = parse(['#N canvas 0 0 450 300 10;\n',
+                 '#X obj 113 158 list-drip, f 11;\n'])[0].value
+    assert obj.name == 'list-drip'
+    assert obj.params == ('113', '158', 'list-drip', ',', 'f', '11')
+
+
+def test_parse_array_data():
+    tree = parse(['#N canvas 0 0 450 300 10;\n',
+                  '#X array tbl 3 float 2;\n',
+                  '#A 0 1 2 3;\n'])
+    data = tree[1].value
+    assert data.start_idx == '0' and data.values == '1'
+    assert str(data) == '#A 0 1 2 3'
+
+
+STRUCT_PATCH = """#N struct point float x float y;
+#N struct label symbol text;
+#N canvas 0 0 450 300 10;
+#X scalar point 10 20 \\;;
+#X obj 30 27 struct point float x float y;
+"""
+
+
+def test_parse_structs():
+    # Data structure patches declare their templates before the canvas
+    tree = parse(STRUCT_PATCH.splitlines(True))
+    actual = [(node.value.element, node.value.line_num, depth) \
+              for node, depth in tree]
+    assert actual == [('canvas', 3, 0), ('struct', 1, 1), ('struct', 2, 1),
+                      ('scalar', 4, 1), ('obj', 5, 1)]
+    assert tree[0].value.params == ('point', 'float', 'x', 'float', 'y')
+
+
+@pytest.mark.parametrize(('lines', 'line_num'), [
+    (['#N canvas 0 0 450 300 10;', '#X obj 10 10 osc~', '440'], 2),
+    (['#N canvas 0 0 450 300 10;', '', 'bad 10 10;'], 3),
+    (['#N canvas 0 0 450 300 10;', '#X restore 10 10 pd sub;'], 2),
+    (['#X obj 10 10 osc~;'], 1),
+    (['#N struct point float x;', '#X obj 10 10 osc~;'], 2),
+    (['#N canvas 0 0 450 300 10;', '#X nosuchelement 10 10;'], 2)])
+def test_parse_invalid_line(lines, line_num):
+    with pytest.raises(InvalidLine) as exinfo:
+        parse(lines)
+    assert exinfo.value.line_num == line_num
+
+
+@pytest.mark.parametrize('lines', [
+    [],
+    ['', '   '],
+    ['#N struct point float x;'],
+    ['#N canvas 0 0 450 300 10;', '#N canvas 0 0 450 300 sub 0;']])
+def test_parse_invalid_patch(lines):
+    with pytest.raises(InvalidPatch):
+        parse(lines)
@@ -0,0 +1,119 @@
+import pytest
+from pypd import InvalidLine, InvalidPatch
+from pypd.pypd_patch import parse, reparse
+
+
+PATCH = """#N canvas 0 0 450 300 10;
+#X obj 30 27 osc~ 440;
+#N canvas 0 0 450 300 sub1 0;
+#X obj 10 10 inlet;
+#N canvas 0 0 450 300 subsub 0;
+#X obj 10 10 f;
+#X restore 10 40 pd subsub;
+#X restore 30 60 pd sub1;
+#N canvas 0 0 450 300 sub2 0;
+#X obj 10 10 outlet;
+#X restore 30 90 pd sub2;
+#X connect 0 0 1 0;
+"""
+
+
+def _lines(text):
+    return text.splitlines(True)
+
+
+def _nodes(tree):
+    return [(depth, node.value.line_num, str(node.value)) \
+            for node, depth in tree]
+
+
+def _check(tree, text):
+    """Reparse text and check the result is the same as parsing it."""
+    new_tree = reparse(tree, _lines(text))
+    assert new_tree == parse(_lines(text))
+    assert _nodes(new_tree) == _nodes(parse(_lines(text)))
+    for node, _ in new_tree:
+        for child in node[:]:
+            assert child.parent is node
+    return new_tree
+
+
+def test_reparse_unchanged():
+    tree = parse(_lines(PATCH))
+    assert reparse(tree, _lines(PATCH)) is tree
+
+
+def test_reparse_changed_object():
+    tree = parse(_lines(PATCH))
+    sub1, sub2 = tree[1], tree[2]
+    new_tree = _check(tree, PATCH.replace('outlet', 'outlet~'))
+    assert new_tree is not tree
+    assert new_tree[1] is sub1 and new_tree[1][1] is sub1[1]
+    assert new_tree[2] is not sub2
+    assert new_tree[0].value is not tree[0].value
+
+
+def test_reparse_changed_subsub():
+    tree = parse(_lines(PATCH))
+    sub2 = tree[2]
+    new_tree = _check(tree, PATCH.replace('obj 10 10 f', 'obj 10 10 f 1'))
+    assert new_tree[1] is not tree[1]
+    # The unchanged parts of sub1 are rebuilt, subsub isn't
+    assert new_tree[2] is sub2
+
+
+def test_reparse_structs():
+    text = '#N struct point float x float y;\n' + PATCH
+    tree = parse(_lines(text))
+    sub1 = tree[2]
+    assert _check(tree, text) is tree
+    # A new struct moves every line down, sub1 is copied
+    new_tree = _check(tree, '#N struct label symbol text;\n' + text)
+    assert new_tree[0].value.params == ('label', 'symbol', 'text')
+    assert new_tree[3] is not sub1
+    assert new_tree[3].value.line_num == sub1.value.line_num + 1
+
+
+def test_reparse_moved():
+    tree = parse(_lines(PATCH))
+    sub1, subsub = tree[1], tree[1][1]
+    text = PATCH.replace('#X obj 10 10 inlet;\n',
+                         '#X obj 10 10 inlet;\n#X obj 20 20 inlet;\n')
+    new_tree = _check(tree, text)
+    assert new_tree[1] is not sub1
+    # subsub is unchanged but one line later
+    assert new_tree[1][2] is not subsub
+    assert new_tree[1][2][0].value.params is subsub[0].value.params
+    assert new_tree[2].value.line_num == tree[2].value.line_num + 1
+
+
+@pytest.mark.parametrize('restore', ['#X restore 30 60 pd sub1;',
+                                     '#X restore 30 90 pd sub1;'])
+def test_reparse_duplicates(restore):
+    text = PATCH.replace('pd sub2', 'pd sub1').replace('sub2 0', 'sub1 0') \
+                .replace('outlet', 'inlet')
+    # Both subpatches contain an identical "subsub"
+    text = text.replace('#X obj 10 10 inlet;\n#X restore 30 90',
+                        '#X obj 10 10 inlet;\n'
+                        '#N canvas 0 0 450 300 subsub 0;\n'
+                        '#X obj 10 10 f;\n#X restore 10 40 pd subsub;\n'
+                        '#X restore 30 90')
+    tree = parse(_lines(text))
+    changed = text.replace(restore, '#X obj 1 1 f;\n' + restore)
+    new_tree = _check(tree, changed)
+    subsubs = [node for node, _ in new_tree \
+               if node.value.params[-2:] == ('subsub', '0')]
+    assert len(subsubs) == 2 and subsubs[0] is not subsubs[1]
+
+
+def test_reparse_invalid():
+    tree = parse(_lines(PATCH))
+    expected = _nodes(tree)
+    with pytest.raises(InvalidPatch):
+        reparse(tree, _lines(PATCH.replace('#X restore 30 90 pd sub2;\n',
+                                           '')))
+    with pytest.raises(InvalidLine):
+        reparse(tree, _lines(PATCH.replace('#X obj 10 10 outlet;',
+                                           '#X nosuchelement 1;')))
+    assert _nodes(tree) == expected
+    assert tree[1].parent is tree and tree[1][1].parent is tree[1]
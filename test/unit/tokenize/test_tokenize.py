@@ -0,0 +1,114 @@
+import re
+import random
+import pytest
+from pypd import InvalidLine
+from pypd.pypd_tokenize import xtokens, xtokens_careful
+from pypd.pypd_patch import xchunks
+
+
+TOKENIZERS = [xtokens, xtokens_careful]
+
+# The tokens both tokenizers must give: runs of non-space characters or
+# escapes, ";" and "," on their own and a backslash with nothing to escape
+_reference_re = re.compile(r'(?:\\.|[^\s;,\\])+|;|,|\\')
+
+
+def _reference(lines):
+    chunks, tokens, start_num = [], [], 0
+    for line_num, line in enumerate(lines, 1):
+        for token in _reference_re.findall(line):
+            if token == ';':
+                if not tokens:
+                    start_num = line_num
+                chunks.append((start_num, tokens))
+                tokens = []
+            else:
+                if not tokens:
+                    start_num = line_num
+                tokens.append(token)
+    return chunks, tokens
+
+
+@pytest.mark.parametrize('tokenize', TOKENIZERS)
+def test_xtokens_simple(tokenize):
+    lines = ['#N canvas 0 0 450 300 10;\n', '#X obj 30 27 osc~ 440;\n']
+    assert list(tokenize(lines)) == [
+        (1, ['#N', 'canvas', '0', '0', '450', '300', '10']),
+        (2, ['#X', 'obj', '30', '27', 'osc~', '440'])]
+
+
+@pytest.mark.parametrize('tokenize', TOKENIZERS)
+def test_xtokens_escapes(tokenize):
+    lines = ['#X msg 10 40 1 \\; pd dsp 1 \\, \\$1;\n']
+    assert list(tokenize(lines)) == [
+        (1, ['#X', 'msg', '10', '40', '1', '\\;', 'pd', 'dsp', '1', '\\,',
+             '\\$1'])]
+
+
+@pytest.mark.parametrize('tokenize', TOKENIZERS)
+def test_xtokens_comma(tokenize):
+    lines = ['#X obj 113 158 list-drip, f 11;\n',
+             '#X msg 10 40 1 \\, 2, 3;\n']
+    assert list(tokenize(lines)) == [
+        (1, ['#X', 'obj', '113', '158', 'list-drip', ',', 'f', '11']),
+        (2, ['#X', 'msg', '10', '40', '1', '\\,', '2', ',', '3'])]
+
+
+@pytest.mark.parametrize('tokenize', TOKENIZERS)
+def test_xtokens_wrapped(tokenize):
+    lines = ['\n', '#X obj 10\n', '\t10 f; #X obj\n', '1 1 f;']
+    assert list(tokenize(lines)) == [
+        (2, ['#X', 'obj', '10', '10', 'f']),
+        (3, ['#X', 'obj', '1', '1', 'f'])]
+
+
+@pytest.mark.parametrize('tokenize', TOKENIZERS)
+def test_xtokens_trailing_backslash(tokenize):
+    assert list(tokenize(['#X text 1 1 a\\\n', 'b\\ c;\n'])) == [
+        (1, ['#X', 'text', '1', '1', 'a', '\\', 'b\\ c'])]
+
+
+@pytest.mark.parametrize('tokenize', TOKENIZERS)
+def test_xtokens_empty(tokenize):
+    lines = ['#X obj 1 1 f;\n', '\n', '#X obj 2 2 f;\n', ';\n', '#X obj\n',
+             ';\n', '#X obj 3 3 f; ;\n']
+    assert list(tokenize(lines)) == [
+        (1, ['#X', 'obj', '1', '1', 'f']), (3, ['#X', 'obj', '2', '2', 'f']),
+        (4, []), (5, ['#X', 'obj']), (7, ['#X', 'obj', '3', '3', 'f']),
+        (7, [])]
+
+
+@pytest.mark.parametrize('tokenize', TOKENIZERS)
+def test_xchunks_empty(tokenize):
+    lines = ['#N canvas 0 0 450 300 10;\n', '#X obj 1 1 f;\n', '\n', ';\n']
+    with pytest.raises(InvalidLine) as exinfo:
+        list(xchunks(lines, tokenize))
+    assert exinfo.value.line_num == 4
+
+
+@pytest.mark.parametrize('tokenize', TOKENIZERS)
+def test_xtokens_unterminated(tokenize):
+    with pytest.raises(InvalidLine) as exinfo:
+        list(tokenize(['#X obj 1 1 f;\n', '\n', '#X obj 2 2 f\n']))
+    assert exinfo.value.line_num == 3
+
+
+def test_xtokens_random():
+    rand = random.Random(23)
+    alphabet = 'ab1 \t;;\\\\,$\n'
+    for _ in xrange(2000):
+        lines = [''.join([rand.choice(alphabet) \
+                          for _ in xrange(rand.randrange(12))]) + \
+                 rand.choice(['\n', ''])
+                 for _ in xrange(rand.randrange(1, 5))]
+        chunks, rest = _reference(lines)
+        for tokenize in TOKENIZERS:
+            result = []
+            try:
+                for chunk in tokenize(lines):
+                    result.append(chunk)
+            except InvalidLine:
+                assert rest
+            else:
+                assert not rest
+            assert result == chunks, lines
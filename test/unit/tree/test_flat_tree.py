@@ -0,0 +1,66 @@
+import testhelper
+import testutils
+
+
+@testutils.parametrize(['root', 'depth1', 'depth2', 'depth3', 'extra'])
+def pytest_funcarg__flat_args(request):
+    args = {'root':   (0, 0),
+            'depth1': (3, 2),
+            'depth2': (2, 3),
+            'depth3': (3, 4),
+            'extra':  (2, 4, None, 2)}[request.param]
+    return testhelper.make_order(testhelper.make_tree(*args))
+
+
+def test_flat_iter(flat_args):
+    tree, order = flat_args
+    assert list(tree.flatten()) == order
+
+
+def test_flat_apply(flat_args):
+    tree, order = flat_args
+    actual = []
+    tree.flatten().apply(lambda value, depth: actual.append((value, depth)))
+    assert actual == order
+
+
+def test_flat_len(flat_args):
+    tree, order = flat_args
+    assert len(tree.flatten()) == len(order)
+
+
+def test_flat_structure(flat_args):
+    tree, _ = flat_args
+    flat = tree.flatten()
+    nodes = [node for node, _ in tree]
+    for i, node in enumerate(nodes):
+        assert flat.values[i] == node.value
+        if i == 0:
+            assert flat.parents[i] == -1
+        else:
+            assert node in nodes[flat.parents[i]][:]
+        assert flat.sizes[i] == len(list(node))
+        assert [nodes[c] for c in flat.children(i)] == node[:]
+        assert flat.leaf(i) == node.leaf()
+
+
+def test_flat_subtree(flat_args):
+    tree, _ = flat_args
+    flat = tree.flatten()
+    for i, (node, _) in enumerate(tree):
+        assert flat.subtree(i) == node.flatten()
+        assert flat.subtree(i) == node
+
+
+def test_flat_eq(flat_args):
+    tree, _ = flat_args
+    assert tree.flatten() == tree.flatten()
+    assert tree.flatten() == tree and tree == tree.flatten()
+    assert not tree.flatten() != tree and not tree != tree.flatten()
+    assert tree.flatten().to_tree() == tree
+
+    other = tree.flatten().to_tree()
+    other.add('extra')
+    assert tree.flatten() != other.flatten()
+    assert tree.flatten() != other and other != tree.flatten()
+    assert tree.flatten() != None
@@ -0,0 +1,32 @@
+import gc
+import weakref
+from pypd import Tree
+import testhelper
+
+
+def test_parent():
+    tree = Tree(0)
+    child = tree.add(1)
+    branch = Tree(2)
+    tree.addBranch(branch)
+    assert child.parent is tree and branch.parent is tree
+    assert tree.parent is None
+
+
+def test_parent_freed():
+    tree = Tree(0)
+    child = tree.add(1)
+    del tree
+    assert child.parent is None
+
+
+def test_freed_without_gc():
+    gc.disable()
+    try:
+        tree = testhelper.make_tree(3, 4)
+        tree.addBranch(testhelper.make_tree(2, 3))
+        refs = list(weakref.ref(node) for node, _ in tree)
+        del tree
+        assert not [ref for ref in refs if ref() is not None]
+    finally:
+        gc.enable()
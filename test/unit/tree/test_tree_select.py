@@ -0,0 +1,80 @@
+from pypd import Tree
+import testhelper
+import testutils
+
+
+@testutils.parametrize(['root', 'depth1', 'depth2', 'depth3'])
+def pytest_funcarg__select_args(request):
+    args = {'root':   (0, 0),
+            'depth1': (3, 2),
+            'depth2': (2, 3),
+            'depth3': (3, 4)}[request.param]
+    return testhelper.make_order(testhelper.make_tree(*args))
+
+
+def test_select_all(select_args):
+    tree, order = select_args
+    assert [(n.value, d) for n, d in tree.select()] == order
+
+
+def test_select_pred(select_args):
+    tree, order = select_args
+    pred = lambda node, depth: depth % 2 == 1
+    assert [(n.value, d) for n, d in tree.select(pred)] == \
+           [(v, d) for v, d in order if d % 2 == 1]
+
+
+def test_select_prune(select_args):
+    tree, order = select_args
+    prune = lambda node, depth: depth == 1
+    assert [(n.value, d) for n, d in tree.select(prune=prune)] == \
+           [(v, d) for v, d in order if d <= 1]
+
+
+def test_apply_batch(select_args):
+    tree, order = select_args
+    batches = []
+    assert not tree.apply_batch(batches.append, batch_size=2)
+    assert all([0 < len(batch) <= 2 for batch in batches])
+    assert [(n.value, d) for batch in batches for n, d in batch] == order
+
+
+def test_apply_batch_stop(select_args):
+    tree, order = select_args
+    batches = []
+
+    def fn(batch):
+        batches.append(batch)
+        return True
+
+    assert tree.apply_batch(fn, batch_size=2)
+    assert len(batches) == 1
+
+
+def test_find():
+    tree = Tree(0)
+    tree.add(1).add(2)
+    tree.add(2)
+    node, depth = tree.find(lambda node, depth: node.value == 2)
+    assert depth == 2 and node.parent.value == 1
+
+    # Pruning at depth 1 finds the other node
+    node, depth = tree.find(lambda node, depth: node.value == 2,
+                            lambda node, depth: depth == 1)
+    assert depth == 1
+
+    assert tree.find(lambda node, depth: node.value == 3) is None
+    assert tree.any(lambda node, depth: node.value == 1)
+    assert not tree.any(lambda node, depth: node.value == 3)
+
+
+def test_find_stops_early():
+    tree = testhelper.make_tree(3, 4)
+    visited = []
+
+    def pred(node, depth):
+        visited.append(node)
+        return depth == 1
+
+    tree.find(pred)
+    assert len(visited) == 2